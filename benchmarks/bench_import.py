@@ -0,0 +1,77 @@
+"""
+Import-time regression benchmark.
+
+Each case imports one pywrb module in a fresh interpreter, reports the
+median wall time over several runs, and checks that heavy dependencies
+which the module does not need have not been loaded. The script exits
+with status 1 if any check fails, so it can run in CI.
+
+    python benchmarks/bench_import.py [--runs 5] [--max-seconds 2.0]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY = ('flask', 'matplotlib', 'xarray', 'netCDF4', 'pandas')
+
+# Module to import and heavy dependencies it must not pull in. The processing
+# package itself needs numpy and pandas; NetCDF, plotting and the web stack
+# are only loaded by the functions that use them.
+NOT_FOR_PROCESSING = ('flask', 'matplotlib', 'xarray', 'netCDF4')
+CASES = [
+    ('pywrb', HEAVY),
+    ('pywrb.cli', HEAVY),
+    ('pywrb.processing', NOT_FOR_PROCESSING),
+    ('pywrb.processing.sdt_decoder', NOT_FOR_PROCESSING),
+    ('pywrb.processing.process_SDT_file', NOT_FOR_PROCESSING),
+    ('pywrb.pywrb', ('matplotlib', 'xarray', 'netCDF4')),
+]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'seconds': elapsed, 'loaded': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(module, heavy, runs):
+    """Median import time of module in fresh interpreters, and the heavy modules it loaded."""
+    times = []
+    loaded = set()
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', PROBE.format(module=module, heavy=HEAVY)],
+                             capture_output=True, text=True, check=True, env=env, cwd=ROOT)
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        times.append(result['seconds'])
+        loaded.update(result['loaded'])
+    return statistics.median(times), sorted(loaded & set(heavy))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help="imports per module (default: 5)")
+    parser.add_argument('--max-seconds', type=float, default=None,
+                        help="fail if a median import time exceeds this")
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'module':40s} {'median':>9s}  unexpected imports")
+    for module, heavy in CASES:
+        seconds, unexpected = measure(module, heavy, args.runs)
+        too_slow = args.max_seconds is not None and seconds > args.max_seconds
+        failed |= bool(unexpected) or too_slow
+        print(f"{module:40s} {seconds * 1000:7.1f} ms  {', '.join(unexpected) or '-'}"
+              f"{'  (too slow)' if too_slow else ''}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
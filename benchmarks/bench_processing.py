@@ -0,0 +1,161 @@
+"""
+Throughput and memory benchmark of the processing functions.
+
+For each input size, synthetic inputs are generated with a fixed seed and
+every stage is timed over several repeats. The table reports the median
+time, throughput in records per second, and peak traced memory (tracemalloc,
+measured in a separate run so that tracing does not slow down the timings).
+
+Results can be saved as JSON and compared with an earlier run:
+
+    python benchmarks/bench_processing.py --sizes 1000 10000 --save base.json
+    python benchmarks/bench_processing.py --sizes 1000 10000 --compare base.json
+
+With --compare, the script exits with status 1 if a stage got slower than
+the tolerance allows.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+from synthetic import make_inputs  # noqa: E402
+
+
+def stages(paths, work):
+    """Benchmarked callables, keyed by name. Each writes its outputs below work."""
+    from pywrb.processing.calculate_drift_velocity import calculate_drift_velocity
+    from pywrb.processing.process_SDT_file import process_SDT_file
+    from pywrb.processing.remove_spike import remove_spike
+    from pywrb.processing.SPT_to_NC import convert_spt_to_nc
+    from pywrb.processing.windsea_swell_seperation import windsea_swell_seperation
+
+    spt_folder = os.path.join(work, 'spt')
+    nc_folder = os.path.join(work, 'nc')
+    for folder in (spt_folder, nc_folder):
+        os.makedirs(folder, exist_ok=True)
+    shutil.copy(paths['spt'], spt_folder)
+    shutil.copy(paths['nc'], nc_folder)
+
+    return {
+        'process_SDT_file': lambda: process_SDT_file(paths['sdt'], processed_folder=os.path.join(work, 'processed')),
+        'convert_spt_to_nc': lambda: convert_spt_to_nc(spt_folder, os.path.join(work, 'converted')),
+        'windsea_swell_seperation': lambda: windsea_swell_seperation(nc_folder),
+        'calculate_drift_velocity': lambda: calculate_drift_velocity(paths['nc']),
+        'remove_spike': lambda: remove_spike([paths['his']], plot_folder=os.path.join(work, 'plots')),
+    }
+
+
+def measure(func, repeats):
+    """Median wall time over repeats, and peak traced memory of one extra run."""
+    func()  # Warm up caches and lazy imports
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(times), peak
+
+
+def run(sizes, repeats, seed, only=None):
+    results = []
+    for n_records in sizes:
+        folder = tempfile.mkdtemp(prefix=f'pywrb-bench-{n_records}-')
+        try:
+            # The pipeline's own output is noisy; keep the table readable
+            with open(os.devnull, 'w') as devnull:
+                stdout, sys.stdout = sys.stdout, devnull
+                try:
+                    paths = make_inputs(os.path.join(folder, 'inputs'), n_records, seed)
+                    timings = {}
+                    for name, func in stages(paths, os.path.join(folder, 'work')).items():
+                        if only and name not in only:
+                            continue
+                        timings[name] = measure(func, repeats)
+                finally:
+                    sys.stdout = stdout
+
+            for name, (seconds, peak) in timings.items():
+                result = {
+                    'stage': name,
+                    'records': n_records,
+                    'seconds': seconds,
+                    'records_per_second': n_records / seconds,
+                    'peak_mib': peak / 2**20,
+                }
+                results.append(result)
+                print(f"{name:26s} {n_records:9d} {seconds * 1000:10.1f} "
+                      f"{result['records_per_second']:12.0f} {result['peak_mib']:10.1f}", flush=True)
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Print the change of each stage against a baseline run; return True if any got slower than allowed."""
+    previous = {(r['stage'], r['records']): r for r in baseline['results']}
+    regressed = False
+    print(f"\n{'stage':26s} {'records':>9s} {'time ratio':>10s} {'memory ratio':>13s}")
+    for r in results:
+        old = previous.get((r['stage'], r['records']))
+        if old is None:
+            continue
+        ratio = r['seconds'] / old['seconds']
+        memory = r['peak_mib'] / old['peak_mib'] if old['peak_mib'] else float('nan')
+        slower = ratio > 1 + tolerance
+        regressed |= slower
+        print(f"{r['stage']:26s} {r['records']:9d} {ratio:10.2f} {memory:13.2f}{'  REGRESSION' if slower else ''}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pywrb processing on synthetic data.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000],
+                        help="numbers of records to benchmark (default: 1000 10000)")
+    parser.add_argument('--repeats', type=int, default=5, help="timed runs per stage (default: 5)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--stages', nargs='+', help="only run these stages")
+    parser.add_argument('--save', help="write the results to this JSON file")
+    parser.add_argument('--compare', help="compare with results saved by an earlier run")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="allowed slowdown against --compare (default: 0.25 = 25%%)")
+    args = parser.parse_args()
+
+    print(f"{'stage':26s} {'records':>9s} {'median ms':>10s} {'records/s':>12s} {'peak MiB':>10s}")
+    results = run(args.sizes, args.repeats, args.seed, args.stages)
+
+    if args.save:
+        with open(args.save, 'w') as fh:
+            json.dump({
+                'python': platform.python_version(),
+                'numpy': np.__version__,
+                'machine': platform.machine(),
+                'repeats': args.repeats,
+                'seed': args.seed,
+                'results': results,
+            }, fh, indent=2)
+
+    if args.compare:
+        with open(args.compare) as fh:
+            if compare(results, json.load(fh), args.tolerance):
+                return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,89 @@
+"""
+Consistency check of the chunked spike filter.
+
+Compares centred_mean with pandas' rolling(window, center=True).mean(), and
+the rows kept by despike_file, read in chunks of several sizes, with the
+whole-file pandas filter that remove_spike used to run. Even and odd windows
+are checked. Rows whose deviation equals the threshold to within rounding
+are decided by float noise in pandas' running sums and are left out of the
+comparison; the chunked results must match each other exactly. The script
+exits with status 1 on any mismatch, so it can run in CI.
+
+    python benchmarks/check_spike_filter.py [--records 5000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+from synthetic import make_inputs  # noqa: E402
+
+WINDOWS = (1, 2, 3, 4, 5, 8)
+CHUNK_SIZES = (7, 100, 1000, 100000)
+TIE_TOLERANCE = 1e-9
+
+
+def reference_kept(path, window, threshold, abnormal_min, abnormal_max):
+    """Dates of the rows kept by the whole-file pandas filter, and of the rows tied with the threshold."""
+    dat = pd.read_csv(path, header=0)
+    dat.columns = dat.columns.str.strip()
+    dat = dat.rename(columns={"Timestamp": "Date", "Hm0": "Hs"})
+    dat["Date"] = pd.to_datetime(dat["Date"])
+    dat = dat[(dat["Hs"] >= abnormal_min) & (dat["Hs"] <= abnormal_max)]
+    diff = np.abs(dat["Hs"] - dat["Hs"].rolling(window=window, center=True).mean())
+    ties = np.abs(diff - threshold) < TIE_TOLERANCE
+    return set(dat.loc[diff <= threshold, "Date"]), set(dat.loc[ties, "Date"])
+
+
+def check_centred_mean(failures):
+    from pywrb.processing.spike_filter import centred_mean
+
+    values = np.random.default_rng(0).random((200, 3))
+    for window in WINDOWS:
+        expected = pd.DataFrame(values).rolling(window, center=True).mean().to_numpy()
+        if not np.allclose(centred_mean(values, window), expected, equal_nan=True):
+            failures.append(f"centred_mean differs from pandas for window {window}")
+
+
+def check_despike(path, failures, threshold=0.1, abnormal_min=0, abnormal_max=5):
+    from pywrb.processing.spike_filter import despike_file, spike_tests
+
+    tests = spike_tests(('Hs',), threshold, abnormal_min, abnormal_max)
+    for window in WINDOWS:
+        expected, ties = reference_kept(path, window, threshold, abnormal_min, abnormal_max)
+        first = None
+        for chunksize in CHUNK_SIZES:
+            result = despike_file(path, tests, window, chunksize=chunksize, keep_data=True)
+            kept = pd.to_datetime(result['data']['Date']).reset_index(drop=True)
+            if first is None:
+                first = kept
+            ok = kept.equals(first) and (set(kept) - ties) == (expected - ties)
+            print(f"window {window:2d}  chunksize {chunksize:6d}  kept {len(kept):6d} "
+                  f"(pandas {len(expected)}, {len(ties)} ties)  {'ok' if ok else 'MISMATCH'}")
+            if not ok:
+                failures.append(f"despike_file window {window} chunksize {chunksize}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--records', type=int, default=5000, help="records in the synthetic .his file")
+    args = parser.parse_args()
+
+    failures = []
+    check_centred_mean(failures)
+    with tempfile.TemporaryDirectory(prefix='pywrb-check-') as folder:
+        paths = make_inputs(folder, args.records)
+        check_despike(paths['his'], failures)
+
+    for failure in failures:
+        print(f"FAILED {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,193 @@
+"""
+Synthetic MKIII data for benchmarks.
+
+make_sdt writes checksum-valid SDT files in the 556-byte record layout read
+by pywrb.processing.sdt_decoder. Each record holds a two-peaked spectrum, a
+swell peak and a wind-sea peak, that drifts slowly over time. With it, the
+wave parameters, the wind-sea/swell separation and the Stokes drift all run
+on realistic values. The output is fully determined by the seed, so
+benchmark runs see identical inputs.
+
+    python benchmarks/synthetic.py OUTPUT_FOLDER --records 10000
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pywrb.processing.sdt_decoder import N_FREQ, RECORD_SIZE, SDT_RECORD_DTYPE  # noqa: E402
+
+HEADER = np.array([0x7E, 0x7E, 0x7E, 0x7E, 0x7E], dtype=np.uint8)
+FREQ_CODES = np.arange(N_FREQ)
+FREQUENCY = np.where(FREQ_CODES < 16, FREQ_CODES * 0.005 + 0.025, FREQ_CODES * 0.01 - 0.05)
+
+
+def _peak(f, fp, hs, gamma=3.3):
+    """JONSWAP-shaped spectrum with peak frequency fp and significant wave height hs (n x n_freq)."""
+    fp = fp[:, None]
+    sigma = np.where(f <= fp, 0.07, 0.09)
+    shape = f**-5 * np.exp(-1.25 * (fp / f)**4) * gamma**np.exp(-(f - fp)**2 / (2 * sigma**2 * fp**2))
+    df = np.gradient(f)
+    m0 = (shape * df).sum(axis=1, keepdims=True)
+    return shape * (hs[:, None] / 4)**2 / m0
+
+
+def synthetic_spectra(n_records, seed=0):
+    """
+    Two-peaked spectra and directional parameters for n_records records.
+
+    Returns:
+        dict: (n_records x N_FREQ) arrays 'psd', 'dir', 'spr', 'm2', 'n2', 'K',
+        and per-record 'Hm0', 'Tz', 'Tref', 'Tsea'.
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(n_records)
+    # Slow variations over a few days, plus noise
+    swell_hs = 0.8 + 0.5 * np.sin(2 * np.pi * t / 336) + 0.05 * rng.standard_normal(n_records)
+    sea_hs = 0.6 + 0.4 * np.sin(2 * np.pi * t / 48) ** 2 + 0.05 * rng.standard_normal(n_records)
+    swell_fp = 0.07 + 0.01 * np.sin(2 * np.pi * t / 500)
+    sea_fp = 0.2 + 0.05 * np.sin(2 * np.pi * t / 96)
+
+    psd = _peak(FREQUENCY, swell_fp, np.abs(swell_hs)) + _peak(FREQUENCY, sea_fp, np.abs(sea_hs))
+    psd *= 1 + 0.1 * rng.random(psd.shape)
+    m0 = (psd * np.gradient(FREQUENCY)).sum(axis=1)
+    m2 = (psd * FREQUENCY**2 * np.gradient(FREQUENCY)).sum(axis=1)
+
+    shape = (n_records, N_FREQ)
+    return {
+        'psd': psd,
+        'dir': (200 + 40 * np.tanh((FREQUENCY - 0.12) * 30) + 10 * rng.standard_normal(shape)) % 360,
+        'spr': np.clip(25 + 15 * rng.random(shape), 0, 70),
+        'm2': np.clip(0.3 + 0.2 * rng.standard_normal(shape), -0.99, 0.99),
+        'n2': np.clip(0.1 * rng.standard_normal(shape), -0.99, 0.99),
+        'K': np.clip(1 + 0.1 * rng.standard_normal(shape), 0, 2.55),
+        'Hm0': 4 * np.sqrt(m0),
+        'Tz': np.sqrt(m0 / m2),
+        'Tref': 25 + rng.random(n_records),
+        'Tsea': 28 + np.sin(2 * np.pi * t / 48),
+    }
+
+
+def encode_records(times, spectra, lat=17.68, lon=83.28):
+    """
+    Encode spectra into a structured array of SDT records with valid checksums.
+
+    Parameters:
+        times (ndarray): datetime64 timestamps of the records.
+        spectra (dict): Output of synthetic_spectra.
+        lat, lon (float): Buoy position in degrees.
+    """
+    n = len(times)
+    records = np.zeros(n, dtype=SDT_RECORD_DTYPE)
+    records['header'] = HEADER
+
+    # Timestamp: year (2 bytes), month, day, hour, minute
+    t = times.astype('datetime64[m]')
+    year = t.astype('datetime64[Y]').astype(np.int64) + 1970
+    month = t.astype('datetime64[M]').astype(np.int64) % 12 + 1
+    day = (t.astype('datetime64[D]') - t.astype('datetime64[M]')).astype(np.int64) + 1
+    minutes = (t - t.astype('datetime64[D]')).astype(np.int64)
+    records['timestamp'] = np.column_stack([year // 256, year % 256, month, day, minutes // 60, minutes % 60])
+
+    # Spectrum: PSD normalised by Smax, coded as exp(-0.005 * code)
+    psd = spectra['psd']
+    smax = psd.max(axis=1)
+    smax_code = np.clip(np.rint(-np.log(smax / 5000) / 0.005), 0, 4095).astype(np.int64)
+    smax = np.exp(-0.005 * smax_code) * 5000
+    with np.errstate(divide='ignore'):
+        psd_code = np.clip(np.rint(-np.log(psd / smax[:, None]) / 0.005), 0, 4095).astype(np.int64)
+
+    spr_code = np.rint(spectra['spr'] * np.pi * 256 / 360 * 4).astype(np.int64)
+    m2_code = np.rint((spectra['m2'] + 1) * 128 * 4).astype(np.int64)
+    n2_code = np.rint((spectra['n2'] + 1) * 128 * 4).astype(np.int64)
+
+    spt = records['spectrum']
+    spt[..., 0] = FREQ_CODES + 64 * (spr_code % 4)
+    spt[..., 1] = np.rint(spectra['dir'] * 256 / 360).astype(np.int64) % 256
+    spt[..., 2] = (psd_code // 256) + 16 * (n2_code % 4) + 64 * (m2_code % 4)
+    spt[..., 3] = psd_code % 256
+    spt[..., 4] = np.clip(spr_code // 4, 0, 255)
+    spt[..., 5] = np.clip(m2_code // 4, 0, 255)
+    spt[..., 6] = np.clip(n2_code // 4, 0, 255)
+    spt[..., 7] = np.clip(np.rint(spectra['K'] * 100), 0, 255)
+
+    # System block
+    def put_word(i, value):
+        records['system'][:, i] = value // 256
+        records['system'][:, i + 1] = value % 256
+
+    def put_position(i, degrees, scale):
+        v = np.int64(np.rint(degrees / scale * 2**23)) % 2**24
+        records['system'][:, i] = (v >> 20) & 0xF
+        records['system'][:, i + 1] = (v >> 12) & 0xFF
+        records['system'][:, i + 2] = (v >> 8) & 0xF
+        records['system'][:, i + 3] = v & 0xFF
+
+    system = records['system']
+    system[:, 1] = 16 * 3  # GPS status
+    put_word(2, np.clip(np.rint(spectra['Hm0'] * 100), 0, 4095).astype(np.int64))
+    system[:, 5] = np.clip(np.rint(400 / spectra['Tz']), 1, 255).astype(np.int64)
+    put_word(6, smax_code)
+    put_word(8, np.rint((spectra['Tref'] + 5) * 20).astype(np.int64) % 1024)
+    put_word(10, np.rint((spectra['Tsea'] + 5) * 20).astype(np.int64) % 1024)
+    system[:, 12] = 7  # Battery status
+    put_position(20, lat, 90)
+    put_position(24, lon, 180)
+
+    raw = records.view(np.uint8).reshape(n, RECORD_SIZE)
+    raw[:, -1] = np.bitwise_xor.reduce(raw[:, 5:-1], axis=1)
+    return records
+
+
+def make_sdt(path, n_records, seed=0, start='2012-01-01T00:00', interval_minutes=30):
+    """Write a synthetic SDT file of n_records records, one every interval_minutes."""
+    times = np.datetime64(start, 'm') + np.arange(n_records) * np.timedelta64(interval_minutes, 'm')
+    encode_records(times, synthetic_spectra(n_records, seed)).tofile(path)
+    return path
+
+
+def make_inputs(folder, n_records, seed=0, name='synthetic'):
+    """
+    Write a synthetic SDT file and the SPT text, .his and NetCDF files derived from it.
+
+    Every input lives in its own subfolder, because convert_spt_to_nc and
+    windsea_swell_seperation work on whole folders.
+
+    Returns:
+        dict: Paths keyed 'sdt', 'his', 'spt', 'nc'.
+    """
+    from pywrb.processing.process_SDT_file import process_SDT_file
+    from pywrb.processing.SDT_to_NC import convert_sdt_to_nc
+
+    paths = {}
+    for sub in ('sdt', 'text', 'nc'):
+        os.makedirs(os.path.join(folder, sub), exist_ok=True)
+    paths['sdt'] = make_sdt(os.path.join(folder, 'sdt', f'{name}.SDT'), n_records, seed)
+    process_SDT_file(paths['sdt'], processed_folder=os.path.join(folder, 'text'))
+    paths['his'] = os.path.join(folder, 'text', f'{name}.his')
+    paths['spt'] = os.path.join(folder, 'text', f'{name}_SPT.txt')
+    paths['nc'] = convert_sdt_to_nc(paths['sdt'], os.path.join(folder, 'nc'))
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write synthetic MKIII SDT data and derived inputs.")
+    parser.add_argument('folder', help="output folder")
+    parser.add_argument('--records', type=int, default=10000, help="number of records (default: 10000)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--sdt-only', action='store_true', help="only write the SDT file")
+    args = parser.parse_args()
+
+    if args.sdt_only:
+        os.makedirs(args.folder, exist_ok=True)
+        print(make_sdt(os.path.join(args.folder, 'synthetic.SDT'), args.records, args.seed))
+    else:
+        for kind, path in make_inputs(args.folder, args.records, args.seed).items():
+            print(f"{kind:4s} {path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -5,10 +5,17 @@ A Python package for processing ocean wave data from various instruments,
 including SDT file processing, spectral analysis, and wave parameter calculations.
 """
 
-from .pywrb import create_app, main
-
 __version__ = '0.1.0'
 __author__ = 'Your Name'
 __email__ = 'your.email@example.com'
 
 __all__ = ['create_app', 'main']
+
+
+def __getattr__(name):
+    # The web application (and Flask) is only imported when it is used, so
+    # that batch processing through pywrb.processing or pywrb.cli starts fast
+    if name in __all__:
+        from . import pywrb as app_module
+        return getattr(app_module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,192 @@
+"""
+Content-addressed cache of processing results.
+
+Entries are keyed by the SHA-256 of the input file plus the kind of product
+and its processing parameters, so re-submitting an identical chip or NetCDF
+file restores the earlier outputs instead of recomputing them. Entries live
+in one directory each and are evicted least-recently-used once the cache
+grows beyond its size limit.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+from pywrb import metrics
+
+# Bump whenever a change to the processing changes the cached outputs, so
+# that entries written by older versions are no longer matched
+CACHE_FORMAT = 2
+MAX_DIGESTS = 4096  # input file digests remembered between requests
+MANIFEST = 'manifest.json'
+BASE_PLACEHOLDER = '{base}'
+
+
+def file_digest(path, block_size=1024 * 1024):
+    """SHA-256 hex digest of a file's contents."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(block_size), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+class ResultCache:
+    """On-disk, size-bounded LRU cache of output files."""
+
+    def __init__(self, cache_dir, max_bytes=2 * 1024**3):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._digests = OrderedDict()
+        self._digests_lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def __getstate__(self):
+        # Sent to worker processes: leave out the lock, which cannot be
+        # pickled, and the digest memo, which the worker rebuilds as it goes
+        state = self.__dict__.copy()
+        del state['_digests'], state['_digests_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._digests = OrderedDict()
+        self._digests_lock = threading.Lock()
+
+    def key(self, input_path, kind, **params):
+        """Cache key of the product `kind` of an input file with the given parameters."""
+        stat = os.stat(input_path)
+        stamp = (os.path.abspath(input_path), stat.st_size, stat.st_mtime_ns)
+        with self._digests_lock:
+            digest = self._digests.get(stamp)
+            if digest is not None:
+                self._digests.move_to_end(stamp)
+        if digest is None:
+            digest = file_digest(input_path)
+            with self._digests_lock:
+                self._digests[stamp] = digest
+                while len(self._digests) > MAX_DIGESTS:
+                    self._digests.popitem(last=False)
+
+        h = hashlib.sha256()
+        h.update(json.dumps([CACHE_FORMAT, digest, kind, params],
+                            sort_keys=True, default=str).encode())
+        return h.hexdigest()
+
+    def fetch(self, key, dest_folder, base):
+        """
+        Restore the files of a cache entry into dest_folder.
+
+        Stored file names have the input's base name replaced by `base`.
+
+        Returns:
+            tuple or None: Restored paths and the entry's metadata, or None on a miss.
+        """
+        entry = os.path.join(self.cache_dir, key)
+        try:
+            with open(os.path.join(entry, MANIFEST)) as fh:
+                manifest = json.load(fh)
+            os.makedirs(dest_folder, exist_ok=True)
+            paths = []
+            for item in manifest['files']:
+                dest = os.path.join(dest_folder, item['name'].replace(BASE_PLACEHOLDER, base))
+                shutil.copyfile(os.path.join(entry, item['stored']), dest)
+                paths.append(dest)
+            # Mark the entry as recently used
+            os.utime(entry)
+        except (FileNotFoundError, KeyError, ValueError):
+            return None
+        return paths, manifest.get('metadata')
+
+    def store(self, key, paths, base, metadata=None):
+        """Store output files under a key; `base` is the input's base name in their names."""
+        tmp = tempfile.mkdtemp(prefix='.tmp-', dir=self.cache_dir)
+        try:
+            files = []
+            for i, path in enumerate(paths):
+                name = os.path.basename(path)
+                stored = f"{i}_{name}"
+                shutil.copyfile(path, os.path.join(tmp, stored))
+                files.append({'stored': stored, 'name': name.replace(base, BASE_PLACEHOLDER, 1)})
+            with open(os.path.join(tmp, MANIFEST), 'w') as fh:
+                json.dump({'files': files, 'metadata': metadata}, fh)
+            os.rename(tmp, os.path.join(self.cache_dir, key))
+        except OSError:
+            # Entry already stored by a concurrent worker, or the copy failed
+            shutil.rmtree(tmp, ignore_errors=True)
+            return
+        self.evict()
+
+    def evict(self):
+        """Remove least-recently-used entries until the cache fits in max_bytes."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            entry = os.path.join(self.cache_dir, name)
+            if name.startswith('.') or not os.path.isdir(entry):
+                continue
+            try:
+                size = sum(os.path.getsize(os.path.join(entry, f)) for f in os.listdir(entry))
+                entries.append((os.path.getmtime(entry), size, entry))
+            except FileNotFoundError:
+                continue
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+
+
+def lookup_outputs(cache, input_path, kind, params, dest_folder, base):
+    """
+    Restore a product from the cache, for callers that compute misses themselves.
+
+    Takes the arguments of cached_outputs, without compute.
+
+    Returns:
+        tuple: The key to store computed outputs under (None without a cache),
+        and the restored (paths, metadata) or None on a miss.
+    """
+    if cache is None:
+        return None, None
+
+    key = cache.key(input_path, kind, **params)
+    hit = cache.fetch(key, dest_folder, base)
+    if hit is not None:
+        metrics.inc('cache_requests', kind=kind, result='hit')
+        print(f"Cache hit for {kind} of {input_path}")
+    else:
+        metrics.inc('cache_requests', kind=kind, result='miss')
+    return key, hit
+
+
+def cached_outputs(cache, input_path, kind, params, dest_folder, base, compute):
+    """
+    Serve a product from the cache, or compute and store it.
+
+    Parameters:
+        cache (ResultCache or None): Cache to use; None disables caching.
+        input_path (str): Input file the product is derived from.
+        kind (str): Name of the product.
+        params (dict): Processing parameters that affect the outputs.
+        dest_folder (str): Folder the outputs are written to.
+        base (str): Base name of the input, as used in the output file names.
+        compute (callable): Produces the outputs and returns (paths, metadata).
+
+    Returns:
+        The metadata returned by compute (or stored with the cache entry).
+    """
+    if cache is None:
+        return compute()[1]
+
+    key, hit = lookup_outputs(cache, input_path, kind, params, dest_folder, base)
+    if hit is not None:
+        return hit[1]
+
+    paths, metadata = compute()
+    cache.store(key, [p for p in paths if os.path.exists(p)], base, metadata)
+    return metadata
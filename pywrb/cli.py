@@ -0,0 +1,290 @@
+"""
+Command-line interface of pywrb.
+
+    pywrb [serve]                     start the web interface (default)
+    pywrb process  INPUT... -o DIR    SDT files -> .his, _225.csv, _SPT.txt / _SPT.nc
+    pywrb convert  INPUT... -o DIR    *_SPT.txt or SDT files -> NetCDF
+    pywrb separate INPUT... -o DIR    NetCDF -> wind-sea/swell CSV
+    pywrb drift    INPUT... -o DIR    NetCDF -> Stokes drift CSV
+    pywrb despike  INPUT... -o DIR    .his/_225.csv files -> spike-filtered CSV, flags and plot
+
+INPUT may be a file, a directory or a glob pattern. The batch commands run
+without the web application and process files in parallel with --jobs.
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# File patterns picked from directories given as input
+INPUT_PATTERNS = {
+    'process': ('*.SDT', '*.sdt'),
+    'convert': ('*_SPT.txt', '*.SDT', '*.sdt'),
+    'separate': ('*.nc',),
+    'drift': ('*.nc',),
+    'despike': ('*.his', '*_225.csv'),
+}
+
+
+def expand_inputs(inputs, patterns):
+    """
+    Expand files, directories and glob patterns into a sorted list of files.
+
+    Directories contribute the files matching any of patterns.
+    """
+    files = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for pattern in patterns:
+                files.extend(glob.glob(os.path.join(item, pattern)))
+        elif glob.has_magic(item):
+            files.extend(glob.glob(item))
+        else:
+            files.append(item)
+    return sorted(set(f for f in files if not os.path.isdir(f)))
+
+
+def base_name(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def convert_file(path, output_folder, nc_profile):
+    from pywrb.processing.SDT_to_NC import convert_sdt_to_nc
+    from pywrb.processing.SPT_to_NC import convert_spt_file
+
+    if path.lower().endswith('.sdt'):
+        output = convert_sdt_to_nc(path, output_folder, nc_profile=nc_profile)
+        if output is None:
+            raise ValueError(f"No valid records found in {path}")
+        return output
+    return convert_spt_file(path, output_folder, nc_profile=nc_profile)
+
+
+def despike_file(path, output_folder, tests, window, plot_folder):
+    from pywrb.processing.spike_filter import despike_files
+
+    result, = despike_files([path], tests, window, output_folder, plot_folder)
+    if 'error' in result:
+        raise ValueError(result['error'])
+    return result['output']
+
+
+def parse_spike_test(spec):
+    """Parse COLUMN[:MIN:MAX:THRESHOLD] for --test; empty fields disable a check."""
+    column, *limits = spec.split(':')
+    if not column or len(limits) not in (0, 3):
+        raise argparse.ArgumentTypeError(f"expected COLUMN or COLUMN:MIN:MAX:THRESHOLD, got {spec!r}")
+    return column, [float(v) if v else None for v in limits] or None
+
+
+def run_files(func, files, jobs, *args):
+    """
+    Run func(file, *args) for every file, in a pool of jobs worker processes.
+
+    Returns:
+        int: Number of files that failed.
+    """
+    failed = 0
+
+    def report(path, error):
+        nonlocal failed
+        if error is None:
+            print(f"OK     {path}")
+        else:
+            failed += 1
+            print(f"FAILED {path}: {error}", file=sys.stderr)
+
+    if jobs == 1 or len(files) <= 1:
+        for path in files:
+            try:
+                func(path, *args)
+                report(path, None)
+            except Exception as e:
+                report(path, e)
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = {executor.submit(func, path, *args): path for path in files}
+            for future in as_completed(futures):
+                report(futures[future], future.exception())
+    return failed
+
+
+def cmd_serve(args):
+    from pywrb.pywrb import main as serve
+    serve(host=args.host, port=args.port, browser=not args.no_browser, debug=args.debug)
+    return 0
+
+
+def cmd_process(args, files):
+    from pywrb.processing.process_SDT_files import process_SDT_files
+
+    cache = None
+    if args.cache:
+        from pywrb.cache import ResultCache
+        cache = ResultCache(args.cache)
+
+    results = process_SDT_files(files, args.output, max_workers=args.jobs, output_format=args.format,
+                                converted_folder=args.converted, cache=cache, nc_profile=args.nc_profile)
+    failed = 0
+    for result in results:
+        if result['success']:
+            print(f"OK     {result['file']} ({result['records']} records)")
+        else:
+            failed += 1
+            print(f"FAILED {result['file']}: {result['error']}", file=sys.stderr)
+    return failed
+
+
+def cmd_convert(args, files):
+    if args.archive is None:
+        return run_files(convert_file, files, args.jobs, args.output, args.nc_profile)
+
+    # Records are appended in file order, so the archive is updated by one process
+    from pywrb.processing.nc_archive import update_archive
+    from pywrb.processing.SDT_to_NC import sdt_to_dataset
+    from pywrb.processing.SPT_to_NC import spt_to_dataset
+
+    archive = os.path.join(args.output, args.archive)
+
+    def derived(suffix):
+        return os.path.join(args.output, f"{base_name(archive)}{suffix}") if suffix else None
+
+    def append(path):
+        ds = sdt_to_dataset(path) if path.lower().endswith('.sdt') else spt_to_dataset(path)
+        if ds is None:
+            raise ValueError(f"No valid records found in {path}")
+        update_archive(archive, ds,
+                       windsea_csv=derived('_windsea_swell.csv' if args.separate else None),
+                       stokes_csv=derived('_stokes_drift.csv' if args.drift else None),
+                       max_depth=args.max_depth, nc_profile=args.nc_profile)
+
+    return run_files(append, files, 1)
+
+
+def run_analysis(kind, args, files, **params):
+    """Run a NetCDF analysis with the chunks of all files spread over args.jobs processes."""
+    from pywrb.processing.parallel_analysis import analyse_files
+    from pywrb.processing.time_chunks import CHUNK_SIZE
+
+    chunk_size = CHUNK_SIZE if args.chunk_size is None else args.chunk_size
+    results = analyse_files(kind, files, args.output, max_workers=args.jobs, chunk_size=chunk_size, **params)
+    failed = 0
+    for result in results:
+        if result['success']:
+            print(f"OK     {result['file']} ({result['rows']} rows)")
+        else:
+            failed += 1
+            print(f"FAILED {result['file']}: {result['error']}", file=sys.stderr)
+    return failed
+
+
+def cmd_separate(args, files):
+    return run_analysis('windsea_swell', args, files)
+
+
+def cmd_drift(args, files):
+    return run_analysis('stokes_drift', args, files, maximum_depth=args.max_depth)
+
+
+def cmd_despike(args, files):
+    tests = {}
+    for column, limits in args.test or [('Hs', None)]:
+        low, high, threshold = limits or (args.abnormal_min, args.abnormal_max, args.threshold)
+        tests[column] = {'min': low, 'max': high, 'threshold': threshold}
+    plot_folder = args.plots or args.output
+    return run_files(despike_file, files, args.jobs, args.output, tests, args.window, plot_folder)
+
+
+def build_parser():
+    # Imported here so that importing the CLI stays light
+    from pywrb.processing.nc_encoding import DEFAULT_PROFILE, PROFILES
+    from pywrb.processing.process_SDT_files import OUTPUT_FORMATS
+
+    parser = argparse.ArgumentParser(prog='pywrb', description="Process Datawell wave rider buoy data.")
+    subparsers = parser.add_subparsers(dest='command')
+
+    serve = subparsers.add_parser('serve', help="start the web interface")
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=5000)
+    serve.add_argument('--no-browser', action='store_true', help="do not open a web browser")
+    serve.add_argument('--debug', action='store_true', default=True,
+                       help="run the Flask development server in debug mode (default)")
+    serve.add_argument('--no-debug', action='store_false', dest='debug',
+                       help="run the Flask development server without debug mode")
+    serve.set_defaults(func=cmd_serve)
+
+    def batch_parser(name, help, func):
+        sub = subparsers.add_parser(name, help=help)
+        sub.add_argument('inputs', nargs='+', help="input files, directories or glob patterns")
+        sub.add_argument('-o', '--output', required=True, help="output folder")
+        sub.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                         help="number of files processed in parallel (default: CPU count)")
+        sub.set_defaults(func=func)
+        return sub
+
+    process = batch_parser('process', "decode SDT files", cmd_process)
+    process.add_argument('--format', choices=OUTPUT_FORMATS, default='text',
+                         help="write text outputs, NetCDF or both (default: text)")
+    process.add_argument('--converted', help="folder for NetCDF outputs (default: the output folder)")
+    process.add_argument('--cache', help="reuse results of identical files from this cache folder")
+    process.add_argument('--nc-profile', choices=list(PROFILES), default=DEFAULT_PROFILE,
+                         help="NetCDF encoding: compression, float32 or packed integers (default: %(default)s)")
+
+    convert = batch_parser('convert', "convert *_SPT.txt or SDT files to NetCDF", cmd_convert)
+    convert.add_argument('--archive', help="append all records to this station NetCDF archive in the output folder")
+    convert.add_argument('--separate', action='store_true',
+                         help="with --archive, also update the archive's wind-sea/swell CSV")
+    convert.add_argument('--drift', action='store_true',
+                         help="with --archive, also update the archive's Stokes drift CSV")
+    convert.add_argument('--max-depth', type=int, default=100, help="maximum depth for --drift (default: 100)")
+    convert.add_argument('--nc-profile', choices=list(PROFILES), default=DEFAULT_PROFILE,
+                         help="NetCDF encoding: compression, float32 or packed integers (default: %(default)s)")
+
+    separate = batch_parser('separate', "separate wind sea and swell in NetCDF files", cmd_separate)
+
+    drift = batch_parser('drift', "calculate Stokes drift profiles from NetCDF files", cmd_drift)
+    drift.add_argument('--max-depth', type=int, default=100, help="maximum depth in metres (default: 100)")
+
+    for sub in (separate, drift):
+        sub.add_argument('--chunk-size', type=int, metavar='RECORDS',
+                         help="records read and written at a time, 0 for whole files (default: 4096)")
+
+    despike = batch_parser('despike', "remove spikes from .his files", cmd_despike)
+    despike.add_argument('--window', type=int, default=2)
+    despike.add_argument('--threshold', type=float, default=0.1)
+    despike.add_argument('--abnormal-max', type=float, default=5)
+    despike.add_argument('--abnormal-min', type=float, default=0)
+    despike.add_argument('--test', action='append', type=parse_spike_test, metavar='COLUMN[:MIN:MAX:THRESHOLD]',
+                         help="column to test, repeatable (default: Hs); without limits the options "
+                              "above are used, e.g. --test Hs --test Tz:1:25:2 --test Tsea:-5:40:")
+    despike.add_argument('--plots', help="folder for the plots (default: the output folder)")
+
+    return parser
+
+
+def main(argv=None):
+    """Entry point of the pywrb command; without a command the web interface is started."""
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        argv = ['serve']
+    args = build_parser().parse_args(argv)
+
+    if args.command == 'serve':
+        return args.func(args)
+
+    files = expand_inputs(args.inputs, INPUT_PATTERNS[args.command])
+    if not files:
+        print("No input files found.", file=sys.stderr)
+        return 2
+    os.makedirs(args.output, exist_ok=True)
+
+    start = time.perf_counter()
+    failed = args.func(args, files)
+    print(f"{len(files) - failed}/{len(files)} files done in {time.perf_counter() - start:.1f} s")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
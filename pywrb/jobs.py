@@ -0,0 +1,130 @@
+"""
+Background jobs for long-running processing requests.
+
+A job wraps a function that does the heavy work of a route. The function
+receives the Job as its first argument to report progress and artifacts,
+and returns a result that the route renders once the job has finished.
+"""
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from pywrb import metrics
+
+
+class Job:
+    """State, progress and result of one unit of work."""
+
+    def __init__(self, kind, owner=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.owner = owner
+        self.status = 'queued'
+        self.progress = {}
+        self.artifacts = []
+        self.result = None
+        self.error = None
+        self.created_at = datetime.now()
+        self.started_at = None
+        self.finished_at = None
+        self.elapsed = None
+        self._lock = threading.Lock()
+
+    def update(self, **progress):
+        """Set progress counters, e.g. job.update(files_total=3)."""
+        with self._lock:
+            self.progress.update(progress)
+
+    def advance(self, **increments):
+        """Increment progress counters, e.g. job.advance(files_done=1, records=4096)."""
+        with self._lock:
+            for key, n in increments.items():
+                self.progress[key] = self.progress.get(key, 0) + n
+
+    def add_artifact(self, name):
+        """Record an output file produced by the job."""
+        with self._lock:
+            self.artifacts.append(name)
+
+    def run(self, func, *args, **kwargs):
+        """Run func(self, *args, **kwargs), recording timing and the outcome."""
+        self.status = 'running'
+        self.started_at = datetime.now()
+        start = time.perf_counter()
+        try:
+            self.result = func(self, *args, **kwargs)
+            self.status = 'finished'
+        except Exception as e:
+            self.error = str(e)
+            self.status = 'failed'
+            traceback.print_exc()
+        finally:
+            self.finished_at = datetime.now()
+            self.elapsed = time.perf_counter() - start
+            metrics.observe('job_seconds', self.elapsed, kind=self.kind, status=self.status)
+        return self.result
+
+    def to_dict(self):
+        """JSON-serializable snapshot of the job."""
+        with self._lock:
+            progress = dict(self.progress)
+            artifacts = list(self.artifacts)
+        if self.started_at is None:
+            elapsed = None
+        elif self.finished_at is None:
+            elapsed = (datetime.now() - self.started_at).total_seconds()
+        else:
+            elapsed = self.elapsed
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': progress,
+            'artifacts': artifacts,
+            'error': self.error,
+            'created_at': self.created_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'elapsed_seconds': elapsed,
+        }
+
+
+class JobManager:
+    """Run jobs on a local pool of worker threads and keep their state."""
+
+    def __init__(self, max_workers=2, max_history=200):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='pywrb-job')
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self.max_history = max_history
+
+    def submit(self, kind, func, *args, owner=None, **kwargs):
+        """Queue func(job, *args, **kwargs) and return the new job; owner identifies who submitted it."""
+        job = Job(kind, owner)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._forget_old_jobs()
+        self._executor.submit(job.run, func, *args, **kwargs)
+        return job
+
+    def get(self, job_id):
+        """Return the job with the given id, or None."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self):
+        """Return all known jobs, oldest first."""
+        with self._lock:
+            return list(self._jobs.values())
+
+    def _forget_old_jobs(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in ('finished', 'failed')]
+        for job_id in finished[:max(len(self._jobs) - self.max_history, 0)]:
+            del self._jobs[job_id]
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,226 @@
+"""
+Lightweight timers and counters for the processing pipelines.
+
+    from pywrb import metrics
+
+    with metrics.timer('sdt.decode'):
+        ...
+    metrics.inc('records_processed', n, pipeline='sdt')
+
+Timings go into histograms, so request and stage latencies can be
+aggregated by Prometheus. Observations are also passed to any function
+registered with add_hook, and snapshot() returns them as a dict.
+
+Each process has its own registry. Work done in worker processes is
+collected with capture() in the worker and added to the parent's registry
+with merge().
+"""
+import bisect
+import contextlib
+import threading
+import time
+
+# Upper bounds, in seconds, of the timing histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+DESCRIPTIONS = {
+    'stage_seconds': "Time spent in each processing stage",
+    'http_request_seconds': "Latency of HTTP requests by route",
+    'records_processed': "Records processed, by pipeline",
+    'bytes_read': "Bytes of input read, by pipeline",
+    'files_processed': "Input files processed, by pipeline and outcome",
+    'cache_requests': "Result cache lookups, by product kind and result",
+    'job_seconds': "Run time of processing jobs, by kind and status",
+}
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+class Registry:
+    """Thread-safe store of counters and timing histograms."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = {'buckets': [0] * len(BUCKETS), 'count': 0, 'sum': 0.0}
+            i = bisect.bisect_left(BUCKETS, seconds)
+            if i < len(BUCKETS):
+                hist['buckets'][i] += 1
+            hist['count'] += 1
+            hist['sum'] += seconds
+
+    def export(self):
+        """Picklable copy of the registry's contents, for merge()."""
+        with self._lock:
+            return {
+                'counters': list(self.counters.items()),
+                'histograms': [(key, {'buckets': list(h['buckets']), 'count': h['count'], 'sum': h['sum']})
+                               for key, h in self.histograms.items()],
+            }
+
+    def merge(self, exported):
+        """Add the contents exported from another registry."""
+        with self._lock:
+            for key, value in exported['counters']:
+                self.counters[key] = self.counters.get(key, 0) + value
+            for key, other in exported['histograms']:
+                hist = self.histograms.setdefault(key, {'buckets': [0] * len(BUCKETS), 'count': 0, 'sum': 0.0})
+                hist['buckets'] = [a + b for a, b in zip(hist['buckets'], other['buckets'])]
+                hist['count'] += other['count']
+                hist['sum'] += other['sum']
+
+
+REGISTRY = Registry()
+_local = threading.local()
+_hooks = []
+
+
+def _registry():
+    return getattr(_local, 'registry', None) or REGISTRY
+
+
+def _notify(kind, name, value, labels):
+    for hook in list(_hooks):
+        try:
+            hook(kind, name, value, labels)
+        except Exception as e:
+            print(f"Metrics hook {hook!r} failed: {e}")
+
+
+def add_hook(hook):
+    """Call hook(kind, name, value, labels) for every observation; kind is 'counter' or 'timer'."""
+    _hooks.append(hook)
+
+
+def remove_hook(hook):
+    _hooks.remove(hook)
+
+
+def inc(name, value=1, **labels):
+    """Increase a counter."""
+    _registry().inc(name, value, **labels)
+    if _hooks:
+        _notify('counter', name, value, labels)
+
+
+def observe(name, seconds, **labels):
+    """Record a duration in a timing histogram."""
+    _registry().observe(name, seconds, **labels)
+    if _hooks:
+        _notify('timer', name, seconds, labels)
+
+
+class timer(contextlib.ContextDecorator):
+    """
+    Time a block or function as a processing stage.
+
+        with timer('spt.parse'):
+            ...
+
+        @timer('drift.compute')
+        def f(): ...
+    """
+
+    def __init__(self, stage, name='stage_seconds'):
+        self.stage = stage
+        self.name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self._start
+        observe(self.name, self.elapsed, stage=self.stage)
+        return False
+
+
+@contextlib.contextmanager
+def capture():
+    """
+    Collect the observations of the current thread in a separate registry.
+
+    Yields the registry; its export() can be sent back from a worker process
+    and merged into the parent's registry.
+    """
+    previous = getattr(_local, 'registry', None)
+    _local.registry = Registry()
+    try:
+        yield _local.registry
+    finally:
+        _local.registry = previous
+
+
+def merge(exported):
+    """Add observations exported from another registry (see capture())."""
+    _registry().merge(exported)
+
+
+def snapshot():
+    """
+    Current metrics as a dict.
+
+    Returns:
+        dict: 'counters' maps (name, labels) to values; 'timers' maps
+        (name, labels) to dicts with 'count' and 'sum' (seconds). labels is a
+        tuple of (label, value) pairs.
+    """
+    exported = _registry().export()
+    return {
+        'counters': dict(exported['counters']),
+        'timers': {key: {'count': h['count'], 'sum': h['sum']} for key, h in exported['histograms']},
+    }
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def render_prometheus(registry=None, prefix='pywrb_'):
+    """Render a registry in the Prometheus text exposition format."""
+    exported = (registry or REGISTRY).export()
+    lines = []
+
+    counters = sorted(exported['counters'])
+    for name in sorted({name for (name, _), _ in counters}):
+        metric = f"{prefix}{name}_total"
+        lines.append(f"# HELP {metric} {DESCRIPTIONS.get(name, name)}")
+        lines.append(f"# TYPE {metric} counter")
+        for (n, labels), value in counters:
+            if n == name:
+                lines.append(f"{metric}{_format_labels(labels)} {value}")
+
+    histograms = sorted(exported['histograms'], key=lambda item: item[0])
+    for name in sorted({name for (name, _), _ in histograms}):
+        metric = f"{prefix}{name}"
+        lines.append(f"# HELP {metric} {DESCRIPTIONS.get(name, name)}")
+        lines.append(f"# TYPE {metric} histogram")
+        for (n, labels), hist in histograms:
+            if n != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(BUCKETS, hist['buckets']):
+                cumulative += count
+                lines.append(f"{metric}_bucket{_format_labels(labels, [('le', repr(float(bound)))])} {cumulative}")
+            lines.append(f"{metric}_bucket{_format_labels(labels, [('le', '+Inf')])} {hist['count']}")
+            lines.append(f"{metric}_sum{_format_labels(labels)} {hist['sum']}")
+            lines.append(f"{metric}_count{_format_labels(labels)} {hist['count']}")
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,94 @@
+import os
+import numpy as np
+
+from pywrb import metrics
+from pywrb.processing.iter_sdt_records import iter_sdt_records
+from pywrb.processing.sdt_decoder import SPECTRAL_FIELDS, SYSTEM_FIELDS
+from pywrb.processing.nc_archive import append_to_netcdf
+from pywrb.processing.nc_encoding import DEFAULT_PROFILE, write_netcdf
+from pywrb.processing.SPT_to_NC import build_spectral_dataset
+
+SYSTEM_ATTRS = {
+    "Hm0": {"units": "m", "long_name": "Significant Wave Height (buoy)"},
+    "Tz": {"units": "s", "long_name": "Zero Upcrossing Period (buoy)"},
+    "Smax": {"units": "m^2/Hz", "long_name": "Maximum Spectral Density"},
+    "Tref": {"units": "degC", "long_name": "Reference Temperature"},
+    "Tsea": {"units": "degC", "long_name": "Sea Surface Temperature"},
+    "Bat": {"units": "1", "long_name": "Battery Status"},
+    "BLE": {"units": "1", "long_name": "Battery Life Expectancy"},
+    "Av": {"units": "m/s^2", "long_name": "Vertical Accelerometer Offset"},
+    "Ax": {"units": "m/s^2", "long_name": "X Accelerometer Offset"},
+    "Ay": {"units": "m/s^2", "long_name": "Y Accelerometer Offset"},
+    "GPS": {"units": "1", "long_name": "GPS Status"},
+    "ori": {"units": "degrees", "long_name": "Orientation"},
+    "incl": {"units": "degrees", "long_name": "Inclination"},
+}
+
+
+def sdt_to_dataset(s_file):
+    """
+    Decode an SDT file into a (time x Frequency) spectral Dataset.
+
+    The spectral variables match those of the *_SPT.nc files produced by
+    convert_spt_to_nc, at full precision. The system parameters of each record
+    are added as time-only variables.
+
+    Returns:
+        xarray.Dataset or None: None if the file holds no valid records.
+    """
+    batches = list(iter_sdt_records(s_file, batch_size=4096))
+    if not batches:
+        return None
+
+    data = {name: np.concatenate([b[name] for b in batches]) for name in batches[0]}
+    metrics.inc('records_processed', len(data['time']), pipeline='sdt_netcdf')
+    frequency = data['Frequency']
+    if not np.all(frequency == frequency[0]):
+        raise ValueError(f"{s_file} mixes records with different frequency grids")
+
+    system = data['system']
+    lat = system[:, SYSTEM_FIELDS.index('Lat')]
+    lon = system[:, SYSTEM_FIELDS.index('Lon')]
+    fields = {name: data[name] for name in SPECTRAL_FIELDS[1:-2]}
+    fields['Lat'] = np.repeat(lat[:, None], frequency.shape[1], axis=1)
+    fields['Lon'] = np.repeat(lon[:, None], frequency.shape[1], axis=1)
+    time_fields = {name: system[:, i] for i, name in enumerate(SYSTEM_FIELDS) if name in SYSTEM_ATTRS}
+
+    return build_spectral_dataset(data['time'], frequency[0], fields, time_fields, SYSTEM_ATTRS)
+
+
+def convert_sdt_to_nc(s_file, output_folder, archive=None, nc_profile=DEFAULT_PROFILE):
+    """
+    Convert an SDT file straight to NetCDF, without the *_SPT.txt round trip.
+
+    Parameters:
+        s_file (str): Path to the SDT file.
+        output_folder (str): Folder where <name>_SPT.nc is written.
+        archive (str, optional): Append the records to this station NetCDF
+            archive in output_folder instead.
+        nc_profile (str): NetCDF encoding profile (see nc_encoding) of new files.
+
+    Returns:
+        str or None: Path of the NetCDF file, or None if nothing was written.
+    """
+    os.makedirs(output_folder, exist_ok=True)
+    if not os.path.exists(s_file):
+        print(f"{s_file} does not exist.")
+        return None
+
+    ds = sdt_to_dataset(s_file)
+    if ds is None:
+        print(f"No valid records found in {s_file}")
+        return None
+
+    if archive is not None:
+        output_filename = os.path.join(output_folder, archive)
+        append_to_netcdf(ds, output_filename, nc_profile)
+        return output_filename
+
+    filename_base = os.path.splitext(os.path.basename(s_file))[0]
+    output_filename = os.path.join(output_folder, filename_base + '_SPT.nc')
+    with metrics.timer('sdt.write_netcdf'):
+        write_netcdf(ds, output_filename, nc_profile)
+    print(f"Successfully converted {s_file} to {output_filename}")
+    return output_filename
@@ -1,85 +1,180 @@
 import glob
+import io
+import os
 import pandas as pd
 import numpy as np
-import xarray as xr
-import os
 
-def convert_spt_to_nc(input_folder, output_folder):
+from pywrb import metrics
+from pywrb.cache import cached_outputs
+from pywrb.processing.nc_archive import append_to_netcdf
+from pywrb.processing.nc_encoding import DEFAULT_PROFILE, get_profile, write_netcdf
+
+SPT_COLUMNS = ["Frequency", "SmaxXpsd", "dir_angle", "spr", "skw",
+               "kurt", "m2", "n2", "K", "Lat", "Lon"]
+TIME_STAMP_PREFIX = "Time Stamp="
+
+VARIABLE_ATTRS = {
+    "SmaxXpsd": {"units": "unit1", "long_name": "Spectral Max Power Density"},
+    "dir_angle": {"units": "degrees", "long_name": "Direction Angle"},
+    "spr": {"units": "degrees", "long_name": "Spread"},
+    "skw": {"units": "unit2", "long_name": "Skewness"},
+    "kurt": {"units": "unit3", "long_name": "Kurtosis"},
+    "m2": {"units": "m^2", "long_name": "Moment Order 2"},
+    "n2": {"units": "n_unit", "long_name": "Some Variable N2"},
+    "K": {"units": "kelvin", "long_name": "Constant K"},
+    "Lat": {"units": "degrees_north", "long_name": "Latitude"},
+    "Lon": {"units": "degrees_east", "long_name": "Longitude"},
+}
+
+GLOBAL_ATTRS = {
+    "title": "Spectral Data Analysis",
+    "description": "Spectral data including frequency-based metrics with timestamps",
+    "units_note": "Units and descriptions for each variable can be found in variable attributes",
+}
+
+
+def build_spectral_dataset(times, frequency, fields, time_fields=None, time_attrs=None):
+    """
+    Build a (time x Frequency) spectral Dataset in one step.
+
+    Parameters:
+        times (array-like): Timestamps of the spectra (n_time,).
+        frequency (array-like): Frequency grid (n_freq,).
+        fields (dict): (n_time x n_freq) arrays keyed by variable name.
+        time_fields (dict, optional): (n_time,) arrays stored along time only.
+        time_attrs (dict, optional): Attributes of the time_fields variables.
+
+    Returns:
+        xarray.Dataset: Dataset with the variable and global attributes of the
+        *_SPT.nc files.
+    """
+    import xarray as xr
+
+    data_vars = {name: (("time", "Frequency"), values) for name, values in fields.items()}
+    for name, values in (time_fields or {}).items():
+        data_vars[name] = (("time",), values)
+
+    ds = xr.Dataset(
+        data_vars,
+        coords={"time": pd.to_datetime(np.asarray(times)), "Frequency": np.asarray(frequency)},
+    )
+    for name in ds.data_vars:
+        attrs = VARIABLE_ATTRS.get(name) or (time_attrs or {}).get(name)
+        if attrs:
+            ds[name].attrs = dict(attrs)
+    ds.attrs = dict(GLOBAL_ATTRS)
+    return ds
+
+
+def read_spt_file(spt):
+    """
+    Parse a *_SPT.txt file in a single pass.
+
+    All numeric rows are read by one C-engine read_csv call ('Time Stamp='
+    lines are skipped as comments) and reshaped into blocks, one per timestamp.
+
+    Returns:
+        tuple: Timestamps (n_time,) and an (n_time x n_freq x 11) array with
+        columns ordered as SPT_COLUMNS.
+    """
+    with open(spt) as fh:
+        text = fh.read()
+
+    lines = text.splitlines()
+    stamp_lines = [i for i, line in enumerate(lines) if line.startswith(TIME_STAMP_PREFIX)]
+    if not stamp_lines:
+        raise ValueError("no 'Time Stamp=' lines found")
+    times = pd.to_datetime([lines[i][len(TIME_STAMP_PREFIX):].strip() for i in stamp_lines])
+
+    n_time = len(stamp_lines)
+    n_freq = (stamp_lines[1] - 1) if n_time > 1 else len(lines) - 1
+    expected = np.arange(n_time) * (n_freq + 1)
+    if n_freq < 1 or stamp_lines != expected.tolist():
+        raise ValueError("spectral blocks have unequal numbers of frequency rows")
+
+    table = pd.read_csv(io.StringIO(text), sep="\t", header=None, names=SPT_COLUMNS,
+                        comment=TIME_STAMP_PREFIX[0], dtype=np.float64)
+    if len(table) != n_time * n_freq:
+        raise ValueError("spectral blocks have unequal numbers of frequency rows")
+    return times, table.to_numpy().reshape(n_time, n_freq, len(SPT_COLUMNS))
+
+
+def spt_to_dataset(spt):
+    """Read a *_SPT.txt file into a (time x Frequency) spectral Dataset."""
+    with metrics.timer('spt.parse'):
+        times, values = read_spt_file(spt)
+    metrics.inc('bytes_read', os.path.getsize(spt), pipeline='spt')
+    metrics.inc('records_processed', len(times), pipeline='spt')
+    frequency = values[0, :, 0]
+    if not np.allclose(values[:, :, 0], frequency):
+        raise ValueError(f"{spt} mixes spectra with different frequency grids")
+
+    fields = {name: values[:, :, j] for j, name in enumerate(SPT_COLUMNS) if name != "Frequency"}
+    with metrics.timer('spt.build'):
+        return build_spectral_dataset(times, frequency, fields)
+
+
+def convert_spt_file(spt, output_folder, cache=None, nc_profile=DEFAULT_PROFILE):
+    """
+    Convert a single *_SPT.txt file to <name>_SPT.nc in output_folder.
+
+    nc_profile names the NetCDF encoding profile, see nc_encoding.
+
+    Returns:
+        str: Path of the NetCDF file.
+    """
+    get_profile(nc_profile)
+    output_filename = os.path.join(output_folder, os.path.basename(spt).replace(".txt", ".nc"))
+
+    def compute():
+        ds = spt_to_dataset(spt)
+        # Save NetCDF
+        with metrics.timer('spt.write_netcdf'):
+            write_netcdf(ds, output_filename, nc_profile)
+        return [output_filename], None
+
+    base = os.path.splitext(os.path.basename(spt))[0]
+    cached_outputs(cache, spt, "spt_to_nc", {'nc_profile': nc_profile}, output_folder, base, compute)
+    return output_filename
+
+
+def convert_spt_to_nc(input_folder, output_folder, progress=None, cache=None, archive=None,
+                      nc_profile=DEFAULT_PROFILE):
     """
     Convert multiple *_SPT.txt files in a folder to NetCDF (.nc) format.
     
     Parameters:
         input_folder (str): Path to the folder containing SPT text files.
         output_folder (str): Path to the folder where NetCDF files will be saved.
+        progress (callable, optional): Called as progress(spt_file, output_file)
+            after each file; output_file is None if the conversion failed.
+        cache (ResultCache, optional): Serve NetCDF files of previously converted,
+            identical SPT files from this cache.
+        archive (str, optional): Append the records of all files to this station
+            NetCDF archive instead of writing one NetCDF file per SPT file.
+        nc_profile (str): NetCDF encoding profile (see nc_encoding) of new files.
     """
     os.makedirs(output_folder, exist_ok=True)
     
     # Get all *_SPT.txt files in the input folder
-    spt_files = glob.glob(os.path.join(input_folder, "*_SPT.txt"))
+    spt_files = sorted(glob.glob(os.path.join(input_folder, "*_SPT.txt")))
     
     for spt in spt_files:
         try:
             print(f"Processing {spt}...")
-            spt_data = pd.read_csv(spt, header=None)
-            
-            # Extract time stamps
-            pattern = r'Time Stamp= \d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}'
-            matching_indices = spt_data[spt_data[0].str.contains(pattern, na=False)].index
-            date = spt_data.iloc[matching_indices]
-            date = date[0].str.extract(r'(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})')
-            date.reset_index(inplace=True)
-            
-            # Add last boundary index
-            matching_indices = matching_indices.append(pd.Index([matching_indices[-1] + 65]))
-            
-            # Separate spectra into individual blocks
-            spect = [spt_data.iloc[matching_indices[i] + 1:matching_indices[i + 1]].values.tolist() 
-                     for i in range(0, len(matching_indices) - 1)]
-            
-            datasets = []
-            for i in range(len(spect)):
-                data_values = pd.DataFrame(spect[i])
-                data_values = data_values[0].str.split("\t", expand=True)
-                data_values.columns = ["Frequency", "SmaxXpsd", "dir_angle", "spr", "skw",
-                                       "kurt", "m2", "n2", "K", "Lat", "Lon"]
-                
-                # Convert to numeric where possible
-                data_values = data_values.apply(pd.to_numeric, errors='coerce')
-                data_values.set_index("Frequency", inplace=True)
-                
-                # Convert to xarray Dataset
-                data_xr = xr.Dataset.from_dataframe(data_values)
-                data_xr = data_xr.assign_coords(time=pd.to_datetime(date.iloc[i, 1]))
-                
-                # Add variable attributes
-                data_xr["SmaxXpsd"].attrs = {"units": "unit1", "long_name": "Spectral Max Power Density"}
-                data_xr["dir_angle"].attrs = {"units": "degrees", "long_name": "Direction Angle"}
-                data_xr["spr"].attrs = {"units": "degrees", "long_name": "Spread"}
-                data_xr["skw"].attrs = {"units": "unit2", "long_name": "Skewness"}
-                data_xr["kurt"].attrs = {"units": "unit3", "long_name": "Kurtosis"}
-                data_xr["m2"].attrs = {"units": "m^2", "long_name": "Moment Order 2"}
-                data_xr["n2"].attrs = {"units": "n_unit", "long_name": "Some Variable N2"}
-                data_xr["K"].attrs = {"units": "kelvin", "long_name": "Constant K"}
-                data_xr["Lat"].attrs = {"units": "degrees_north", "long_name": "Latitude"}
-                data_xr["Lon"].attrs = {"units": "degrees_east", "long_name": "Longitude"}
-                
-                datasets.append(data_xr)
-            
-            # Combine all time-based datasets
-            combined_data_xr = xr.concat(datasets, dim="time")
-            combined_data_xr.attrs = {
-                "title": "Spectral Data Analysis",
-                "description": "Spectral data including frequency-based metrics with timestamps",
-                "units_note": "Units and descriptions for each variable can be found in variable attributes",
-            }
-            
-            # Save NetCDF
-            output_filename = os.path.join(output_folder, os.path.basename(spt).replace(".txt", ".nc"))
-            combined_data_xr.to_netcdf(output_filename)
+            if archive is not None:
+                output_filename = os.path.join(output_folder, archive)
+                append_to_netcdf(spt_to_dataset(spt), output_filename, nc_profile)
+            else:
+                output_filename = convert_spt_file(spt, output_folder, cache, nc_profile)
             print(f"Successfully converted {spt} to {output_filename}")
         
         except Exception as e:
             print(f"Error processing {spt}: {e}")
+            output_filename = None
+
+        if progress is not None:
+            progress(spt, output_filename)
 
 # Example usage
 # convert_spt_to_nc("path/to/spt_files", "path/to/output_nc")
\ No newline at end of file
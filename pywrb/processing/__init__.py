@@ -3,15 +3,26 @@ pywrb processing module - contains all core data processing functions
 """
 
 from .calculate_drift_velocity import calculate_drift_velocity
+from .iter_sdt_records import iter_sdt_records
+from .nc_archive import append_to_netcdf, update_archive
 from .process_SDT_file import process_SDT_file
+from .process_SDT_files import process_SDT_files
 from .remove_spike import remove_spike
+from .sdt_decoder import decode_sdt_file
+from .SDT_to_NC import convert_sdt_to_nc
 from .SPT_to_NC import convert_spt_to_nc
 from .windsea_swell_seperation import windsea_swell_seperation
 
 __all__ = [
     'calculate_drift_velocity',
     'process_SDT_file',
+    'process_SDT_files',
     'remove_spike',
+    'decode_sdt_file',
+    'iter_sdt_records',
+    'append_to_netcdf',
+    'update_archive',
     'convert_spt_to_nc',
+    'convert_sdt_to_nc',
     'windsea_swell_seperation'
 ]
@@ -1,9 +1,72 @@
-import xarray as xr
-import matplotlib.pyplot as plt
+from functools import lru_cache
 import numpy as np
 import pandas as pd
 
-def calculate_drift_velocity(nc_file_path, maximum_depth=100):
+from pywrb import metrics
+from pywrb.processing.time_chunks import CHUNK_SIZE, iter_time_chunks, write_csv_chunks
+
+GRAVITY = 9.8
+
+
+@lru_cache(maxsize=32)
+def _cached_drift_kernel(frequency_bytes, depth_bytes, dtype):
+    f = np.frombuffer(frequency_bytes, dtype=np.float64)
+    z = np.frombuffer(depth_bytes, dtype=np.float64)
+
+    c = (16 * (np.pi)**3) / GRAVITY
+    # Frequency spacing, with the last value repeated to keep the length
+    df = np.diff(f)
+    df = np.append(df, df[-1])
+
+    decay = np.exp(((8 * (np.pi**2) * f[:, None]**2) / GRAVITY) * z[None, :])
+    kernel = (c * f**3 * df)[:, None] * decay
+    kernel = kernel.astype(dtype)
+    kernel.setflags(write=False)
+    return kernel
+
+
+def drift_kernel(frequency, depths, dtype=np.float64):
+    """
+    Depth-decay kernel of the Stokes drift integral.
+
+    Returns the (n_freq x n_depth) matrix c * f**3 * df * exp(8 pi**2 f**2 z / g),
+    cached per frequency grid, depth grid and dtype.
+    """
+    frequency = np.ascontiguousarray(frequency, dtype=np.float64)
+    depths = np.ascontiguousarray(depths, dtype=np.float64)
+    return _cached_drift_kernel(frequency.tobytes(), depths.tobytes(), np.dtype(dtype).str)
+
+
+def stokes_drift_profile(frequency, spectra, depths, dtype=np.float64):
+    """
+    Stokes drift velocity profiles for many spectra at once.
+
+    Parameters:
+    -----------
+    frequency : array-like
+        Frequency grid (n_freq,)
+    spectra : array-like
+        Spectral densities (n_time x n_freq)
+    depths : array-like
+        Depths in metres, negative downwards (n_depth,)
+    dtype : numpy dtype, optional
+        Precision of the computation, e.g. np.float32 (default: np.float64)
+
+    Returns:
+    --------
+    numpy.ndarray
+        Drift velocities (n_time x n_depth)
+    """
+    spectra = np.atleast_2d(np.asarray(spectra, dtype=dtype))
+    # Midpoint spectrum, with the last value repeated to keep the length
+    spec_rolled = np.empty_like(spectra)
+    spec_rolled[:, :-1] = (spectra[:, :-1] + spectra[:, 1:]) / 2
+    spec_rolled[:, -1] = spec_rolled[:, -2]
+    return spec_rolled @ drift_kernel(frequency, depths, dtype)
+
+
+def calculate_drift_velocity(nc_file_path, maximum_depth=100, depths=None, dtype=np.float64,
+                             chunk_size=CHUNK_SIZE, output=None):
     """
     Calculate stock_drift velocity from wave spectrum data.
     
@@ -13,58 +76,82 @@ def calculate_drift_velocity(nc_file_path, maximum_depth=100):
         Path to the netCDF file containing wave spectrum data
     maximum_depth : int, optional
         Maximum depth to calculate drift velocities for (default: 100)
+    depths : array-like, optional
+        Explicit depths in metres, negative downwards. Overrides maximum_depth,
+        and the output columns are labelled with these depths.
+    dtype : numpy dtype, optional
+        Precision of the computation, e.g. np.float32 (default: np.float64)
+    chunk_size : int, optional
+        Number of records read and processed at a time (default: CHUNK_SIZE);
+        None processes the whole file at once
+    output : str, optional
+        Write the profiles to this CSV file chunk by chunk instead of
+        returning them, so memory use does not grow with the file
         
     Returns:
     --------
-    pandas.DataFrame
+    pandas.DataFrame or int
         DataFrame containing drift velocities at different depths for each time step,
-        with time in the first column
+        with time in the first column; with output, the number of rows written
     """
+    import xarray as xr
+
     # Load data
-    dat = xr.open_dataset(nc_file_path)
+    with xr.open_dataset(nc_file_path) as dat:
+        if output is not None:
+            return write_csv_chunks(iter_drift_velocity(dat, maximum_depth, depths, dtype, chunk_size), output)
+        return drift_velocity_frame(dat, maximum_depth, depths, dtype, chunk_size)
+
+
+def iter_drift_velocity(dat, maximum_depth=100, depths=None, dtype=np.float64, chunk_size=CHUNK_SIZE):
+    """
+    Stokes drift profiles of the spectra in a Dataset, one DataFrame per chunk of records.
+
+    Takes the same arguments as calculate_drift_velocity, with an open
+    xarray.Dataset in place of the file path.
+    """
     f = dat.Frequency.values  # Convert to numpy array upfront
-    s = dat.SmaxXpsd.values  # Convert to numpy array upfront
-    time = dat.time.values
-    
-    # Constants
-    c = (16 * (np.pi)**3) / 9.8
-    depths = np.arange(0, -maximum_depth, -1)  # Predefine depths
+    depths, columns = drift_depths(maximum_depth, depths)
 
-    # Precompute frequency-related terms that don't change in loops
-    f3 = f**3
-    # Compute frequency differences (df)
-    df = np.diff(f)
-    df = np.append(df, df[-1])  # Pad last value to maintain length
+    for chunk in iter_time_chunks(dat, ['time', 'SmaxXpsd'], chunk_size, stage='drift.read'):
+        s = chunk['SmaxXpsd']
+        metrics.inc('bytes_read', s.nbytes, pipeline='drift')
+        metrics.inc('records_processed', len(s), pipeline='drift')
 
-    # Compute rolling mean of frequencies
-    fr = (f[:-1] + f[1:]) / 2
-    fr = np.append(fr, fr[-1])  # Pad last value
+        with metrics.timer('drift.compute'):
+            drift_all = np.round(stokes_drift_profile(f, s, depths, dtype), 3)
+        yield drift_chunk_frame(chunk['time'], drift_all, columns)
 
-    # Initialize output array with correct shape
-    drift_all = np.zeros((len(time), len(depths)))
 
-    for i in range(len(time)):
-        spec = s[i]  # Current spectrum
-        # Compute rolling mean of spectrum
-        spec_rolled = (spec[:-1] + spec[1:]) / 2
-        spec_rolled = np.append(spec_rolled, spec_rolled[-1])
-        
-        for z_idx, z in enumerate(depths):
-            # Compute exponential term
-            e = np.exp(((8 * (np.pi**2) * f**2) / 9.8) * z)
-            
-            # Compute drift velocity
-            integrand = c * f3 * spec_rolled * e * df
-            uz = np.sum(integrand)
-            drift_all[i, z_idx] = np.round(uz, 3)
-    
-    # Convert to DataFrame
-    drift_all = pd.DataFrame(drift_all)
+def drift_depths(maximum_depth=100, depths=None):
+    """
+    Depth grid of the drift profiles and the matching column labels.
+
+    Without explicit depths, every metre from 0 to -maximum_depth is used and
+    the columns are numbered from 0.
+    """
+    if depths is None:
+        return np.arange(0, -maximum_depth, -1), None  # Predefine depths
+    return np.asarray(depths), list(depths)
+
+
+def drift_chunk_frame(time, drift, columns=None):
+    """DataFrame with a Date column followed by the drift at each depth."""
+    drift = pd.DataFrame(drift, columns=columns)
     time = pd.DataFrame(time)
     time.columns = ["Date"]
-    data = pd.concat([time, drift_all], axis=1)
-    
-    return data
+    return pd.concat([time, drift], axis=1)
+
+
+def drift_velocity_frame(dat, maximum_depth=100, depths=None, dtype=np.float64, chunk_size=CHUNK_SIZE):
+    """
+    Stokes drift profiles of the spectra in a Dataset.
+
+    Takes the same arguments as calculate_drift_velocity, with an open
+    xarray.Dataset in place of the file path.
+    """
+    return pd.concat(list(iter_drift_velocity(dat, maximum_depth, depths, dtype, chunk_size)),
+                     ignore_index=True)
 
 # Example usage:
 # result = calculate_drift_velocity("Vizag_000001_S02-2012_SPT.nc")
@@ -0,0 +1,95 @@
+"""
+Shape-preserving downsampling of long time series for plotting.
+
+A plot cannot show more points than it has pixel columns, so drawing every
+sample of a multi-year series only costs rendering time. Both methods keep
+the visual shape of the series, including isolated spikes:
+
+- minmax: the first, minimum, maximum and last sample of each bucket of
+  consecutive samples; fast and exact for the envelope of the curve.
+- lttb: Largest-Triangle-Three-Buckets, one sample per bucket chosen to
+  preserve the perceived shape of the line.
+"""
+import numpy as np
+
+METHODS = ('minmax', 'lttb')
+
+
+def _as_float(x):
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype('datetime64[ns]').astype(np.int64).astype(np.float64)
+    return x.astype(np.float64)
+
+
+def minmax_indices(y, buckets):
+    """
+    Indices of the first, minimum, maximum and last sample of each bucket.
+
+    Parameters:
+        y (ndarray): Sample values; NaNs are never picked as min or max.
+        buckets (int): Number of buckets, e.g. the plot width in pixels.
+
+    Returns:
+        ndarray: Sorted, unique indices into y (at most 4 * buckets).
+    """
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n <= 4 * buckets:
+        return np.arange(n)
+
+    size = -(-n // buckets)
+    padded = np.full(buckets * size, np.nan)
+    padded[:n] = y
+    rows = padded.reshape(buckets, size)
+    offsets = np.arange(buckets) * size
+    lows = np.argmin(np.where(np.isnan(rows), np.inf, rows), axis=1) + offsets
+    highs = np.argmax(np.where(np.isnan(rows), -np.inf, rows), axis=1) + offsets
+    idx = np.concatenate([offsets, np.minimum(offsets + size, n) - 1, lows, highs])
+    return np.unique(idx[idx < n])
+
+
+def lttb_indices(x, y, n_out):
+    """
+    Indices of n_out samples picked with Largest-Triangle-Three-Buckets.
+
+    The first and last samples are always kept. Each bucket in between
+    contributes the sample forming the largest triangle with the sample
+    picked from the previous bucket and the mean of the next bucket.
+    """
+    x = _as_float(x)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    idx = np.empty(n_out, dtype=np.int64)
+    idx[0], idx[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, stop = edges[i], edges[i + 1]
+        # Mean of the next bucket (the last sample for the final bucket)
+        nxt = slice(stop, edges[i + 2]) if i + 2 < len(edges) else slice(n - 1, n)
+        cx = x[nxt].mean()
+        cy = np.nanmean(y[nxt]) if np.isfinite(y[nxt]).any() else y[a]
+        area = np.abs((x[a] - cx) * (y[start:stop] - y[a]) - (x[a] - x[start:stop]) * (cy - y[a]))
+        a = start + (int(np.nanargmax(area)) if np.isfinite(area).any() else 0)
+        idx[i + 1] = a
+    return idx
+
+
+def decimate(x, y, n_out, method='minmax'):
+    """
+    Downsample a series to about n_out points for plotting.
+
+    Returns:
+        tuple: The selected x and y values.
+    """
+    if method == 'minmax':
+        idx = minmax_indices(y, max(n_out // 4, 1))
+    elif method == 'lttb':
+        idx = lttb_indices(x, y, n_out)
+    else:
+        raise ValueError(f"Unknown decimation method {method!r}, expected one of {METHODS}")
+    return np.asarray(x)[idx], np.asarray(y)[idx]
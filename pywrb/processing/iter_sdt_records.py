@@ -0,0 +1,64 @@
+"""
+Streaming access to decoded SDT records.
+"""
+from pywrb import metrics
+from pywrb.processing.sdt_decoder import RECORD_SIZE, decode_sdt_records
+from pywrb.processing.sdt_index import get_sdt_index, read_indexed_records, select_index
+
+DEFAULT_BATCH_SIZE = 1024
+
+
+def iter_sdt_batches(s_file, batch_size=DEFAULT_BATCH_SIZE, start=None, end=None, save_index=False):
+    """
+    Yield decoded records of an SDT file in batches.
+
+    Only one batch of records is read and decoded at a time, so memory use does
+    not grow with the file size (apart from the 16-byte-per-record index).
+
+    Parameters:
+        s_file (str): Path to the SDT file.
+        batch_size (int): Maximum number of records per batch.
+        start, end (datetime-like, optional): Only yield records in this time range.
+        save_index (bool): Save a newly built record index next to the file.
+
+    Yields:
+        dict: Same layout as decode_sdt_records, with at most batch_size records.
+    """
+    if batch_size < 1:
+        raise ValueError("batch_size must be at least 1")
+
+    with metrics.timer('sdt.index'):
+        index = select_index(get_sdt_index(s_file, save=save_index), start, end)
+    for i in range(0, len(index), batch_size):
+        with metrics.timer('sdt.read'):
+            records = read_indexed_records(s_file, index[i:i + batch_size])
+        metrics.inc('bytes_read', len(records) * RECORD_SIZE, pipeline='sdt')
+        with metrics.timer('sdt.decode'):
+            batch = decode_sdt_records(records)
+        if len(batch['time']):
+            yield batch
+
+
+def iter_sdt_records(s_file, batch_size=None, start=None, end=None, save_index=False):
+    """
+    Yield decoded records of an SDT file one at a time or in fixed-size batches.
+
+    Parameters:
+        s_file (str): Path to the SDT file.
+        batch_size (int, optional): Yield batches of this many records instead of
+            single records.
+        start, end (datetime-like, optional): Only yield records in this time range.
+        save_index (bool): Save a newly built record index next to the file.
+
+    Yields:
+        dict: For single records, 'time' is a datetime64[m] scalar, each spectral
+        field a (64,) float64 array and 'system' a (15,) float64 array ordered as
+        SYSTEM_FIELDS. For batches, every entry gains a leading record axis.
+    """
+    if batch_size is not None:
+        yield from iter_sdt_batches(s_file, batch_size, start, end, save_index)
+        return
+
+    for batch in iter_sdt_batches(s_file, DEFAULT_BATCH_SIZE, start, end, save_index):
+        for i in range(len(batch['time'])):
+            yield {name: values[i] for name, values in batch.items()}
@@ -0,0 +1,212 @@
+import os
+import numpy as np
+import pandas as pd
+
+from pywrb.processing.calculate_drift_velocity import drift_velocity_frame
+from pywrb.processing.nc_encoding import DEFAULT_PROFILE, write_netcdf
+from pywrb.processing.windsea_swell_seperation import windsea_swell_frame
+
+TIME_DIM = "time"
+CSV_TIME_COLUMN = "Date"
+# Time encoding of new archives; fine enough for any record that is appended later
+ARCHIVE_TIME_ENCODING = {'units': 'seconds since 1970-01-01 00:00:00', 'calendar': 'standard', 'dtype': 'int64'}
+
+
+def _encode_times(times, time_var):
+    """
+    Encode timestamps in the units, calendar and dtype of an archive's time variable.
+
+    Raises ValueError if a timestamp cannot be stored exactly, e.g. a 00:30
+    record in an archive whose times are whole days.
+    """
+    import netCDF4
+
+    dates = pd.to_datetime(np.asarray(times)).to_pydatetime()
+    values = np.asarray(netCDF4.date2num(dates, time_var.units, getattr(time_var, 'calendar', 'standard')))
+    if np.issubdtype(time_var.dtype, np.integer):
+        inexact = values != np.rint(values)
+        if inexact.any():
+            raise ValueError(f"Time {dates[np.argmax(inexact)]} cannot be stored exactly in an archive "
+                             f"with times in integer {time_var.units!r}")
+    return values.astype(time_var.dtype)
+
+
+def _make_time_unlimited(archive_path):
+    """Rewrite an archive once so that its time dimension is unlimited."""
+    import xarray as xr
+
+    print(f"Converting {archive_path} to an unlimited time dimension")
+    with xr.open_dataset(archive_path) as ds:
+        ds.load()
+    tmp_path = archive_path + '.tmp'
+    ds.to_netcdf(tmp_path, unlimited_dims=[TIME_DIM])
+    os.replace(tmp_path, archive_path)
+
+
+def _stored_layout(da, dims, sizes):
+    """Values of a new variable in the dimension order of the archive's variable."""
+    for dim in da.dims:
+        if dim not in dims:
+            # Per-record field stored along time only, e.g. Lat/Lon
+            da = da.isel({dim: 0}, drop=True)
+    values = da.transpose(*[dim for dim in dims if dim in da.dims]).values
+    missing = [i for i, dim in enumerate(dims) if dim not in da.dims]
+    if missing:
+        # Archive written by the legacy profile repeats the field along Frequency
+        shape = [len(da[dim]) if dim in da.dims else size for dim, size in zip(dims, sizes)]
+        values = np.broadcast_to(np.expand_dims(values, missing), shape)
+    return values
+
+
+def append_to_netcdf(ds, archive_path, nc_profile=DEFAULT_PROFILE):
+    """
+    Add the records of a spectral Dataset to a station NetCDF archive.
+
+    The archive is created, with an unlimited time dimension, if it does not
+    exist. Records whose timestamps are already stored are skipped. Newer
+    records are appended after the last stored one; records that fill gaps are
+    merged in, which rewrites only the stored records from the first gap on.
+
+    Parameters:
+        ds (xarray.Dataset): Records to add, as built by build_spectral_dataset.
+        archive_path (str): Path of the station archive.
+        nc_profile (str): NetCDF encoding profile (see nc_encoding) used when
+            the archive is created; later records keep the archive's encoding.
+
+    Returns:
+        slice or None: Archive records that were written, or None if every
+        record was already stored.
+    """
+    import netCDF4
+
+    if not os.path.exists(archive_path):
+        ds = ds.copy()
+        ds[TIME_DIM].encoding = dict(ARCHIVE_TIME_ENCODING)
+        write_netcdf(ds, archive_path, nc_profile, unlimited_dims=[TIME_DIM])
+        print(f"Created archive {archive_path} with {ds.sizes[TIME_DIM]} records")
+        return slice(0, ds.sizes[TIME_DIM])
+
+    with netCDF4.Dataset(archive_path) as nc:
+        unlimited = nc.dimensions[TIME_DIM].isunlimited()
+    if not unlimited:
+        _make_time_unlimited(archive_path)
+
+    with netCDF4.Dataset(archive_path, 'a') as nc:
+        if 'Frequency' in nc.variables and 'Frequency' in ds.coords:
+            frequency = nc.variables['Frequency'][:]
+            if frequency.shape != ds.Frequency.shape or not np.allclose(frequency, ds.Frequency.values):
+                raise ValueError(f"Frequency grid of the new records does not match {archive_path}")
+
+        time_var = nc.variables[TIME_DIM]
+        stored = np.ma.getdata(time_var[:])
+        new_times, first = np.unique(_encode_times(ds[TIME_DIM].values, time_var), return_index=True)
+        keep = first[~np.isin(new_times, stored)]
+        if keep.size == 0:
+            print(f"No new records for {archive_path}")
+            return None
+        new = ds.isel({TIME_DIM: np.sort(keep)})
+        new_times = _encode_times(new[TIME_DIM].values, time_var)
+
+        n_stored = len(stored)
+        start = int(np.searchsorted(stored, new_times.min())) if n_stored else 0
+        order = np.argsort(np.concatenate([stored[start:], new_times]), kind='stable')
+
+        # Bound every read by n_stored: the first write extends the time dimension
+
+        variables = [name for name, var in nc.variables.items()
+                     if var.dimensions and var.dimensions[0] == TIME_DIM]
+        for name in variables:
+            var = nc.variables[name]
+            if name == TIME_DIM:
+                added = new_times
+            elif name in new:
+                added = _stored_layout(new[name], var.dimensions, var.shape)
+            else:
+                added = np.ma.masked_all((len(new_times),) + var.shape[1:], dtype=var.dtype)
+            merged = np.ma.concatenate([var[start:n_stored], np.ma.asarray(added)])[order]
+            var[start:start + len(merged)] = merged
+
+        skipped = [name for name in new.data_vars if name not in nc.variables]
+        if skipped:
+            print(f"Variables not in {archive_path} were not appended: {', '.join(skipped)}")
+
+        n_total = n_stored + len(new_times)
+    print(f"Added {len(new_times)} records to {archive_path} ({n_total} in total)")
+    return slice(start, n_total)
+
+
+def _last_csv_time(csv_path, time_column=CSV_TIME_COLUMN):
+    """Timestamp in the last row of a CSV file, read from its tail only."""
+    with open(csv_path, 'rb') as fh:
+        header = fh.readline().decode().rstrip('\r\n').split(',')
+        fh.seek(0, os.SEEK_END)
+        fh.seek(max(fh.tell() - 65536, 0))
+        last = fh.read().splitlines()[-1].decode().split(',')
+    if last == header:
+        return None
+    return pd.Timestamp(last[header.index(time_column)])
+
+
+def update_csv(csv_path, frame, time_column=CSV_TIME_COLUMN):
+    """
+    Merge rows into a time-ordered CSV file.
+
+    Rows newer than the last stored one are appended. Otherwise the stored
+    rows from the first new timestamp on are replaced by the new rows.
+
+    Parameters:
+        csv_path (str): CSV file to update; it is created if missing.
+        frame (pandas.DataFrame): New rows, recomputed for every timestamp
+            from their first one to the end of the archive.
+        time_column (str): Name of the timestamp column.
+    """
+    if frame.empty and os.path.exists(csv_path):
+        return
+    if not os.path.exists(csv_path):
+        frame.to_csv(csv_path, index=False)
+        return
+
+    last = _last_csv_time(csv_path, time_column)
+    first_new = pd.Timestamp(frame[time_column].iloc[0])
+    if last is None or first_new > last:
+        frame.to_csv(csv_path, mode='a', header=False, index=False)
+        return
+
+    stored = pd.read_csv(csv_path, parse_dates=[time_column])
+    stored.columns = frame.columns
+    stored = stored[stored[time_column] < first_new]
+    pd.concat([stored, frame], ignore_index=True).to_csv(csv_path, index=False)
+
+
+def update_archive(archive_path, ds, windsea_csv=None, stokes_csv=None, max_depth=100,
+                   nc_profile=DEFAULT_PROFILE):
+    """
+    Append records to a station archive and bring its derived CSV files up to date.
+
+    Only the records that were written to the archive are separated into wind
+    sea and swell or turned into Stokes drift profiles.
+
+    Parameters:
+        archive_path (str): Path of the station NetCDF archive.
+        ds (xarray.Dataset): Records to add.
+        windsea_csv (str, optional): Wind-sea/swell CSV of the archive.
+        stokes_csv (str, optional): Stokes drift CSV of the archive.
+        max_depth (int): Maximum depth of the Stokes drift profiles.
+        nc_profile (str): Encoding profile of a new archive (see append_to_netcdf).
+
+    Returns:
+        slice or None: Archive records that were written (see append_to_netcdf).
+    """
+    import xarray as xr
+
+    written = append_to_netcdf(ds, archive_path, nc_profile)
+    if written is None or (windsea_csv is None and stokes_csv is None):
+        return written
+
+    with xr.open_dataset(archive_path) as archive:
+        records = archive.isel({TIME_DIM: written})
+        if windsea_csv is not None:
+            update_csv(windsea_csv, windsea_swell_frame(records))
+        if stokes_csv is not None:
+            update_csv(stokes_csv, drift_velocity_frame(records, max_depth))
+    return written
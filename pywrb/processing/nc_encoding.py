@@ -0,0 +1,133 @@
+"""
+Encoding profiles for the spectral NetCDF files.
+
+xarray writes uncompressed float64 by default. A profile chooses how each
+variable is stored instead:
+
+- legacy: uncompressed float64, Lat/Lon repeated for every frequency bin;
+  the layout written before profiles existed, and the default, so existing
+  readers keep working;
+- compressed: zlib with the shuffle filter, chunked along time, and Lat/Lon
+  stored once per record; lossless;
+- float32: as compressed, with floating point variables stored as float32;
+- packed: as float32, with the variables that the MKIII transmits as linear
+  integer codes stored as scaled integers at the buoy's native resolution.
+  Values decoded from SDT files are stored exactly; values read from
+  *_SPT.txt files are rounded to the nearest code.
+
+    ds, encoding = encode_dataset(ds, 'packed')
+    ds.to_netcdf(path, encoding=encoding)
+"""
+import numpy as np
+
+TIME_DIM = "time"
+TIME_CHUNK = 1024  # records per chunk; readers load whole time ranges of a variable
+COMPRESSION_LEVEL = 4
+
+PROFILES = {
+    'legacy': {'compress': False, 'float32': False, 'pack': False, 'positions_by_time': False},
+    'compressed': {'compress': True, 'float32': False, 'pack': False, 'positions_by_time': True},
+    'float32': {'compress': True, 'float32': True, 'pack': False, 'positions_by_time': True},
+    'packed': {'compress': True, 'float32': True, 'pack': True, 'positions_by_time': True},
+}
+DEFAULT_PROFILE = 'legacy'
+
+# Per-record fields that build_spectral_dataset may repeat along Frequency
+POSITION_FIELDS = ('Lat', 'Lon')
+
+# Variables with a linear MKIII code: (scale_factor, add_offset, dtype), see sdt_tables
+PACKING = {
+    'dir_angle': (360 / 256, 0.0, 'int16'),
+    'spr': (360 / 256 / np.pi / 4, 0.0, 'int16'),
+    'm2': (1 / 512, 0.0, 'int16'),
+    'n2': (1 / 512, 0.0, 'int16'),
+    'K': (0.01, 0.0, 'int16'),
+    'Lat': (90 / 2**23, 0.0, 'int32'),
+    'Lon': (180 / 2**23, 0.0, 'int32'),
+    'Hm0': (0.01, 0.0, 'int16'),
+    'Tref': (0.05, 0.0, 'int16'),
+    'Tsea': (0.05, 0.0, 'int16'),
+    'Av': (1 / 800, 0.0, 'int16'),
+    'Ax': (1 / 800, 0.0, 'int16'),
+    'Ay': (1 / 800, 0.0, 'int16'),
+    'ori': (360 / 256, 0.0, 'int16'),
+    'incl': (360 / 256 / 2 / 16, -90.0, 'int16'),
+    'Bat': (1.0, 0.0, 'int16'),
+    'BLE': (1.0, 0.0, 'int16'),
+    'GPS': (1.0, 0.0, 'int16'),
+}
+
+
+def get_profile(name):
+    """Settings of an encoding profile; raises ValueError for unknown names."""
+    try:
+        return PROFILES[name]
+    except KeyError:
+        raise ValueError(f"Unknown NetCDF profile {name!r}, expected one of {', '.join(PROFILES)}") from None
+
+
+def positions_by_time(ds):
+    """Store Lat/Lon along time only where they are the same for every frequency bin."""
+    for name in POSITION_FIELDS:
+        if name not in ds or ds[name].dims != (TIME_DIM, 'Frequency'):
+            continue
+        values = ds[name].values
+        first = values[:, :1]
+        if np.all((values == first) | (np.isnan(values) & np.isnan(first))):
+            ds = ds.assign({name: ds[name].isel(Frequency=0, drop=True)})
+    return ds
+
+
+def _fits_packing(values, scale, offset, dtype):
+    """Whether all values can be stored as dtype codes (the minimum is kept for missing values)."""
+    with np.errstate(invalid='ignore'):
+        codes = np.rint((values - offset) / scale)
+    info = np.iinfo(dtype)
+    codes = codes[~np.isnan(values)]
+    return bool(np.all(np.isfinite(codes)) and np.all((codes > info.min) & (codes <= info.max)))
+
+
+def variable_encoding(da, profile):
+    """to_netcdf encoding of one data variable."""
+    encoding = {}
+    if profile['compress']:
+        encoding.update(zlib=True, complevel=COMPRESSION_LEVEL, shuffle=True)
+        encoding['chunksizes'] = tuple(
+            max(1, min(size, TIME_CHUNK)) if dim == TIME_DIM else size
+            for dim, size in zip(da.dims, da.shape))
+    if da.dtype.kind != 'f':
+        return encoding
+
+    if profile['pack'] and da.name in PACKING and _fits_packing(da.values, *PACKING[da.name]):
+        scale, offset, dtype = PACKING[da.name]
+        encoding.update(dtype=dtype, scale_factor=scale, add_offset=offset,
+                        _FillValue=np.iinfo(dtype).min)
+    elif profile['float32']:
+        encoding['dtype'] = 'float32'
+    return encoding
+
+
+def encode_dataset(ds, profile=DEFAULT_PROFILE):
+    """
+    Prepare a spectral Dataset for writing with an encoding profile.
+
+    Parameters:
+        ds (xarray.Dataset): Dataset as built by build_spectral_dataset.
+        profile (str): Name of a profile in PROFILES.
+
+    Returns:
+        tuple: The Dataset to write (Lat/Lon possibly reduced to time only)
+        and the encoding argument for to_netcdf.
+    """
+    settings = get_profile(profile)
+    if settings['positions_by_time']:
+        ds = positions_by_time(ds)
+    encoding = {name: variable_encoding(ds[name], settings) for name in ds.data_vars}
+    return ds, {name: enc for name, enc in encoding.items() if enc}
+
+
+def write_netcdf(ds, path, profile=DEFAULT_PROFILE, **kwargs):
+    """Write a spectral Dataset with an encoding profile; kwargs go to to_netcdf."""
+    ds, encoding = encode_dataset(ds, profile)
+    ds.to_netcdf(path, encoding=encoding, **kwargs)
+    return path
@@ -0,0 +1,295 @@
+"""
+Wind-sea/swell separation and Stokes drift for many NetCDF files in parallel.
+
+The calling process reads each file in slices of chunk_size records and
+copies the spectra of every slice into a shared memory block; worker
+processes attach to the block, compute into a second shared block, and
+return only their metrics. Slices of all files are fanned out across the
+pool, so a single long archive uses every worker as well as a folder of
+short files. Results are collected in submission order and appended to each
+file's CSV output as they arrive, with at most a few slices per worker in
+flight.
+
+    results = analyse_files('windsea_swell', files, output_folder, max_workers=8)
+"""
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import groupby
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from pywrb import metrics
+from pywrb.cache import lookup_outputs
+from pywrb.processing.calculate_drift_velocity import (
+    drift_chunk_frame, drift_depths, iter_drift_velocity, stokes_drift_profile)
+from pywrb.processing.time_chunks import CHUNK_SIZE, iter_time_chunks, write_csv_chunks
+from pywrb.processing.windsea_swell_seperation import (
+    iter_windsea_swell, separate_windsea_swell, windsea_swell_chunk_frame)
+
+PENDING_PER_WORKER = 2  # slices queued per worker while earlier ones are written
+
+
+def _separation_setup():
+    return {}, 3, np.float64, None
+
+
+def _separation_kernel(frequency, spectra, out):
+    valid, out[:, 1], out[:, 2] = separate_windsea_swell(frequency, spectra)
+    out[:, 0] = valid
+
+
+def _separation_frame(time, out, columns):
+    return windsea_swell_chunk_frame(time, out[:, 0].astype(bool), out[:, 1], out[:, 2])
+
+
+def _drift_setup(maximum_depth=100, depths=None, dtype=np.float64):
+    depths, columns = drift_depths(maximum_depth, depths)
+    dtype = np.dtype(dtype)
+    return {'depths': depths, 'dtype': dtype}, len(depths), dtype, columns
+
+
+def _drift_kernel(frequency, spectra, out, depths, dtype):
+    out[:] = np.round(stokes_drift_profile(frequency, spectra, depths, dtype), 3)
+
+
+# setup(**params) -> (worker arguments, output columns, output dtype, frame columns)
+ANALYSES = {
+    'windsea_swell': {
+        'pipeline': 'windsea', 'stage': 'windsea.separate', 'output': '{base}_windsea_swell.csv',
+        'setup': _separation_setup, 'kernel': _separation_kernel,
+        'frame': _separation_frame, 'iter': iter_windsea_swell,
+    },
+    'stokes_drift': {
+        'pipeline': 'drift', 'stage': 'drift.compute', 'output': 'stokes_drift_{base}.csv',
+        'setup': _drift_setup, 'kernel': _drift_kernel,
+        'frame': drift_chunk_frame,
+        'iter': iter_drift_velocity,
+    },
+}
+
+
+def get_analysis(kind):
+    """Settings of an analysis; raises ValueError for unknown kinds."""
+    try:
+        return ANALYSES[kind]
+    except KeyError:
+        raise ValueError(f"Unknown analysis {kind!r}, expected one of {', '.join(ANALYSES)}") from None
+
+
+def _shared_array(shape, dtype):
+    """A new shared memory block and its (name, shape, dtype) descriptor."""
+    dtype = np.dtype(dtype)
+    block = SharedMemory(create=True, size=max(int(np.prod(shape)) * dtype.itemsize, 1))
+    return block, (block.name, tuple(shape), dtype.str)
+
+
+def _view(block, descriptor):
+    return np.ndarray(descriptor[1], dtype=descriptor[2], buffer=block.buf)
+
+
+def _compute_chunk(kind, frequency, blocks, spectra, output, worker_args):
+    get_analysis(kind)['kernel'](frequency, _view(blocks[0], spectra), _view(blocks[1], output), **worker_args)
+
+
+def _run_chunk(kind, frequency, spectra, output, worker_args):
+    """
+    Analyse one slice in a worker process.
+
+    spectra and output describe the shared memory blocks of the input
+    spectra and the result. Returns the metrics recorded by the worker.
+    """
+    blocks = [SharedMemory(name=spectra[0]), SharedMemory(name=output[0])]
+    error = None
+    with metrics.capture() as registry:
+        try:
+            with metrics.timer(get_analysis(kind)['stage']):
+                _compute_chunk(kind, frequency, blocks, spectra, output, worker_args)
+        except Exception as e:
+            # Drop the traceback, which holds views of the blocks, so they can be closed
+            error = e.with_traceback(None)
+    for block in blocks:
+        block.close()
+    if error is not None:
+        raise error
+    return registry.export()
+
+
+def _release(blocks):
+    for block in blocks:
+        block.close()
+        block.unlink()
+
+
+def _failed(error):
+    future = Future()
+    future.set_exception(error)
+    return future
+
+
+def _submit_slices(executor, kind, index, path, chunk_size, worker_args, n_out, out_dtype):
+    """
+    Read a file slice by slice and submit each slice to the pool.
+
+    Yields the pending entries (job index, time, future, blocks, output
+    descriptor); a file that cannot be read ends with an entry whose future
+    holds the error.
+    """
+    import xarray as xr
+
+    pipeline = get_analysis(kind)['pipeline']
+    try:
+        with xr.open_dataset(path) as ds:
+            frequency = ds.Frequency.values
+            for chunk in iter_time_chunks(ds, ['time', 'SmaxXpsd'], chunk_size, stage=f"{pipeline}.read"):
+                spectra = chunk['SmaxXpsd']
+                metrics.inc('bytes_read', spectra.nbytes, pipeline=pipeline)
+                metrics.inc('records_processed', len(spectra), pipeline=pipeline)
+
+                in_block, in_desc = _shared_array(spectra.shape, spectra.dtype)
+                out_block, out_desc = _shared_array((len(spectra), n_out), out_dtype)
+                try:
+                    view = _view(in_block, in_desc)
+                    view[:] = spectra
+                    del view
+                    future = executor.submit(_run_chunk, kind, frequency, in_desc, out_desc, worker_args)
+                except BaseException:
+                    _release((in_block, out_block))
+                    raise
+                yield index, chunk['time'], future, (in_block, out_block), out_desc
+    except Exception as e:
+        yield index, None, _failed(e), (), None
+
+
+def _iter_results(executor, kind, jobs, chunk_size, worker_args, n_out, out_dtype, columns, max_pending):
+    """
+    Submit the slices of all files and yield (job index, DataFrame or exception) in order.
+
+    A file that cannot be read yields its exception in place of its
+    remaining slices.
+    """
+    analysis = get_analysis(kind)
+    pending = deque()
+
+    def collect(limit):
+        while len(pending) > limit:
+            index, time, future, blocks, output = pending.popleft()
+            try:
+                error = future.exception()
+                if error is not None:
+                    yield index, error
+                    continue
+                metrics.merge(future.result())
+                view = _view(blocks[1], output)
+                out = view.copy()
+                del view
+            finally:
+                _release(blocks)
+            yield index, analysis['frame'](time, out, columns)
+
+    try:
+        for index, path in jobs:
+            for entry in _submit_slices(executor, kind, index, path, chunk_size, worker_args, n_out, out_dtype):
+                pending.append(entry)
+                yield from collect(max_pending)
+        yield from collect(0)
+    finally:
+        # Consumer stopped early: free the blocks of slices that were never collected
+        while pending:
+            _, _, future, blocks, _ = pending.popleft()
+            future.cancel()
+            _release(blocks)
+
+
+def _chunk_frames(items):
+    for _, item in items:
+        if isinstance(item, Exception):
+            raise item
+        yield item
+
+
+def analyse_files(kind, files, output_folder, max_workers=None, chunk_size=CHUNK_SIZE,
+                  progress=None, cache=None, **params):
+    """
+    Run an analysis over NetCDF files, fanning slices of records out to worker processes.
+
+    A failure in one file does not stop the others.
+
+    Parameters:
+        kind (str): 'windsea_swell' or 'stokes_drift'.
+        files (list): Paths of the NetCDF files.
+        output_folder (str): Folder for the CSV outputs, named as the
+            single-file functions name them.
+        max_workers (int, optional): Number of worker processes (default: CPU
+            count). With 1, files are analysed in the calling process.
+        chunk_size (int): Records per slice; the unit of work of a worker.
+        progress (callable, optional): Called as progress(result) after each file.
+        cache (ResultCache, optional): Serve outputs of previously analysed,
+            identical files from this cache.
+        **params: Parameters of the analysis, e.g. maximum_depth or depths
+            for 'stokes_drift'.
+
+    Returns:
+        list: One dict per input file, in input order, with keys 'file',
+        'output', 'success', 'rows' (rows written, None for cache hits) and
+        'error' (None on success).
+    """
+    analysis = get_analysis(kind)
+    worker_args, n_out, out_dtype, columns = analysis['setup'](**params)
+    os.makedirs(output_folder, exist_ok=True)
+    results = {}
+    outputs = {}
+    jobs = []
+    keys = {}
+
+    def record(path, rows, error):
+        results[path] = {'file': path, 'output': outputs[path], 'success': error is None,
+                         'rows': rows, 'error': error}
+        metrics.inc('files_processed', pipeline=analysis['pipeline'],
+                    outcome='success' if error is None else 'failure')
+        if progress is not None:
+            progress(results[path])
+
+    for path in files:
+        base = os.path.splitext(os.path.basename(path))[0]
+        outputs[path] = os.path.join(output_folder, analysis['output'].format(base=base))
+        try:
+            keys[path], hit = lookup_outputs(cache, path, kind, params, output_folder, base)
+        except OSError as e:
+            record(path, None, str(e))
+            continue
+        if hit is not None:
+            record(path, None, None)
+        else:
+            jobs.append((len(jobs), path))
+
+    def finish(path, write):
+        try:
+            rows = write()
+        except Exception as e:
+            record(path, None, str(e))
+            return
+        if keys[path] is not None:
+            cache.store(keys[path], [outputs[path]], os.path.splitext(os.path.basename(path))[0])
+        record(path, rows, None)
+
+    if max_workers == 1:
+        import xarray as xr
+
+        def serial(path):
+            with xr.open_dataset(path) as ds:
+                return write_csv_chunks(analysis['iter'](ds, chunk_size=chunk_size, **params), outputs[path])
+
+        for _, path in jobs:
+            finish(path, lambda: serial(path))
+    elif jobs:
+        max_workers = max_workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            stream = _iter_results(executor, kind, jobs, chunk_size, worker_args, n_out, out_dtype,
+                                   columns, PENDING_PER_WORKER * max_workers)
+            for index, items in groupby(stream, key=lambda item: item[0]):
+                path = jobs[index][1]
+                finish(path, lambda: write_csv_chunks(_chunk_frames(items), outputs[path]))
+
+    return [results[path] for path in files]
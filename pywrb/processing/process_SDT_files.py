@@ -0,0 +1,115 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from pywrb import metrics
+from pywrb.cache import cached_outputs
+from pywrb.processing.process_SDT_file import process_SDT_file
+from pywrb.processing.SDT_to_NC import convert_sdt_to_nc
+from pywrb.processing.nc_encoding import DEFAULT_PROFILE, get_profile
+
+OUTPUT_FORMATS = ('text', 'netcdf', 'both')
+
+def _process_in_worker(*args):
+    """Run _process_one in a worker process; also returns the metrics it recorded."""
+    with metrics.capture() as registry:
+        n_records, outputs = _process_one(*args)
+    return n_records, outputs, registry.export()
+
+
+def _process_one(s_file, processed_folder, output_format, converted_folder, cache=None,
+                 nc_profile=DEFAULT_PROFILE):
+    """Process a single SDT file. Returns the number of records and the paths of the outputs."""
+    if not os.path.exists(s_file):
+        raise FileNotFoundError(f"File {os.path.basename(s_file)} not found!")
+    base = os.path.splitext(os.path.basename(s_file))[0]
+    n_records = 0
+    outputs = []
+
+    if output_format in ('text', 'both'):
+        def compute_text():
+            n = process_SDT_file(s_file, processed_folder=processed_folder)
+            outputs = [os.path.join(processed_folder, base + suffix) for suffix in ('.his', '_225.csv', '_SPT.txt')]
+            return outputs, {'records': n}
+
+        metadata = cached_outputs(cache, s_file, 'sdt_text', {}, processed_folder, base, compute_text)
+        n_records = metadata['records']
+        outputs += [os.path.join(processed_folder, base + suffix) for suffix in ('.his', '_225.csv', '_SPT.txt')]
+
+    if output_format in ('netcdf', 'both'):
+        def compute_netcdf():
+            import xarray as xr
+
+            ds_path = convert_sdt_to_nc(s_file, converted_folder, nc_profile=nc_profile)
+            if ds_path is None:
+                return [], {'records': 0}
+            with xr.open_dataset(ds_path) as ds:
+                return [ds_path], {'records': ds.sizes['time']}
+
+        metadata = cached_outputs(cache, s_file, 'sdt_netcdf', {'nc_profile': nc_profile},
+                                  converted_folder, base, compute_netcdf)
+        if output_format == 'netcdf':
+            n_records = metadata['records']
+        if metadata['records']:
+            outputs.append(os.path.join(converted_folder, base + '_SPT.nc'))
+    return n_records, [path for path in outputs if os.path.exists(path)]
+
+
+def process_SDT_files(s_files, processed_folder, max_workers=None, output_format='text',
+                      converted_folder=None, progress=None, cache=None, nc_profile=DEFAULT_PROFILE):
+    """
+    Process many SDT files concurrently in a pool of worker processes.
+
+    A failure in one file does not stop the others.
+
+    Parameters:
+        s_files (list): Paths of the SDT files.
+        processed_folder (str): Folder for the .his, _225.csv and _SPT.txt outputs.
+        max_workers (int, optional): Number of worker processes (default: CPU count).
+            With 1, files are processed in the calling process.
+        output_format (str): 'text', 'netcdf' or 'both'.
+        converted_folder (str, optional): Folder for NetCDF outputs
+            (default: processed_folder).
+        progress (callable, optional): Called as progress(result) after each file.
+        cache (ResultCache, optional): Serve outputs of previously processed,
+            identical files from this cache.
+        nc_profile (str): Encoding profile of the NetCDF outputs, see nc_encoding.
+
+    Returns:
+        list: One dict per input file, in input order, with keys 'file',
+        'success', 'records' (number of records decoded), 'outputs' (paths of
+        the files written) and 'error' (None on success).
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format: {output_format}")
+    get_profile(nc_profile)
+    converted_folder = converted_folder or processed_folder
+    args = (processed_folder, output_format, converted_folder, cache, nc_profile)
+    results = {}
+
+    def record(s_file, n_records, error, outputs=()):
+        results[s_file] = {'file': s_file, 'success': error is None, 'records': n_records,
+                           'outputs': list(outputs), 'error': error}
+        metrics.inc('files_processed', pipeline='sdt', outcome='success' if error is None else 'failure')
+        if progress is not None:
+            progress(results[s_file])
+
+    if max_workers == 1 or len(s_files) <= 1:
+        for s_file in s_files:
+            try:
+                n_records, outputs = _process_one(s_file, *args)
+                record(s_file, n_records, None, outputs)
+            except Exception as e:
+                record(s_file, 0, str(e))
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(_process_in_worker, s_file, *args): s_file for s_file in s_files}
+            for future in as_completed(futures):
+                error = future.exception()
+                if error is None:
+                    n_records, outputs, worker_metrics = future.result()
+                    metrics.merge(worker_metrics)
+                    record(futures[future], n_records, None, outputs)
+                else:
+                    record(futures[future], 0, str(error))
+
+    return [results[s_file] for s_file in s_files]
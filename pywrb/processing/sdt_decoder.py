@@ -0,0 +1,183 @@
+"""
+Vectorized decoder for Datawell MKIII SDT files.
+
+The whole file is read into a NumPy structured array with one element per
+556-byte record, and every field of every record is decoded at once with
+array operations. Scaled fields are looked up in the precomputed tables of
+sdt_tables instead of being recomputed for every record.
+"""
+import os
+import numpy as np
+
+from pywrb.processing import sdt_tables
+
+RECORD_SIZE = 556
+N_FREQ = 64
+
+SDT_RECORD_DTYPE = np.dtype([
+    ('header', np.uint8, (5,)),
+    ('timestamp', np.uint8, (6,)),
+    ('spectrum', np.uint8, (N_FREQ, 8)),
+    ('system', np.uint8, (32,)),
+    ('checksum', np.uint8),
+])
+
+# Column order of the (n_records x 15) system array
+SYSTEM_FIELDS = ('Hm0', 'Tz', 'Smax', 'Tref', 'Tsea', 'Bat', 'BLE', 'Av', 'Ax', 'Ay',
+                 'GPS', 'Lat', 'Lon', 'ori', 'incl')
+
+# Column order of the per-frequency rows written to *_SPT.txt
+SPECTRAL_FIELDS = ('Frequency', 'SmaxXpsd', 'dir_angle', 'spr', 'skw', 'kurt',
+                   'm2', 'n2', 'K', 'Lat', 'Lon')
+
+
+def read_sdt_records(s_file):
+    """Read all complete records of an SDT file into a structured array."""
+    n_records = os.path.getsize(s_file) // RECORD_SIZE
+    return np.fromfile(s_file, dtype=SDT_RECORD_DTYPE, count=n_records)
+
+
+def record_checksums(records):
+    """XOR of the timestamp, data and checksum bytes of each record (0 when valid)."""
+    raw = records.view(np.uint8).reshape(-1, RECORD_SIZE)
+    return np.bitwise_xor.reduce(raw[:, 5:], axis=1)
+
+
+def decode_timestamps(tms):
+    """
+    Decode (n_records x 6) timestamp bytes.
+
+    Returns:
+        tuple: datetime64[m] array and a boolean mask of valid timestamps.
+    """
+    tms = tms.astype(np.int64)
+    year = tms[:, 0] * 256 + tms[:, 1]
+    month, day, hour, minute = tms[:, 2], tms[:, 3], tms[:, 4], tms[:, 5]
+
+    valid = (month >= 1) & (month <= 12) & (day >= 1) & (hour < 24) & (minute < 60)
+    months = np.where(valid, (year - 1970) * 12 + month - 1, 0).astype('datetime64[M]')
+    dates = months.astype('datetime64[D]') + np.where(valid, day - 1, 0).astype('timedelta64[D]')
+    # Reject days that overflow into the next month (e.g. 31 February)
+    valid &= dates.astype('datetime64[M]') == months
+
+    times = (dates.astype('datetime64[m]')
+             + (hour * 60 + minute).astype('timedelta64[m]'))
+    times[~valid] = np.datetime64('NaT')
+    return times, valid
+
+
+def decode_system_data(bsys):
+    """Decode (n_records x 32) system bytes into an (n_records x 15) array."""
+    b = bsys.astype(np.int64)
+
+    def word(i):
+        return b[:, i] * 256 + b[:, i + 1]
+
+    def signed_acc(i):
+        return sdt_tables.ACCELERATION[word(i) % 4096]
+
+    def position(i, scale):
+        p = (((b[:, i] % 16) * 256 + b[:, i + 1]) * 16 + (b[:, i + 2] % 16)) * 256 + b[:, i + 3]
+        p = (p % (2**24)) / (2**23) * scale
+        return np.where(p > scale, scale - p, p)
+
+    GPS = (b[:, 1] // 16) % 8
+    Hm0 = sdt_tables.HM0[word(2) % 4096]
+    Tz = sdt_tables.TZ[b[:, 5]]
+    Smax = sdt_tables.SMAX[word(6) % 4096]
+    Tref = sdt_tables.TEMPERATURE[word(8) % 1024]
+    Tsea = sdt_tables.TEMPERATURE[word(10) % 1024]
+    Bat = b[:, 12] % 8
+    BLE = (word(12) // 16) % 256
+    Av = signed_acc(14)
+    Ax = signed_acc(16)
+    Ay = signed_acc(18)
+    Lat = position(20, 90)
+    Lon = position(24, 180)
+    ori = sdt_tables.ORIENTATION[word(28) % 4096]
+    incl = sdt_tables.INCLINATION[b[:, 31] * 16 + b[:, 30] % 16]
+
+    return np.column_stack([Hm0, Tz, Smax, Tref, Tsea, Bat, BLE, Av, Ax, Ay,
+                            GPS, Lat, Lon, ori, incl]).astype(np.float64)
+
+
+def decode_spectral_data(bspt, smax):
+    """
+    Decode (n_records x 64 x 8) spectral bytes.
+
+    Parameters:
+        bspt (ndarray): Spectral bytes of each record.
+        smax (ndarray): Smax of each record, used to scale the normalised PSD.
+
+    Returns:
+        dict: (n_records x 64) arrays keyed by SPECTRAL_FIELDS (without Lat/Lon).
+    """
+    s = bspt.astype(np.int64)
+
+    frq = sdt_tables.FREQUENCY[s[..., 0] % 64]
+    dir_angle = sdt_tables.DIR_ANGLE[s[..., 1]]
+    psd = sdt_tables.PSD[(s[..., 2] * 256 + s[..., 3]) % 4096]
+    # Spread, m2 and n2 carry two extra low bits in bytes 0 and 2
+    spr = sdt_tables.SPREAD[s[..., 4] * 4 + s[..., 0] // 64]
+    m2 = sdt_tables.FOURIER[s[..., 5] * 4 + s[..., 2] // 64]
+    n2 = sdt_tables.FOURIER[s[..., 6] * 4 + (s[..., 2] // 16) % 4]
+    K = sdt_tables.CHECK_FACTOR[s[..., 7]]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sgmc = spr * np.pi / 180
+        m1 = 1 - sgmc**2 / 2
+        sgmca = np.sqrt((1 - m2) / 2)
+        skw = -n2 / sgmca**3
+        kurt = (6 - 8 * m1 + 2 * m2) / sgmc**4
+
+    return {
+        'Frequency': frq,
+        'SmaxXpsd': smax[:, None] * psd,
+        'dir_angle': dir_angle,
+        'spr': spr,
+        'skw': skw,
+        'kurt': kurt,
+        'm2': m2,
+        'n2': n2,
+        'K': K,
+    }
+
+
+def decode_sdt_records(records):
+    """
+    Decode a structured array of SDT records.
+
+    Records that fail the checksum or carry an invalid timestamp are dropped.
+
+    Returns:
+        dict: 'time' (n_records,), the spectral fields of SPECTRAL_FIELDS as
+        (n_records x 64) arrays (Lat/Lon excluded) and 'system' (n_records x 15).
+    """
+    times, valid = decode_timestamps(records['timestamp'])
+    valid &= record_checksums(records) == 0
+    records = records[valid]
+
+    system = decode_system_data(records['system'])
+    data = decode_spectral_data(records['spectrum'], system[:, SYSTEM_FIELDS.index('Smax')])
+    data['time'] = times[valid]
+    data['system'] = system
+    return data
+
+
+def decode_sdt_file(s_file, start=None, end=None, save_index=False):
+    """
+    Read and decode every valid record of an SDT file.
+
+    Record boundaries come from the file's offset index, so decoding resyncs
+    after damaged records. A saved index is reused when it is up to date.
+
+    Parameters:
+        s_file (str): Path to the SDT file.
+        start, end (datetime-like, optional): Only decode records in this time range.
+        save_index (bool): Save a newly built index next to the file.
+    """
+    # sdt_index builds on this module, so it is imported here
+    from pywrb.processing.sdt_index import get_sdt_index, read_indexed_records, select_index
+
+    index = select_index(get_sdt_index(s_file, save=save_index), start, end)
+    return decode_sdt_records(read_indexed_records(s_file, index))
@@ -0,0 +1,179 @@
+"""
+Record index for SDT files.
+
+Checksums are validated for every byte offset of the file at once with a
+prefix XOR, so record boundaries can be recovered after corrupted or short
+records instead of trusting the fixed 556-byte stride. The resulting
+offset/timestamp index can be saved next to the SDT file and reused to read
+only the records of a given time range.
+"""
+import os
+import numpy as np
+
+from pywrb.processing.sdt_decoder import RECORD_SIZE, SDT_RECORD_DTYPE, decode_timestamps
+
+INDEX_SUFFIX = '.idx.npz'
+SCAN_BLOCK_SIZE = 8 * 1024 * 1024  # bytes per block of the checksum scan
+
+SDT_INDEX_DTYPE = np.dtype([
+    ('offset', np.int64),
+    ('time', 'datetime64[m]'),
+])
+
+
+def _timestamps_at(buf, offsets):
+    """Decode the timestamp bytes of the records starting at the given offsets."""
+    tms = buf[offsets[:, None] + np.arange(5, 11)]
+    return decode_timestamps(tms)
+
+
+def find_candidate_offsets(buf, block_size=SCAN_BLOCK_SIZE):
+    """
+    Find every byte offset at which a record passes the checksum.
+
+    The XOR over bytes [o + 5, o + 556) is computed for all offsets o of a
+    block from the block's prefix XOR. Offsets whose timestamp does not
+    decode to a valid date are discarded as well.
+
+    Parameters:
+        buf (ndarray): uint8 contents of the SDT file (may be a memmap).
+        block_size (int): Number of offsets scanned per block.
+
+    Returns:
+        ndarray: Sorted int64 candidate record offsets.
+    """
+    n_offsets = len(buf) - RECORD_SIZE + 1
+    candidates = []
+    for start in range(0, max(n_offsets, 0), block_size):
+        stop = min(start + block_size, n_offsets)
+        block = np.asarray(buf[start:stop + RECORD_SIZE - 1])
+        prefix = np.concatenate((np.zeros(1, np.uint8), np.bitwise_xor.accumulate(block)))
+        checks = prefix[RECORD_SIZE:RECORD_SIZE + stop - start] ^ prefix[5:5 + stop - start]
+        local = np.flatnonzero(checks == 0)
+        _, valid = _timestamps_at(block, local)
+        candidates.append(local[valid] + start)
+
+    if not candidates:
+        return np.zeros(0, dtype=np.int64)
+    return np.concatenate(candidates).astype(np.int64)
+
+
+def resync_offsets(candidates):
+    """
+    Select record offsets from checksum candidates.
+
+    Candidates are grouped into runs spaced exactly one record apart. Runs are
+    accepted in file order, skipping records that overlap one already accepted.
+    A single isolated candidate is only accepted when it keeps the alignment of
+    the previous run (a good record between two damaged ones); otherwise it is
+    treated as a chance checksum match inside damaged data.
+    """
+    if len(candidates) == 0:
+        return candidates
+
+    phase = candidates % RECORD_SIZE
+    ordered = candidates[np.lexsort((candidates, phase))]
+    breaks = np.flatnonzero(np.diff(ordered) != RECORD_SIZE) + 1
+    runs = sorted(np.split(ordered, breaks), key=lambda run: run[0])
+
+    accepted = []
+    cursor = 0
+    current_phase = 0
+    for run in runs:
+        run_phase = run[0] % RECORD_SIZE
+        if len(run) < 2 and run_phase != current_phase:
+            continue
+        run = run[run >= cursor]
+        if len(run) == 0:
+            continue
+        accepted.append(run)
+        cursor = run[-1] + RECORD_SIZE
+        current_phase = run_phase
+
+    return np.concatenate(accepted) if accepted else candidates[:0]
+
+
+def build_sdt_index(s_file):
+    """
+    Build the offset/timestamp index of an SDT file.
+
+    Returns:
+        ndarray: Structured array with 'offset' and 'time' of each valid record.
+    """
+    buf = np.memmap(s_file, dtype=np.uint8, mode='r') if os.path.getsize(s_file) else np.zeros(0, np.uint8)
+    offsets = resync_offsets(find_candidate_offsets(buf))
+
+    index = np.zeros(len(offsets), dtype=SDT_INDEX_DTYPE)
+    index['offset'] = offsets
+    index['time'], _ = _timestamps_at(buf, offsets)
+    return index
+
+
+def index_path(s_file):
+    """Path of the index saved next to an SDT file."""
+    return s_file + INDEX_SUFFIX
+
+
+def save_sdt_index(s_file, index):
+    """Save an index next to its SDT file, tagged with the file's size and mtime."""
+    stat = os.stat(s_file)
+    path = index_path(s_file)
+    np.savez(path, offset=index['offset'], time=index['time'],
+             size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+    return path
+
+
+def load_sdt_index(s_file):
+    """Load the saved index of an SDT file, or None if it is missing or stale."""
+    path = index_path(s_file)
+    if not os.path.exists(path):
+        return None
+
+    stat = os.stat(s_file)
+    with np.load(path) as saved:
+        if int(saved['size']) != stat.st_size or int(saved['mtime_ns']) != stat.st_mtime_ns:
+            return None
+        index = np.zeros(len(saved['offset']), dtype=SDT_INDEX_DTYPE)
+        index['offset'] = saved['offset']
+        index['time'] = saved['time']
+    return index
+
+
+def get_sdt_index(s_file, save=False):
+    """Return the saved index of an SDT file, building (and optionally saving) it if needed."""
+    index = load_sdt_index(s_file)
+    if index is None:
+        index = build_sdt_index(s_file)
+        if save:
+            save_sdt_index(s_file, index)
+    return index
+
+
+def select_index(index, start=None, end=None):
+    """Restrict an index to records with start <= time <= end."""
+    mask = np.ones(len(index), dtype=bool)
+    if start is not None:
+        mask &= index['time'] >= np.datetime64(start, 'm')
+    if end is not None:
+        mask &= index['time'] <= np.datetime64(end, 'm')
+    return index[mask]
+
+
+def read_indexed_records(s_file, index):
+    """
+    Read the records listed in an index into a structured array.
+
+    Contiguous records are read as one slice of the memory-mapped file, so
+    only the parts of the file covered by the index are touched.
+    """
+    offsets = index['offset']
+    if len(offsets) == 0:
+        return np.zeros(0, dtype=SDT_RECORD_DTYPE)
+
+    buf = np.memmap(s_file, dtype=np.uint8, mode='r')
+    breaks = np.flatnonzero(np.diff(offsets) != RECORD_SIZE) + 1
+    parts = []
+    for run in np.split(offsets, breaks):
+        chunk = np.array(buf[run[0]:run[-1] + RECORD_SIZE])
+        parts.append(chunk.view(SDT_RECORD_DTYPE))
+    return np.concatenate(parts)
@@ -0,0 +1,61 @@
+"""
+Lookup tables for decoding MKIII SDT fields.
+
+Every scaled field of an SDT record is a function of a small integer code
+(8, 10 or 12 bits), so its physical values are computed once here and
+decoding becomes table indexing, e.g. PSD[codes]. The tables are built with
+the same expressions the decoder used before, so the decoded values are
+unchanged.
+"""
+import numpy as np
+
+
+def _table(values):
+    table = np.asarray(values, dtype=np.float64)
+    table.setflags(write=False)
+    return table
+
+
+_CODE8 = np.arange(256)
+_CODE10 = np.arange(1024)
+_CODE12 = np.arange(4096)
+
+# Frequency bin index (6 bits) -> frequency in Hz
+FREQUENCY = _table(np.where(_CODE8[:64] < 16, _CODE8[:64] * 0.005 + 0.025, _CODE8[:64] * 0.01 - 0.05))
+
+# Normalised PSD code (12 bits) -> PSD / Smax
+PSD = _table(np.exp(-0.005 * _CODE12))
+
+# Smax code (12 bits) -> Smax in m^2/Hz
+SMAX = _table(np.exp(-0.005 * _CODE12) * 5000)
+
+# Direction byte -> degrees
+DIR_ANGLE = _table(_CODE8 * 360 / 256)
+
+# Spread byte * 4 + 2 LSBs -> degrees
+SPREAD = _table((_CODE10 // 4 + (_CODE10 % 4) / 4) * 360 / 256 / np.pi)
+
+# m2 or n2 byte * 4 + 2 LSBs -> centred Fourier coefficient
+FOURIER = _table((_CODE10 // 4 + (_CODE10 % 4) / 4) / 128 - 1)
+
+# Check factor byte -> K
+CHECK_FACTOR = _table(_CODE8 * 0.01)
+
+# Hm0 code (12 bits) -> metres
+HM0 = _table(_CODE12 / 100)
+
+# Tz byte -> seconds (code 0 means no estimate and decodes to inf)
+with np.errstate(divide='ignore'):
+    TZ = _table(400 / _CODE8)
+
+# Temperature code (10 bits) -> degrees Celsius
+TEMPERATURE = _table(_CODE10 / 20 - 5)
+
+# Acceleration code (12 bits) -> m/s^2
+ACCELERATION = _table(np.where(_CODE12 > 2048, 2048 - _CODE12, _CODE12) / 800)
+
+# Orientation code (12 bits) -> degrees
+ORIENTATION = _table(_CODE12 * 360 / 256)
+
+# Inclination byte * 16 + 4 LSBs -> degrees
+INCLINATION = _table((_CODE12 // 16 + (_CODE12 % 16) / 16) * 360 / 256 / 2 - 90)
@@ -0,0 +1,97 @@
+"""
+Spectral moments and wave parameters for many spectra at once.
+
+The trapezoidal moment integrals of every order are written as one matrix
+product between the (n_records x n_freq) spectra and a precomputed
+(n_freq x n_orders) frequency-power matrix, cached per frequency grid.
+"""
+from functools import lru_cache
+import numpy as np
+
+# Orders of the moments of S(f) (mom) and S(f)**2 (mom2). Moment of order n is
+# stored at column n + MOMENT_OFFSET (resp. n + MOMENT2_OFFSET); column 0 is unused.
+MOMENT_ORDERS = tuple(range(-2, 5))
+MOMENT2_ORDERS = tuple(range(-4, 9))
+MOMENT_OFFSET = 3
+MOMENT2_OFFSET = 5
+
+
+@lru_cache(maxsize=32)
+def _cached_power_matrix(frequency_bytes, orders):
+    frequency = np.frombuffer(frequency_bytes, dtype=np.float64)
+    # Trapezoid weight of each bin: half of the spacing on either side
+    spacing = np.diff(frequency)
+    weights = 0.5 * (np.concatenate(([0.0], spacing)) + np.concatenate((spacing, [0.0])))
+    with np.errstate(divide='ignore'):
+        matrix = frequency[:, None] ** np.array(orders, dtype=np.float64)[None, :] * weights[:, None]
+    matrix.setflags(write=False)
+    return matrix
+
+
+def frequency_power_matrix(frequency, orders):
+    """
+    Trapezoid-weighted powers of a frequency grid.
+
+    Parameters:
+        frequency (array-like): Frequency grid (n_freq,).
+        orders (tuple): Moment orders.
+
+    Returns:
+        ndarray: (n_freq x len(orders)) matrix M such that spectra @ M gives the
+        trapezoidal moments of each order. Cached per grid.
+    """
+    frequency = np.ascontiguousarray(frequency, dtype=np.float64)
+    return _cached_power_matrix(frequency.tobytes(), tuple(orders))
+
+
+def spectral_moments(frequency, psd):
+    """
+    Compute the moments of S(f) and S(f)**2 for many spectra.
+
+    Parameters:
+        frequency (ndarray): Frequency grid, (n_freq,) or (n_records x n_freq).
+        psd (ndarray): Spectral densities (n_records x n_freq).
+
+    Returns:
+        tuple: mom (n_records x 8) and mom2 (n_records x 14), laid out like the
+        per-record moments of process_SDT_file.
+    """
+    psd = np.atleast_2d(np.asarray(psd, dtype=np.float64))
+    frequency = np.asarray(frequency, dtype=np.float64)
+    mom = np.zeros((len(psd), len(MOMENT_ORDERS) + 1))
+    mom2 = np.zeros((len(psd), len(MOMENT2_ORDERS) + 1))
+
+    if frequency.ndim == 1:
+        grids, inverse = frequency[None, :], np.zeros(len(psd), dtype=np.int64)
+    else:
+        grids, inverse = np.unique(frequency, axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+
+    for g, grid in enumerate(grids):
+        rows = inverse == g
+        mom[rows, 1:] = psd[rows] @ frequency_power_matrix(grid, MOMENT_ORDERS)
+        mom2[rows, 1:] = psd[rows] ** 2 @ frequency_power_matrix(grid, MOMENT2_ORDERS)
+
+    return mom, mom2
+
+
+def wave_parameters(mom, mom2):
+    """
+    Derive wave parameters from the moments returned by spectral_moments.
+
+    Returns:
+        dict: Hm0, TI, TE, T1, Tz, T3, T4 and the Goda peakedness Qp, one value
+        per record.
+    """
+    o = MOMENT_OFFSET
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return {
+            'Hm0': 4 * np.sqrt(mom[:, o]),
+            'TI': np.sqrt(mom[:, o - 2] / mom[:, o]),
+            'TE': mom[:, o - 1] / mom[:, o],
+            'T1': mom[:, o] / mom[:, o + 1],
+            'Tz': np.sqrt(mom[:, o] / mom[:, o + 2]),
+            'T3': np.sqrt(mom[:, o + 1] / mom[:, o + 3]),
+            'T4': (mom[:, o + 1] / mom[:, o + 4]) ** 0.5,
+            'Qp': 2 * mom2[:, MOMENT2_OFFSET + 1] / mom[:, o] ** 2,
+        }
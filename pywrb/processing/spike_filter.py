@@ -0,0 +1,350 @@
+"""
+Chunked spike removal for .his and _225.csv parameter series.
+
+Files are read in chunks of rows, so memory use does not grow with the
+length of the series. Each tested column goes through two checks:
+
+- range: values outside [min, max], and missing values, are rejected;
+- deviation: values further than threshold from the centred rolling mean of
+  the rows that passed the range check are rejected.
+
+Consecutive chunks overlap by the rolling window, so the rolling means at
+chunk edges are the same as for the whole file at once. A row is kept only
+if every tested column passes. Each rejection is recorded with its row,
+column, reason and value.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from pywrb import metrics
+from pywrb.cache import cached_outputs
+from pywrb.processing.decimate import decimate
+from pywrb.processing.process_SDT_file import PARAMETER_NAMES
+
+CHUNK_SIZE = 100000  # rows read per chunk
+
+PLOT_SIZE = (16, 6)  # inches
+PLOT_DPI = 100
+PLOT_KEY_LENGTH = 16  # characters of the cache key in plot file names
+
+# _225.csv files have no header; their columns follow the .his naming
+COLUMNS_225 = (('Timestamp',) + PARAMETER_NAMES
+               + ('Tref', 'Tsea', 'Bat', 'Av', 'Ax', 'Ay', 'GPS', 'Lat', 'Lon', 'ori', 'incl'))
+
+# Rejection reasons recorded in the flags
+REASONS = ('missing', 'below_min', 'above_max', 'spike', 'incomplete_window')
+
+FLAG_COLUMNS = ['row', 'Date', 'column', 'reason', 'value']
+
+
+def spike_tests(columns=('Hs',), threshold=0.1, abnormal_min=0, abnormal_max=5):
+    """
+    The same tests for each of columns.
+
+    Returns:
+        dict: {column: {'min': ..., 'max': ..., 'threshold': ...}}, the tests
+        argument of despike_file. None disables a check.
+    """
+    return {column: {'min': abnormal_min, 'max': abnormal_max, 'threshold': threshold}
+            for column in columns}
+
+
+def read_series(path, chunksize=CHUNK_SIZE):
+    """
+    Iterate over a .his or _225.csv file in DataFrames of up to chunksize rows.
+
+    The time column is renamed to Date and parsed, and Hm0 is renamed to Hs.
+    The index numbers the data rows of the whole file.
+    """
+    with open(path) as fh:
+        has_header = fh.readline().lstrip().startswith('Timestamp')
+    if has_header:
+        reader = pd.read_csv(path, header=0, skipinitialspace=True, chunksize=chunksize)
+    else:
+        reader = pd.read_csv(path, sep='\t', header=None, names=list(COLUMNS_225), chunksize=chunksize)
+
+    with reader:
+        for chunk in reader:
+            chunk.columns = chunk.columns.str.strip()
+            chunk = chunk.rename(columns={"Timestamp": "Date", "Hm0": "Hs"})
+            chunk["Date"] = pd.to_datetime(chunk["Date"])
+            yield chunk
+
+
+def _flags(frame, column, reason, mask):
+    rows = frame.index[mask]
+    return pd.DataFrame({
+        'row': rows,
+        'Date': frame.loc[rows, 'Date'].values,
+        'column': column,
+        'reason': reason,
+        'value': frame.loc[rows, column].values,
+    }, columns=FLAG_COLUMNS)
+
+
+def _range_check(chunk, tests):
+    """Boolean mask of the rows that pass every range check, and the rejections."""
+    ok = np.ones(len(chunk), dtype=bool)
+    flags = []
+    for column, test in tests.items():
+        values = chunk[column]
+        checks = [('missing', values.isna().values)]
+        if test.get('min') is not None:
+            checks.append(('below_min', (values < test['min']).values))
+        if test.get('max') is not None:
+            checks.append(('above_max', (values > test['max']).values))
+        for reason, mask in checks:
+            if mask.any():
+                flags.append(_flags(chunk, column, reason, mask))
+                ok &= ~mask
+    return ok, flags
+
+
+def centred_mean(values, window):
+    """
+    Centred rolling mean down the rows of a 2-D array, NaN where the window is incomplete.
+
+    Windows are aligned like pandas' rolling(window, center=True). Each mean
+    is summed from its own window rather than updated from the previous one,
+    so it does not depend on where a chunk starts.
+    """
+    n = len(values)
+    mean = np.full(values.shape, np.nan)
+    if n >= window:
+        start = window // 2  # pandas puts the extra row of even windows before the centre
+        windows = np.lib.stride_tricks.sliding_window_view(values, window, axis=0)
+        mean[start:start + n - window + 1] = windows.sum(axis=-1) / window
+    return mean
+
+
+def _deviation_check(frame, tests, window):
+    """Boolean mask of the rows within every deviation threshold, and the rejections."""
+    columns = [column for column, test in tests.items() if test.get('threshold') is not None]
+    ok = np.ones(len(frame), dtype=bool)
+    if not columns:
+        return ok, []
+
+    # One rolling mean over all tested columns at once
+    values = frame[columns].to_numpy(dtype=np.float64)
+    deviation = np.abs(values - centred_mean(values, window))
+    flags = []
+    for i, column in enumerate(columns):
+        dev = deviation[:, i]
+        incomplete = np.isnan(dev)
+        with np.errstate(invalid='ignore'):
+            spike = dev > tests[column]['threshold']
+        for reason, mask in (('spike', spike), ('incomplete_window', incomplete)):
+            if mask.any():
+                flags.append(_flags(frame, column, reason, mask))
+                ok &= ~mask
+    return ok, flags
+
+
+def iter_despiked(path, tests, window=2, chunksize=CHUNK_SIZE):
+    """
+    Run the spike tests over a file chunk by chunk.
+
+    Yields:
+        tuple: (checked, keep, flags). checked holds the rows that passed the
+        range checks, keep marks those that also passed the deviation checks,
+        and flags is a DataFrame of rejections (columns FLAG_COLUMNS).
+    """
+    pad = max(int(window), 1)
+    context = None  # Rows before the pending ones, already finished
+    pending = None  # Rows that passed the range checks but still need their rolling mean
+
+    def finish(count):
+        frame = pending if context is None else pd.concat([context, pending])
+        ok, flags = _deviation_check(frame, tests, window)
+        start = len(frame) - len(pending)
+        return frame.iloc[start:start + count], ok[start:start + count], [
+            f[f['row'].isin(frame.index[start:start + count])] for f in flags]
+
+    for chunk in read_series(path, chunksize):
+        with metrics.timer('spike.check'):
+            ok, flags = _range_check(chunk, tests)
+            passed = chunk[ok]
+            pending = passed if pending is None else pd.concat([pending, passed])
+            # Keep pad rows back, as the rolling window can still reach past them
+            if len(pending) > pad:
+                checked, keep, spike_flags = finish(len(pending) - pad)
+                done = checked if context is None else pd.concat([context, checked])
+                context, pending = done.iloc[-pad:], pending.iloc[-pad:]
+            else:
+                checked, keep, spike_flags = passed.iloc[:0], np.zeros(0, dtype=bool), []
+        metrics.inc('records_processed', len(chunk), pipeline='spike')
+        yield checked, keep, _concat_flags(flags + spike_flags)
+
+    if pending is not None and len(pending):
+        with metrics.timer('spike.check'):
+            checked, keep, spike_flags = finish(len(pending))
+        yield checked, keep, _concat_flags(spike_flags)
+
+
+def _concat_flags(flags):
+    flags = [f for f in flags if len(f)]
+    if not flags:
+        return pd.DataFrame(columns=FLAG_COLUMNS)
+    return pd.concat(flags, ignore_index=True)
+
+
+def despike_file(path, tests=None, window=2, output=None, flags_output=None,
+                 chunksize=CHUNK_SIZE, keep_data=False, plot_column=None):
+    """
+    Remove spikes from one .his or _225.csv file.
+
+    Parameters:
+        path (str): Input file.
+        tests (dict): {column: {'min', 'max', 'threshold'}}, see spike_tests.
+            Defaults to the Hs test of the web interface.
+        window (int): Length of the centred rolling window.
+        output (str, optional): CSV file for the rows that were kept.
+        flags_output (str, optional): CSV file for the rejections.
+        chunksize (int): Rows read at a time.
+        keep_data (bool): Also return the kept rows as a DataFrame.
+        plot_column (str, optional): Collect this column for plot_despiked.
+
+    Returns:
+        dict: 'file', 'rows', 'kept', 'flagged' (rejected rows), 'counts'
+        ({(column, reason): rows}), 'output', 'flags_output', and 'data' and
+        'plot' when requested.
+    """
+    tests = spike_tests() if tests is None else tests
+    result = {'file': path, 'rows': 0, 'kept': 0, 'counts': {},
+              'output': output, 'flags_output': flags_output}
+    kept_parts, plot_parts, flagged_rows = [], [], set()
+    write_header = True
+    write_flags_header = True
+
+    for checked, keep, flags in iter_despiked(path, tests, window, chunksize):
+        kept = checked[keep]
+        result['kept'] += len(kept)
+        if output is not None and (len(kept) or write_header):
+            kept.to_csv(output, mode='w' if write_header else 'a', header=write_header, index=False)
+            write_header = False
+        if keep_data:
+            kept_parts.append(kept)
+        if plot_column is not None:
+            plot_parts.append(pd.DataFrame({'Date': checked['Date'].values,
+                                            'value': checked[plot_column].values, 'kept': keep}))
+
+        if len(flags):
+            for key, count in flags.groupby(['column', 'reason']).size().items():
+                result['counts'][key] = result['counts'].get(key, 0) + int(count)
+            flagged_rows.update(flags['row'].tolist())
+        if flags_output is not None and (len(flags) or write_flags_header):
+            flags.to_csv(flags_output, mode='w' if write_flags_header else 'a',
+                         header=write_flags_header, index=False)
+            write_flags_header = False
+        result['rows'] = max(result['rows'], _last_row(checked, flags) + 1)
+
+    result['flagged'] = len(flagged_rows)
+    if keep_data:
+        result['data'] = pd.concat(kept_parts) if kept_parts else pd.DataFrame()
+    if plot_column is not None:
+        result['plot'] = pd.concat(plot_parts, ignore_index=True) if plot_parts else None
+    return result
+
+
+def _last_row(checked, flags):
+    last = -1
+    if len(checked):
+        last = max(last, int(checked.index[-1]))
+    if len(flags):
+        last = max(last, int(flags['row'].max()))
+    return last
+
+
+def plot_despiked(plot, column, title, plot_path, method='minmax'):
+    """
+    Plot the series that passed the range checks and the rows that were kept.
+
+    Both series are decimated to the figure's width in pixels first (see
+    pywrb.processing.decimate), which looks the same but draws much faster
+    for long series.
+    """
+    # matplotlib is only loaded once plots are made
+    import matplotlib
+    matplotlib.use('Agg')  # Use non-GUI backend to prevent errors
+    import matplotlib.pyplot as plt
+
+    width = int(PLOT_SIZE[0] * PLOT_DPI)
+    kept = plot[plot["kept"]]
+    fig, ax = plt.subplots(figsize=PLOT_SIZE, dpi=PLOT_DPI)
+    ax.plot(*decimate(plot["Date"].values, plot["value"].values, width, method), label="Raw Data", color='red')
+    ax.plot(*decimate(kept["Date"].values, kept["value"].values, width, method), label="Filtered Data", color='blue')
+    ax.set_xlabel("Date")
+    ax.set_ylabel(column)
+    ax.legend()
+    ax.set_title(title)
+    plt.savefig(plot_path)
+    plt.close(fig)
+    return plot_path
+
+
+def cached_plot(cache, path, plot, plot_folder, params):
+    """Draw the plot of a file, or restore it from the cache; returns the plot's file name."""
+    name = os.path.basename(path)
+    base = os.path.splitext(name)[0]
+    # The title shows the file name, so it is part of the key too
+    params = dict(params, title=f"Spike Removal - {name}")
+    if cache is None:
+        plot_file = f"plot_{base}.png"
+    else:
+        plot_file = f"plot_{base}_{cache.key(path, 'spike_plot', **params)[:PLOT_KEY_LENGTH]}.png"
+    plot_path = os.path.join(plot_folder, plot_file)
+
+    def compute():
+        os.makedirs(plot_folder, exist_ok=True)
+        with metrics.timer('spike.plot'):
+            plot_despiked(plot, params['column'], params['title'], plot_path, params['method'])
+        return [plot_path], None
+
+    cached_outputs(cache, path, 'spike_plot', params, plot_folder, base, compute)
+    return plot_file
+
+
+def despike_files(files, tests=None, window=2, output_folder=None, plot_folder=None,
+                  plot_column='Hs', chunksize=CHUNK_SIZE, keep_data=False, cache=None, plot_method='minmax'):
+    """
+    Remove spikes from several files, one after the other.
+
+    Each file gets processed_<name>.csv and processed_<name>_flags.csv in
+    output_folder (if given) and plot_<name>.png in plot_folder (if given).
+    A file that fails is reported with an 'error' entry instead of stopping
+    the others.
+
+    With a cache (ResultCache), plots are stored under the input's content
+    hash and the plot parameters and reused instead of redrawn. Their names
+    then include the start of the cache key, plot_<name>_<key>.png, so a
+    plot file never changes once written.
+
+    Returns:
+        list: One result dict per file, see despike_file.
+    """
+    results = []
+    for path in files:
+        name = os.path.basename(path)
+        try:
+            print(f"Removing spikes from: {path}")
+            output = flags_output = None
+            if output_folder is not None:
+                os.makedirs(output_folder, exist_ok=True)
+                output = os.path.join(output_folder, f"processed_{name}.csv")
+                flags_output = os.path.join(output_folder, f"processed_{name}_flags.csv")
+            result = despike_file(path, tests, window, output, flags_output, chunksize, keep_data,
+                                  plot_column if plot_folder is not None else None)
+
+            if result.get('plot') is not None:
+                result['plot_file'] = cached_plot(cache, path, result.pop('plot'), plot_folder, {
+                    'tests': tests, 'window': window, 'column': plot_column, 'method': plot_method,
+                    'size': PLOT_SIZE, 'dpi': PLOT_DPI,
+                })
+            print(f"{name}: kept {result['kept']} of {result['rows']} rows")
+        except Exception as e:
+            print(f"Error processing {path}: {e}")
+            result = {'file': path, 'error': str(e)}
+        results.append(result)
+    return results
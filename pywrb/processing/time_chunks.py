@@ -0,0 +1,75 @@
+"""
+Out-of-core processing of spectral datasets along the time axis.
+
+xarray opens NetCDF files lazily, so selecting a slice of records before
+taking .values reads only that slice from disk. The analysis functions walk
+an archive in slices of chunk_size records and write their results as each
+slice is done, so memory use depends on the chunk size, not on the length
+of the archive.
+"""
+import os
+
+from pywrb import metrics
+
+CHUNK_SIZE = 4096  # records per chunk; 2 MiB of float64 spectra at 64 frequencies
+
+
+def iter_time_slices(n_time, chunk_size=CHUNK_SIZE):
+    """
+    Consecutive slices of at most chunk_size records covering range(n_time).
+
+    An empty dataset gives one empty slice, so results still get a header.
+    """
+    if chunk_size is None or chunk_size <= 0:
+        chunk_size = max(n_time, 1)
+    if n_time == 0:
+        yield slice(0, 0)
+    for start in range(0, n_time, chunk_size):
+        yield slice(start, min(start + chunk_size, n_time))
+
+
+def iter_time_chunks(ds, variables, chunk_size=CHUNK_SIZE, stage=None, time_dim='time'):
+    """
+    Read variables of a Dataset one slice of records at a time.
+
+    Parameters:
+        ds (xarray.Dataset): Open (lazily loaded) dataset.
+        variables (list): Names of the variables to read; each must have
+            time as its first dimension.
+        chunk_size (int): Records per slice; None or 0 reads all at once.
+        stage (str, optional): Time the reads as this metrics stage.
+
+    Yields:
+        dict: numpy arrays of the slice, keyed by variable name.
+    """
+    for records in iter_time_slices(ds.sizes[time_dim], chunk_size):
+        with metrics.timer(stage or 'read'):
+            chunk = {name: ds[name][records].values for name in variables}
+        yield chunk
+
+
+def write_csv_chunks(frames, output):
+    """
+    Write DataFrames to one CSV file as they are produced.
+
+    The header comes from the first frame, and the file is replaced only
+    once all frames are written, so readers never see a partial result.
+
+    Returns:
+        int: Number of rows written.
+    """
+    tmp = output + '.part'
+    rows = 0
+    header = True
+    try:
+        for frame in frames:
+            frame.to_csv(tmp, mode='w' if header else 'a', header=header, index=False)
+            header = False
+            rows += len(frame)
+        if header:
+            open(tmp, 'w').close()
+        os.replace(tmp, output)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return rows
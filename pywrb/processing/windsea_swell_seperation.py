@@ -1,89 +1,148 @@
-import xarray as xr
 import pandas as pd
 import numpy as np
 import glob
 import os
 
-def windsea_swell_seperation(folder_path):
+from pywrb import metrics
+from pywrb.processing.time_chunks import CHUNK_SIZE, iter_time_chunks
+
+
+def _reverse_cumsum(values):
+    """Sum of values[j:] for every j along the last axis."""
+    return np.cumsum(values[..., ::-1], axis=-1)[..., ::-1]
+
+
+def separate_windsea_swell(frequency, spectra):
+    """
+    Separate wind sea and swell for many spectra at once.
+
+    The tail moments m1(f*) and m-1(f*) for every cutoff f* are reverse
+    cumulative sums over the frequency axis, so all records and all cutoffs
+    are handled with array operations.
+
+    Parameters:
+        frequency (ndarray): Frequency grid (n_freq,).
+        spectra (ndarray): Spectral densities (n_time x n_freq).
+
+    Returns:
+        tuple: Boolean mask of the records that could be separated, and
+        Hs_swell and Hs_sea (n_time,), NaN where the mask is False.
+    """
+    f = np.asarray(frequency, dtype=np.float64)
+    S = np.atleast_2d(np.asarray(spectra, dtype=np.float64))
+    spec = (S[:, 1:] + S[:, :-1]) * 0.5
+    freq = (f[1:] + f[:-1]) * 0.5
+    df = np.diff(f)
+    fup = freq[freq <= 0.5]
+    nf = len(fup)
+
+    n_time = len(S)
+    valid = np.zeros(n_time, dtype=bool)
+    Hs_swell = np.full(n_time, np.nan)
+    Hs_sea = np.full(n_time, np.nan)
+    if nf == 0 or n_time == 0:
+        return valid, Hs_swell, Hs_sea
+
+    spec = spec[:, :nf]
+    m1fstar = _reverse_cumsum(spec * freq[:nf] * df[:nf])
+    mminus1fstar = _reverse_cumsum(spec * freq[:nf] ** (-1) * df[:nf])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        alfafstar = m1fstar / np.sqrt(mminus1fstar)
+
+    # Skip records where alfafstar contains only NaN values
+    has_peak = ~np.all(np.isnan(alfafstar), axis=1)
+    loc1 = np.argmax(np.where(np.isnan(alfafstar), -np.inf, alfafstar), axis=1)
+    fm = fup[loc1]
+    fseparation = 24.2084 * fm**3 - 9.2021 * fm**2 + 1.8906 * fm - 0.04286
+
+    # Swell bins are fup < fseparation, sea bins fup > fseparation
+    n_swell = np.searchsorted(fup, fseparation, side="left")
+    sea_start = np.searchsorted(fup, fseparation, side="right")
+
+    # Both parts need at least one finite spectral value
+    finite = np.concatenate([np.zeros((n_time, 1), dtype=np.int64),
+                             np.cumsum(~np.isnan(spec), axis=1)], axis=1)
+    rows = np.arange(n_time)
+    swell_finite = finite[rows, n_swell] > 0
+    sea_finite = finite[rows, nf] - finite[rows, sea_start] > 0
+
+    valid = has_peak & (fseparation > 0.025) & swell_finite & sea_finite
+
+    # Band energy spec[k] * (fup[k] - fup[k-1]) for k >= 1, NaN ignored
+    band = np.zeros_like(spec)
+    band[:, 1:] = np.nan_to_num(spec[:, 1:] * np.diff(fup), nan=0.0)
+    energy = np.cumsum(band, axis=1)
+
+    swell_energy = energy[rows, np.maximum(n_swell - 1, 0)]
+    sea_energy = energy[rows, nf - 1] - energy[rows, np.minimum(sea_start, nf - 1)]
+    Hs_swell[valid] = 4 * np.sqrt(swell_energy[valid])
+    Hs_sea[valid] = 4 * np.sqrt(sea_energy[valid])
+    return valid, Hs_swell, Hs_sea
+
+
+def windsea_swell_chunk_frame(time, valid, Hs_swell, Hs_sea):
+    """DataFrame of the separable records of a chunk, as returned by separate_windsea_swell."""
+    date = pd.to_datetime(time)  # Convert date array to datetime
+    return pd.DataFrame({
+        "Date": date[valid],
+        "Hs_swell": Hs_swell[valid],
+        "Hs_sea": Hs_sea[valid],
+    })
+
+
+def iter_windsea_swell(data, chunk_size=CHUNK_SIZE):
+    """Separate the spectra of a Dataset into wind sea and swell, one DataFrame per chunk of records."""
+    f = data.Frequency.values  # Extract frequency array
+    for chunk in iter_time_chunks(data, ['time', 'SmaxXpsd'], chunk_size, stage='windsea.read'):
+        S = chunk['SmaxXpsd']
+        metrics.inc('bytes_read', S.nbytes, pipeline='windsea')
+        metrics.inc('records_processed', len(S), pipeline='windsea')
+
+        with metrics.timer('windsea.separate'):
+            valid, Hs_swell, Hs_sea = separate_windsea_swell(f, S)
+        yield windsea_swell_chunk_frame(chunk['time'], valid, Hs_swell, Hs_sea)
+
+
+def windsea_swell_frame(data, chunk_size=CHUNK_SIZE):
+    """
+    Separate the spectra of a Dataset into wind sea and swell.
+
+    Returns:
+        pandas.DataFrame: Date, Hs_swell and Hs_sea of every separable spectrum.
+    """
+    return pd.concat(list(iter_windsea_swell(data, chunk_size)), ignore_index=True)
+
+
+def windsea_swell_seperation(folder_path, progress=None, cache=None, chunk_size=CHUNK_SIZE, max_workers=1):
     """
     Process wave data from .nc files in the specified folder.
 
     Parameters:
         folder_path (str): Path to the folder containing .nc files.
+        progress (callable, optional): Called as progress(nc_file, csv_file)
+            after each file.
+        cache (ResultCache, optional): Serve results for previously separated,
+            identical files from this cache.
+        chunk_size (int): Records read and separated at a time; results are
+            written to the CSV file chunk by chunk.
+        max_workers (int, optional): Worker processes to spread the chunks of
+            all files over (None: CPU count); with 1, files are separated here.
 
     Returns:
         list: A list of file paths for the saved CSV files.
     """
+    from pywrb.processing.parallel_analysis import analyse_files
+
     files = glob.glob(f"{folder_path}/*.nc")  # Get all .nc files in the folder
-    saved_csv_files = []  # List to store paths of saved CSV files
-
-    for file in files:
-        results = pd.DataFrame(columns=["Date", "Hs_swell", "Hs_sea"])  # Initialize an empty DataFrame
-        data = xr.open_dataset(file)
-        date = pd.to_datetime(data.time.values)  # Convert date array to datetime
-        S = data.SmaxXpsd.values  # Extract SmaxXpsd array
-        f = data.Frequency.values  # Extract frequency array
-        spec = (S[:, 1:] + S[:, :63]) * 0.5
-        freq = (f[1:] + f[:63]) * 0.5
-        df = np.diff(f)
-        fup_indices = np.where(freq <= 0.5)[0]
-        fup = freq[fup_indices]
-
-        for i in range(len(S)):
-            spec_row = spec[i, :]
-            m1fstar = np.zeros(len(fup))
-            mminus1fstar = np.zeros(len(fup))
-            time = date[i]
-
-            for j in range(len(fup)):
-                m1fstar[j] = np.sum(spec_row[j:len(fup)] * freq[j:len(fup)] ** 1 * df[j:len(fup)])
-                mminus1fstar[j] = np.sum(spec_row[j:len(fup)] * freq[j:len(fup)] ** (-1) * df[j:len(fup)])
-
-            with np.errstate(invalid="ignore", divide="ignore"):
-                alfafstar = m1fstar / np.sqrt(mminus1fstar)
-
-            # Skip if alfafstar is empty or contains only NaN values
-            if np.all(np.isnan(alfafstar)) or len(alfafstar) == 0:
-                continue
-
-            try:
-                loc1 = np.nanargmax(alfafstar)
-                fm = fup[loc1]
-
-                fseparation = 24.2084 * fm**3 - 9.2021 * fm**2 + 1.8906 * fm - 0.04286
-                spec_trimmed = spec_row[0:len(fup)]
-                spec_df = pd.DataFrame(spec_trimmed)
-                fup_df = pd.DataFrame(fup)
-
-                f_swell = fup_df[fup_df[0] < fseparation].dropna()
-                f_sea = fup_df[fup_df[0] > fseparation].dropna()
-
-                if fseparation > 0.025:
-                    df_swell = f_swell.diff()
-                    df_sea = f_sea.diff()
-                    spec_swell = spec_df.loc[f_swell.index]
-                    spec_sea = spec_df.loc[f_sea.index]
-
-                    # Extract scalar values for fswell_peak and fsea_peak
-                    fswell_peak = f_swell.loc[spec_swell.idxmax()[0]].values[0]  # Extract scalar value
-                    fsea_peak = f_sea.loc[spec_sea.idxmax()[0]].values[0]  # Extract scalar value
-
-                    Hs_swell = 4 * np.sqrt(np.nansum(spec_swell.values.flatten() * df_swell.values.flatten()))
-                    Hs_sea = 4 * np.sqrt(np.nansum(spec_sea.values.flatten() * df_sea.values.flatten()))
-
-                    # Append results to the DataFrame
-                    results = pd.concat(
-                        [results, pd.DataFrame([[time, Hs_swell, Hs_sea]], columns=["Date", "Hs_swell", "Hs_sea"])],
-                        ignore_index=True
-                    )
-            except Exception as e:
-                print(f"Error processing file {file}: {e}")
-                continue
-
-        # Save results to a CSV file with the same name as the input file
-        output_filename = f"{os.path.splitext(os.path.basename(file))[0]}_windsea_swell.csv"
-        output_path = os.path.join(folder_path, output_filename)
-        results.to_csv(output_path, index=False)
-        saved_csv_files.append(output_path)
-
-    return saved_csv_files
\ No newline at end of file
+
+    def report(result):
+        if result['success'] and progress is not None:
+            progress(result['file'], result['output'])
+
+    # Results are saved next to the input files, named after them
+    results = analyse_files("windsea_swell", files, folder_path, max_workers=max_workers,
+                            chunk_size=chunk_size, progress=report, cache=cache)
+    for result in results:
+        if not result['success']:
+            raise RuntimeError(f"{os.path.basename(result['file'])}: {result['error']}")
+    return [result['output'] for result in results]
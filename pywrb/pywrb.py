@@ -1,23 +1,43 @@
 import os
 from pathlib import Path
-from flask import Flask, render_template, request, send_from_directory, send_file, url_for, session, jsonify, current_app
+from flask import Flask, Response, g, render_template, request, send_from_directory, send_file, stream_with_context, url_for, session, jsonify, current_app
 import webbrowser
 from threading import Timer
 import pandas as pd
 import numpy as np
 import glob
-import zipfile
-import matplotlib.pyplot as plt
+import re
+import shutil
+import tempfile
+import time
 from io import BytesIO
 from datetime import datetime
 from os import path
 
+from pywrb import metrics
+from pywrb.cache import ResultCache
+from pywrb.jobs import Job, JobManager
+from pywrb.uploads import ChunkedUploads, UploadError
+from pywrb.workspaces import WorkspaceManager
+from pywrb.zipstream import iter_zip
+from werkzeug.utils import secure_filename
+
 # Import processing functions from your package
 from pywrb.processing.process_SDT_file import process_SDT_file
 from pywrb.processing.SPT_to_NC import convert_spt_to_nc
-from pywrb.processing.remove_spike import remove_spike
+from pywrb.processing.SDT_to_NC import convert_sdt_to_nc
+from pywrb.processing.process_SDT_files import OUTPUT_FORMATS, process_SDT_files
+from pywrb.processing.spike_filter import despike_files, spike_tests
 from pywrb.processing.windsea_swell_seperation import windsea_swell_seperation
-from pywrb.processing.calculate_drift_velocity import calculate_drift_velocity
+from pywrb.processing.parallel_analysis import analyse_files
+from pywrb.processing.nc_encoding import DEFAULT_PROFILE
+from pywrb.processing.time_chunks import CHUNK_SIZE
+
+# Plots named plot_<name>_<cache key>.png by spike_filter.cached_plot
+CACHED_PLOT_NAME = re.compile(r'_[0-9a-f]{16}\.png$')
+
+# Folders that every session gets its own copy of
+WORKSPACE_FOLDERS = ('UPLOAD_FOLDER', 'PROCESSED_FOLDER', 'CONVERTED_FOLDER', 'TEMP_SPT_FOLDER', 'PLOT_FOLDER')
 
 def create_app():
     """Factory function to create and configure the Flask application"""
@@ -33,7 +53,18 @@ def create_app():
         'PROCESSED_FOLDER': os.path.join(base_dir, 'processed'),
         'CONVERTED_FOLDER': os.path.join(base_dir, 'converted_nc_files'),
         'TEMP_SPT_FOLDER': os.path.join(base_dir, 'temp_spt_files'),
-        'PLOT_FOLDER': os.path.join(base_dir, 'static', 'plots')
+        'PLOT_FOLDER': os.path.join(base_dir, 'static', 'plots'),
+        'PROCESS_WORKERS': int(os.environ.get('PYWRB_PROCESS_WORKERS', os.cpu_count() or 1)),
+        'JOB_WORKERS': int(os.environ.get('PYWRB_JOB_WORKERS', 2)),
+        'CACHE_FOLDER': os.path.join(base_dir, 'cache'),
+        'CACHE_MAX_BYTES': int(os.environ.get('PYWRB_CACHE_MAX_BYTES', 2 * 1024**3)),
+        'PARTIAL_UPLOAD_FOLDER': os.path.join(base_dir, 'partial_uploads'),
+        'UPLOAD_CHUNK_SIZE': int(os.environ.get('PYWRB_UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024)),
+        'UPLOAD_TTL': float(os.environ.get('PYWRB_UPLOAD_TTL', 24 * 3600)),
+        'WORKSPACE_FOLDER': os.path.join(base_dir, 'workspaces'),
+        'WORKSPACE_TTL': float(os.environ.get('PYWRB_WORKSPACE_TTL', 24 * 3600)),
+        'NETCDF_PROFILE': os.environ.get('PYWRB_NETCDF_PROFILE', DEFAULT_PROFILE),
+        'PROCESSING_CHUNK_SIZE': int(os.environ.get('PYWRB_PROCESSING_CHUNK_SIZE', CHUNK_SIZE))
     })
 
     # Debug: Print all folder paths
@@ -60,18 +91,61 @@ def create_app():
             except Exception as e:
                 print(f"Failed to create folder {folder}: {e}")
 
+    # Background jobs for long-running requests
+    app.extensions['pywrb_jobs'] = JobManager(max_workers=app.config['JOB_WORKERS'])
+
+    # Cache of results for previously processed inputs (disabled with a size of 0)
+    if app.config['CACHE_MAX_BYTES'] > 0:
+        app.extensions['pywrb_cache'] = ResultCache(app.config['CACHE_FOLDER'], app.config['CACHE_MAX_BYTES'])
+    else:
+        app.extensions['pywrb_cache'] = None
+
+    # Every session works in its own copy of the data folders
+    app.extensions['pywrb_workspaces'] = WorkspaceManager(
+        app.config['WORKSPACE_FOLDER'],
+        {name: os.path.basename(app.config[name]) for name in WORKSPACE_FOLDERS},
+        ttl=app.config['WORKSPACE_TTL'],
+    )
+
+    # Resumable uploads of files too large for a single request
+    app.extensions['pywrb_uploads'] = ChunkedUploads(app.config['PARTIAL_UPLOAD_FOLDER'],
+                                                     ttl=app.config['UPLOAD_TTL'])
+
     # Register routes
     register_routes(app)
 
     return app
 
-def open_browser():
+def open_browser(url='http://127.0.0.1:5000/'):
     """Open the browser only if we're in the main thread"""
     if not os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
-        webbrowser.open_new('http://127.0.0.1:5000/')
+        webbrowser.open_new(url)
 
 def register_routes(app):
     """Register all route blueprints with the application"""
+
+    @app.before_request
+    def start_request_timer():
+        g.request_start = time.perf_counter()
+
+    @app.before_request
+    def expire_workspaces_and_uploads():
+        # Rate-limited inside cleanup(), so cheap on most requests
+        current_app.extensions['pywrb_workspaces'].cleanup()
+        current_app.extensions['pywrb_uploads'].cleanup()
+
+    @app.after_request
+    def record_request_latency(response):
+        start = g.pop('request_start', None)
+        if start is not None:
+            route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            metrics.observe('http_request_seconds', time.perf_counter() - start,
+                            route=route, method=request.method, status=response.status_code)
+        return response
+
+    @app.route('/metrics')
+    def metrics_endpoint():
+        return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
     
     @app.route('/')
     def home():
@@ -85,15 +159,15 @@ def register_routes(app):
                 return "<p style='color: red;'>No files selected!</p>", 400
 
             # Ensure UPLOAD_FOLDER exists
-            os.makedirs(current_app.config['UPLOAD_FOLDER'], exist_ok=True)
+            os.makedirs(workspace_folder('UPLOAD_FOLDER'), exist_ok=True)
             uploaded_files = []
             for file in files:
                 if file and file.filename.endswith('.SDT'):
-                    filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], file.filename)
+                    filepath = os.path.join(workspace_folder('UPLOAD_FOLDER'), secure_filename(file.filename))
                     try:
                         file.save(filepath)
                         print(f"Saved file to: {filepath}")
-                        uploaded_files.append(file.filename)
+                        uploaded_files.append(os.path.basename(filepath))
                     except Exception as e:
                         print(f"Failed to save file {file.filename}: {e}")
                         return f"<p style='color: red;'>Error saving file {file.filename}: {e}</p>", 500
@@ -101,53 +175,114 @@ def register_routes(app):
             return "<p>Files uploaded successfully: " + ", ".join(uploaded_files) + "</p>"
         return render_template('upload.html')
 
+    @app.route('/uploads', methods=['POST'])
+    def start_chunked_upload():
+        params = request.get_json(silent=True) or request.values
+        try:
+            size = params.get('size')
+            status = current_app.extensions['pywrb_uploads'].start(
+                params.get('filename'), int(size) if size is not None else None, params.get('sha256'),
+                owner=workspace_id())
+        except (UploadError, ValueError) as e:
+            return jsonify({"error": str(e)}), 400
+        return jsonify(upload_status_response(status)), 201
+
+    @app.route('/uploads/<upload_id>', methods=['GET'])
+    def chunked_upload_status(upload_id):
+        try:
+            status = current_app.extensions['pywrb_uploads'].status(upload_id, workspace_id())
+        except KeyError:
+            return jsonify({"error": "Unknown upload"}), 404
+        return jsonify(upload_status_response(status))
+
+    @app.route('/uploads/<upload_id>', methods=['PUT', 'PATCH'])
+    def upload_chunk(upload_id):
+        uploads = current_app.extensions['pywrb_uploads']
+        try:
+            offset = int(request.args.get('offset', request.headers.get('Upload-Offset', 0)))
+        except ValueError:
+            return jsonify({"error": "offset must be an integer"}), 400
+        try:
+            new_offset = uploads.append(upload_id, offset, request.stream, owner=workspace_id())
+        except KeyError:
+            return jsonify({"error": "Unknown upload"}), 404
+        except UploadError as e:
+            return jsonify({"error": str(e), "offset": uploads.status(upload_id, workspace_id())['offset']}), 409
+        return jsonify({"id": upload_id, "offset": new_offset})
+
+    @app.route('/uploads/<upload_id>/complete', methods=['POST'])
+    def complete_chunked_upload(upload_id):
+        params = request.get_json(silent=True) or request.values
+        try:
+            filepath = current_app.extensions['pywrb_uploads'].complete(
+                upload_id, workspace_folder('UPLOAD_FOLDER'), owner=workspace_id())
+        except KeyError:
+            return jsonify({"error": "Unknown upload"}), 404
+        except UploadError as e:
+            return jsonify({"error": str(e)}), 409
+        print(f"Saved file to: {filepath}")
+
+        # Optionally go straight on to decoding the completed SDT file
+        if str(params.get('process', '')).lower() in ('1', 'true', 'yes'):
+            output_format = params.get('output_format', 'text')
+            if output_format not in OUTPUT_FORMATS:
+                return jsonify({"error": f"Unknown output format: {output_format}"}), 400
+            return dispatch_job(
+                'process', run_process_job, [filepath],
+                workspace_folder('PROCESSED_FOLDER'),
+                workspace_folder('CONVERTED_FOLDER'),
+                output_format,
+                current_app.config['PROCESS_WORKERS'],
+                current_app.extensions['pywrb_cache'],
+                current_app.config['NETCDF_PROFILE'],
+                exclusive=True,
+            )
+        return jsonify({"id": upload_id, "filename": os.path.basename(filepath)})
+
+    @app.route('/uploads/<upload_id>', methods=['DELETE'])
+    def discard_chunked_upload(upload_id):
+        try:
+            current_app.extensions['pywrb_uploads'].discard(upload_id, workspace_id())
+        except KeyError:
+            return jsonify({"error": "Unknown upload"}), 404
+        return jsonify({"id": upload_id, "discarded": True})
+
     @app.route('/process', methods=['GET', 'POST'])
     def process():
         try:
-            files = os.listdir(current_app.config['UPLOAD_FOLDER'])
+            upload_folder = workspace_folder('UPLOAD_FOLDER')
+            files = [f for f in os.listdir(upload_folder) if os.path.isfile(os.path.join(upload_folder, f))]
         except FileNotFoundError:
             files = []
-            print(f"UPLOAD_FOLDER not found: {current_app.config['UPLOAD_FOLDER']}")
+            print(f"UPLOAD_FOLDER not found: {workspace_folder('UPLOAD_FOLDER')}")
         
         if request.method == 'POST':
             selected_files = request.form.getlist('files[]')
             if not selected_files:
                 return "<p style='color: red;'>No files selected for processing.</p>", 400
-
-            # Clear old processed files
-            processed_folder = current_app.config['PROCESSED_FOLDER']
-            print(f"Clearing old files in: {processed_folder}")
-            try:
-                for old_file in os.listdir(processed_folder):
-                    file_path = os.path.join(processed_folder, old_file)
-                    print(f"Removing old file: {file_path}")
-                    os.remove(file_path)
-            except Exception as e:
-                print(f"Error clearing old files: {e}")
-            
-            for filename in selected_files:
-                filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-                if os.path.exists(filepath):
-                    print(f"Processing file: {filepath}")
-                    try:
-                        process_SDT_file(filepath, processed_folder=processed_folder)
-                        print(f"Processed files for {filename} saved in: {processed_folder}")
-                    except Exception as e:
-                        print(f"Error processing {filename}: {e}")
-                        return f"<p style='color: red;'>Error processing {filename}: {e}</p>", 500
-                    os.remove(filepath)
-                else:
-                    return f"<p style='color: red;'>File {filename} not found!</p>", 400
-
-            # List files after processing
-            processed_files = os.listdir(processed_folder)
-            print(f"Files in PROCESSED_FOLDER after processing: {processed_files}")
-            return "<p>Files processed successfully!</p>"
+            output_format = request.form.get('output_format', 'text')
+            if output_format not in OUTPUT_FORMATS:
+                return "<p style='color: red;'>Unknown output format; expected " + ", ".join(OUTPUT_FORMATS) + ".</p>", 400
+
+            filenames = [secure_filename(filename) for filename in selected_files]
+            if not all(filenames):
+                return "<p style='color: red;'>Invalid file name selected for processing.</p>", 400
+            filepaths = [os.path.join(workspace_folder('UPLOAD_FOLDER'), filename) for filename in filenames]
+            return dispatch_job(
+                'process', run_process_job, filepaths,
+                workspace_folder('PROCESSED_FOLDER'),
+                workspace_folder('CONVERTED_FOLDER'),
+                output_format,
+                current_app.config['PROCESS_WORKERS'],
+                current_app.extensions['pywrb_cache'],
+                current_app.config['NETCDF_PROFILE'],
+                exclusive=True,
+            )
         return render_template('process.html', files=files)
 
     @app.route('/save_output')
     def save_output():
-        processed_folder = current_app.config['PROCESSED_FOLDER']
+        processed_folder = workspace_folder('PROCESSED_FOLDER')
         print(f"Checking PROCESSED_FOLDER: {processed_folder}")
         try:
             processed_files = os.listdir(processed_folder)
@@ -159,86 +294,65 @@ def register_routes(app):
 
     @app.route('/download/<filename>')
     def download(filename):
-        return send_from_directory(current_app.config['PROCESSED_FOLDER'], filename, as_attachment=True)
+        return send_from_directory(workspace_folder('PROCESSED_FOLDER'), filename, as_attachment=True)
 
     @app.route('/download_all')
     def download_all():
-        processed_files = os.listdir(current_app.config['PROCESSED_FOLDER'])
+        processed_files = list_archivable(workspace_folder('PROCESSED_FOLDER'))
         if not processed_files:
             return "<p style='color: red;'>No processed files available to download.</p>", 400
-
-        zip_path = os.path.join(current_app.config['PROCESSED_FOLDER'], "processed_files.zip")
-        try:
-            with zipfile.ZipFile(zip_path, 'w') as zipf:
-                for file in processed_files:
-                    file_path = os.path.join(current_app.config['PROCESSED_FOLDER'], file)
-                    zipf.write(file_path, file)
-            return send_file(zip_path, as_attachment=True)
-        except Exception as e:
-            return f"<p style='color: red;'>Error creating ZIP file: {e}</p>", 500
+        return zip_response(workspace_folder('PROCESSED_FOLDER'), processed_files, "processed_files.zip")
 
     @app.route('/convert_spt', methods=['GET', 'POST'])
     def convert_spt():
         if request.method == 'POST':
-            uploaded_files = request.files.getlist('spt_files')
-            if not uploaded_files:
+            uploaded_files = [file for file in request.files.getlist('spt_files') if file.filename]
+            try:
+                completed = completed_uploads(('_SPT.txt',))
+            except FileNotFoundError as e:
+                return render_template('convert_spt.html', message=str(e))
+            if not uploaded_files and not completed:
                 return render_template('convert_spt.html', message="No SPT files selected!")
 
-            os.makedirs(current_app.config['CONVERTED_FOLDER'], exist_ok=True)
-            os.makedirs(current_app.config['TEMP_SPT_FOLDER'], exist_ok=True)
+            os.makedirs(workspace_folder('CONVERTED_FOLDER'), exist_ok=True)
+            os.makedirs(workspace_folder('TEMP_SPT_FOLDER'), exist_ok=True)
 
             # Save uploaded files
             for file in uploaded_files:
-                file_path = os.path.join(current_app.config['TEMP_SPT_FOLDER'], file.filename)
+                file_path = os.path.join(workspace_folder('TEMP_SPT_FOLDER'), file.filename)
                 try:
                     file.save(file_path)
                     print(f"Saved file to: {file_path}")
                 except Exception as e:
                     print(f"Failed to save file {file.filename}: {e}")
                     return render_template('convert_spt.html', message=f"Error saving file {file.filename}: {e}")
+            move_uploads(completed, workspace_folder('TEMP_SPT_FOLDER'))
 
-            try:
-                convert_spt_to_nc(current_app.config['TEMP_SPT_FOLDER'], current_app.config['CONVERTED_FOLDER'])
-                converted_files = os.listdir(current_app.config['CONVERTED_FOLDER'])
-                if converted_files:
-                    return render_template('convert_spt.html', message="Conversion completed! You can now download the files.")
-                else:
-                    return render_template('convert_spt.html', message="No NetCDF files were created. Please check input data.")
-            except Exception as e:
-                return render_template('convert_spt.html', message=f"Error during conversion: {e}")
+            return dispatch_job(
+                'convert_spt', run_convert_spt_job,
+                workspace_folder('TEMP_SPT_FOLDER'),
+                workspace_folder('CONVERTED_FOLDER'),
+                current_app.extensions['pywrb_cache'],
+                current_app.config['NETCDF_PROFILE'],
+            )
 
         return render_template('convert_spt.html')
 
     @app.route('/download_nc_all')
     def download_nc_all():
-        netcdf_files = os.listdir(current_app.config['CONVERTED_FOLDER'])
+        netcdf_files = list_archivable(workspace_folder('CONVERTED_FOLDER'))
         if not netcdf_files:
             return "<p style='color: red;'>No NetCDF files available to download.</p>", 400
-
-        zip_path = os.path.join(current_app.config['CONVERTED_FOLDER'], "converted_nc_files.zip")
-        try:
-            with zipfile.ZipFile(zip_path, 'w') as zipf:
-                for file in netcdf_files:
-                    file_path = os.path.join(current_app.config['CONVERTED_FOLDER'], file)
-                    zipf.write(file_path, file)
-            return send_file(zip_path, as_attachment=True)
-        except Exception as e:
-            return f"<p style='color: red;'>Error creating ZIP file: {e}</p>", 500
+        return zip_response(workspace_folder('CONVERTED_FOLDER'), netcdf_files, "converted_nc_files.zip")
 
     @app.route('/delete_all', methods=['POST'])
     def delete_all():
+        workspaces = current_app.extensions['pywrb_workspaces']
+        if workspaces.in_use(workspace_id()):
+            return jsonify({"error": "A job is still running; try again once it has finished."}), 409
         try:
-            for folder in [
-                current_app.config['PROCESSED_FOLDER'],
-                current_app.config['CONVERTED_FOLDER'],
-                current_app.config['TEMP_SPT_FOLDER'],
-                current_app.config['UPLOAD_FOLDER'],
-                current_app.config['PLOT_FOLDER']
-            ]:
-                if os.path.exists(folder):
-                    for file in os.listdir(folder):
-                        file_path = os.path.join(folder, file)
-                        os.remove(file_path)
+            workspaces.clear(workspace_id())
+            session.pop('uploaded_his_file', None)
             return jsonify({"message": "Automatically generated files deleted successfully!"}), 200
         except Exception as e:
             return jsonify({"error": str(e)}), 500
@@ -248,11 +362,19 @@ def register_routes(app):
         file_path = session.get('uploaded_his_file')
         if request.method == 'POST':
             uploaded_files = request.files.getlist('his_files')
-            if uploaded_files and uploaded_files[0].filename != '':
+            try:
+                completed = completed_uploads(('.his', '_225.csv'))
+            except FileNotFoundError as e:
+                return render_template('remove_spike.html', message=f"Error: {e}")
+            if completed:
+                # Large file sent through the chunked upload API
+                file_path = completed[0]
+                session['uploaded_his_file'] = file_path
+            elif uploaded_files and uploaded_files[0].filename != '':
                 # Ensure UPLOAD_FOLDER exists
-                os.makedirs(current_app.config['UPLOAD_FOLDER'], exist_ok=True)
+                os.makedirs(workspace_folder('UPLOAD_FOLDER'), exist_ok=True)
                 file = uploaded_files[0]
-                file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], file.filename)
+                file_path = os.path.join(workspace_folder('UPLOAD_FOLDER'), file.filename)
                 try:
                     file.save(file_path)
                     print(f"Saved file to: {file_path}")
@@ -270,13 +392,19 @@ def register_routes(app):
                 threshold = float(request.form.get('threshold', 0.1))
                 abnormal_max = float(request.form.get('abnormal_max', 5))
                 abnormal_min = float(request.form.get('abnormal_min', 0))
-                plot_files, filtered_data = remove_spike([file_path], window, threshold, abnormal_max, abnormal_min, current_app.config['PLOT_FOLDER'])
-                processed_filename = f"processed_{os.path.basename(file_path)}.csv"
-                processed_file_path = os.path.join(current_app.config['PROCESSED_FOLDER'], processed_filename)
-                filtered_data.to_csv(processed_file_path, index=False)
-
-                plot_urls = [f"{url_for('static', filename=f'plots/{p}')}?t={datetime.now().timestamp()}" for p in plot_files]
-                print("Plot files exist:", [os.path.exists(os.path.join(current_app.config['PLOT_FOLDER'], p)) for p in plot_files])
+                result, = despike_files(
+                    [file_path], spike_tests(('Hs',), threshold, abnormal_min, abnormal_max), window,
+                    output_folder=workspace_folder('PROCESSED_FOLDER'), plot_folder=workspace_folder('PLOT_FOLDER'),
+                    cache=current_app.extensions['pywrb_cache'])
+                if 'error' in result:
+                    raise ValueError(result['error'])
+                plot_files = [result['plot_file']] if 'plot_file' in result else []
+                processed_filename = os.path.basename(result['output'])
+                flags_filename = os.path.basename(result['flags_output'])
+
+                # Plot names change with their contents, so browsers can cache them
+                plot_urls = [url_for('workspace_plot', filename=p) for p in plot_files]
+                print("Plot files exist:", [os.path.exists(os.path.join(workspace_folder('PLOT_FOLDER'), p)) for p in plot_files])
 
                 if not plot_urls:
                     print("Warning: No plots generated. Check remove_spike function.")
@@ -284,13 +412,15 @@ def register_routes(app):
                 return render_template(
                     'remove_spike.html',
                     plot_urls=plot_urls,
-                    message=f"Spikes removed successfully! Using file: {os.path.basename(file_path)}",
+                    message=f"Spikes removed successfully! Using file: {os.path.basename(file_path)} "
+                            f"(kept {result['kept']} of {result['rows']} rows)",
                     stored_filename=os.path.basename(file_path),
                     window=window,
                     threshold=threshold,
                     abnormal_max=abnormal_max,
                     abnormal_min=abnormal_min,
-                    processed_filename=processed_filename
+                    processed_filename=processed_filename,
+                    flags_filename=flags_filename
                 )
             except Exception as e:
                 print(f"Error in remove_spike_route: {e}")
@@ -300,7 +430,7 @@ def register_routes(app):
 
     @app.route('/download_spike_removed/<filename>')
     def download_spike_removed(filename):
-        processed_file_path = os.path.join(current_app.config['PROCESSED_FOLDER'], filename)
+        processed_file_path = os.path.join(workspace_folder('PROCESSED_FOLDER'), filename)
         if os.path.exists(processed_file_path):
             return send_file(processed_file_path, as_attachment=True)
         return "<p style='color: red;'>Processed file not found!</p>", 404
@@ -309,11 +439,15 @@ def register_routes(app):
     def separate_wind_sea_swell():
         if request.method == 'POST':
             uploaded_files = request.files.getlist('nc_files')
-            if not uploaded_files or all(file.filename == '' for file in uploaded_files):
+            try:
+                completed = completed_uploads(('.nc',))
+            except FileNotFoundError as e:
+                return render_template('separate_wind_sea_swell.html', message=str(e))
+            if not completed and (not uploaded_files or all(file.filename == '' for file in uploaded_files)):
                 return render_template('separate_wind_sea_swell.html', message="No files selected!")
 
-            temp_folder = os.path.join(current_app.config['UPLOAD_FOLDER'], "temp_nc_files")
-            os.makedirs(temp_folder, exist_ok=True)
+            os.makedirs(workspace_folder('UPLOAD_FOLDER'), exist_ok=True)
+            temp_folder = tempfile.mkdtemp(prefix="temp_nc_files_", dir=workspace_folder('UPLOAD_FOLDER'))
             saved_files = []
             
             for file in uploaded_files:
@@ -325,134 +459,374 @@ def register_routes(app):
                         saved_files.append(filepath)
                     except Exception as e:
                         print(f"Failed to save file {file.filename}: {e}")
+            saved_files += move_uploads(completed, temp_folder)
 
             if not saved_files:
+                shutil.rmtree(temp_folder, ignore_errors=True)
                 return render_template('separate_wind_sea_swell.html', message="No valid .nc files uploaded!")
 
-            try:
-                saved_csv_files = windsea_swell_seperation(temp_folder)
-                for csv_file in saved_csv_files:
-                    filename = os.path.basename(csv_file)
-                    new_path = os.path.join(current_app.config['PROCESSED_FOLDER'], filename)
-                    os.rename(csv_file, new_path)
-                
-                return render_template(
-                    'separate_wind_sea_swell.html',
-                    message="Wind-sea-swell separation completed!",
-                    output_files=saved_csv_files,
-                    basename=path.basename
-                )
-            except Exception as e:
-                return render_template('separate_wind_sea_swell.html', message=f"Error during processing: {e}")
-            finally:
-                for file in saved_files:
-                    if os.path.exists(file):
-                        os.remove(file)
-                if os.path.exists(temp_folder):
-                    os.rmdir(temp_folder)
+            return dispatch_job(
+                'separate_wind_sea_swell', run_separation_job,
+                temp_folder, saved_files, workspace_folder('PROCESSED_FOLDER'),
+                current_app.extensions['pywrb_cache'], current_app.config['PROCESSING_CHUNK_SIZE'],
+                current_app.config['PROCESS_WORKERS'],
+            )
 
         return render_template('separate_wind_sea_swell.html')
 
     @app.route('/download_all_wind_sea_swell')
     def download_all_wind_sea_swell():
-        csv_files = [f for f in os.listdir(current_app.config['PROCESSED_FOLDER']) if f.endswith('_windsea_swell.csv')]
+        csv_files = [f for f in list_archivable(workspace_folder('PROCESSED_FOLDER')) if f.endswith('_windsea_swell.csv')]
         if not csv_files:
             return "<p style='color: red;'>No wind-sea-swell separated CSV files available to download.</p>", 400
-
-        zip_path = os.path.join(current_app.config['PROCESSED_FOLDER'], "windsea_swell_files.zip")
-        try:
-            with zipfile.ZipFile(zip_path, 'w') as zipf:
-                for file in csv_files:
-                    file_path = os.path.join(current_app.config['PROCESSED_FOLDER'], file)
-                    zipf.write(file_path, file)
-            return send_file(zip_path, as_attachment=True)
-        except Exception as e:
-            return f"<p style='color: red;'>Error creating ZIP file: {e}</p>", 500
+        return zip_response(workspace_folder('PROCESSED_FOLDER'), csv_files, "windsea_swell_files.zip")
 
     @app.route('/stokes_drift', methods=['GET', 'POST'])
     def stokes_drift():
         if request.method == 'POST':
             uploaded_files = request.files.getlist('nc_files')
             max_depth = int(request.form.get('max_depth', 100))
+            try:
+                completed = completed_uploads(('.nc',))
+            except FileNotFoundError as e:
+                return render_template('stokes_drift.html', message=str(e))
             
-            if not uploaded_files or all(file.filename == '' for file in uploaded_files):
+            if not completed and (not uploaded_files or all(file.filename == '' for file in uploaded_files)):
                 return render_template('stokes_drift.html', message="No NetCDF files selected!")
 
-            temp_folder = os.path.join(current_app.config['UPLOAD_FOLDER'], "temp_stokes")
-            os.makedirs(temp_folder, exist_ok=True)
-            processed_files = []
+            os.makedirs(workspace_folder('UPLOAD_FOLDER'), exist_ok=True)
+            temp_folder = tempfile.mkdtemp(prefix="temp_stokes_", dir=workspace_folder('UPLOAD_FOLDER'))
+            saved_files = []
 
-            try:
-                for file in uploaded_files:
-                    if file and file.filename.endswith('.nc'):
-                        file_path = os.path.join(temp_folder, file.filename)
-                        try:
-                            file.save(file_path)
-                            print(f"Saved file to: {file_path}")
-                        except Exception as e:
-                            print(f"Failed to save file {file.filename}: {e}")
-                            continue
-                        result = calculate_drift_velocity(file_path, max_depth)
-                        output_filename = f"stokes_drift_{os.path.splitext(file.filename)[0]}.csv"
-                        output_path = os.path.join(current_app.config['PROCESSED_FOLDER'], output_filename)
-                        result.to_csv(output_path, index=False)
-                        processed_files.append(output_filename)
-
-                if processed_files:
-                    return render_template('stokes_drift.html', 
-                                          message="Stokes drift calculation completed!",
-                                          processed_files=processed_files)
-                return render_template('stokes_drift.html', 
-                                      message="No valid NetCDF files were processed.")
-            except Exception as e:
-                return render_template('stokes_drift.html', 
-                                      message=f"Error during processing: {str(e)}")
-            finally:
-                for file in os.listdir(temp_folder):
-                    os.remove(os.path.join(temp_folder, file))
-                if os.path.exists(temp_folder):
-                    os.rmdir(temp_folder)
+            for file in uploaded_files:
+                if file and file.filename.endswith('.nc'):
+                    file_path = os.path.join(temp_folder, file.filename)
+                    try:
+                        file.save(file_path)
+                        print(f"Saved file to: {file_path}")
+                        saved_files.append(file_path)
+                    except Exception as e:
+                        print(f"Failed to save file {file.filename}: {e}")
+            saved_files += move_uploads(completed, temp_folder)
+
+            return dispatch_job(
+                'stokes_drift', run_stokes_job,
+                temp_folder, saved_files, workspace_folder('PROCESSED_FOLDER'), max_depth,
+                current_app.extensions['pywrb_cache'], current_app.config['PROCESSING_CHUNK_SIZE'],
+                current_app.config['PROCESS_WORKERS'],
+            )
 
         return render_template('stokes_drift.html')
 
     @app.route('/download_stokes/<filename>')
     def download_stokes(filename):
-        return send_from_directory(current_app.config['PROCESSED_FOLDER'], filename, as_attachment=True)
+        return send_from_directory(workspace_folder('PROCESSED_FOLDER'), filename, as_attachment=True)
 
     @app.route('/download_all_stokes')
     def download_all_stokes():
-        stokes_files = [f for f in os.listdir(current_app.config['PROCESSED_FOLDER']) if f.startswith('stokes_drift_')]
+        stokes_files = [f for f in list_archivable(workspace_folder('PROCESSED_FOLDER')) if f.startswith('stokes_drift_')]
         if not stokes_files:
             return "<p style='color: red;'>No stokes drift files available to download.</p>", 400
-
-        zip_path = os.path.join(current_app.config['PROCESSED_FOLDER'], "stokes_drift_files.zip")
-        try:
-            with zipfile.ZipFile(zip_path, 'w') as zipf:
-                for file in stokes_files:
-                    file_path = os.path.join(current_app.config['PROCESSED_FOLDER'], file)
-                    zipf.write(file_path, file)
-            return send_file(zip_path, as_attachment=True)
-        except Exception as e:
-            return f"<p style='color: red;'>Error creating ZIP file: {e}</p>", 500
+        return zip_response(workspace_folder('PROCESSED_FOLDER'), stokes_files, "stokes_drift_files.zip")
+
+    @app.route('/jobs')
+    def list_jobs():
+        jobs = current_app.extensions['pywrb_jobs'].list()
+        return jsonify([job.to_dict() for job in jobs if job.owner == session.get('workspace')])
+
+    @app.route('/jobs/<job_id>')
+    def job_status(job_id):
+        job = get_own_job(job_id)
+        if job is None:
+            return jsonify({"error": f"Unknown job {job_id}"}), 404
+        return jsonify(job.to_dict())
+
+    @app.route('/jobs/<job_id>/result')
+    def job_result(job_id):
+        job = get_own_job(job_id)
+        if job is None:
+            return jsonify({"error": f"Unknown job {job_id}"}), 404
+        if job.status in ('queued', 'running'):
+            return jsonify(job.to_dict()), 202
+        return render_job_result(job)
+
+    @app.route('/plots/<filename>')
+    def workspace_plot(filename):
+        response = send_from_directory(workspace_folder('PLOT_FOLDER'), filename)
+        if CACHED_PLOT_NAME.search(filename):
+            # Named after the cache key of their contents, so they never change
+            response.cache_control.no_cache = None
+            response.cache_control.max_age = 365 * 24 * 3600
+            response.cache_control.immutable = True
+        else:
+            # Revalidate with the ETag, as the file may be redrawn under the same name
+            response.cache_control.no_cache = True
+        response.cache_control.private = True
+        return response
 
     @app.route('/test_static')
     def test_static():
-        static_path = os.path.join(current_app.config['PLOT_FOLDER'], 'plot_Vizag_000003_S09-2009.png')
+        static_path = os.path.join(workspace_folder('PLOT_FOLDER'), 'plot_Vizag_000003_S09-2009.png')
         print("Testing static file at:", static_path)
         print("File exists:", os.path.exists(static_path))
         if os.path.exists(static_path):
-            return send_from_directory(current_app.config['PLOT_FOLDER'], 'plot_Vizag_000003_S09-2009.png')
+            return send_from_directory(workspace_folder('PLOT_FOLDER'), 'plot_Vizag_000003_S09-2009.png')
         return "File not found", 404
 
-def main():
+def workspace_id():
+    """Id of the current session's workspace, created on first use."""
+    if 'workspace_id' not in g:
+        workspaces = current_app.extensions['pywrb_workspaces']
+        ws = session.get('workspace')
+        if not workspaces.is_valid_id(ws):
+            ws = session['workspace'] = workspaces.new_id()
+        workspaces.touch(ws)
+        g.workspace_id = ws
+    return g.workspace_id
+
+def workspace_folder(name):
+    """The current session's copy of a folder, e.g. workspace_folder('PROCESSED_FOLDER')."""
+    return current_app.extensions['pywrb_workspaces'].folder(workspace_id(), name)
+
+def upload_status_response(status):
+    """Status of a chunked upload with the URLs and chunk size a client needs to continue it."""
+    status = {key: value for key, value in status.items() if key != 'owner'}
+    return dict(
+        status,
+        chunk_size=current_app.config['UPLOAD_CHUNK_SIZE'],
+        upload_url=url_for('upload_chunk', upload_id=status['id']),
+        complete_url=url_for('complete_chunked_upload', upload_id=status['id']),
+    )
+
+def completed_uploads(suffixes):
+    """
+    Files completed through the chunked upload API that a form names in its 'uploaded' field.
+
+    Raises:
+        FileNotFoundError: If a name is not a completed upload of this session
+            or does not end with one of suffixes.
+    """
+    folder = workspace_folder('UPLOAD_FOLDER')
+    paths = []
+    for name in request.values.getlist('uploaded'):
+        path = os.path.join(folder, secure_filename(name))
+        if not name.endswith(suffixes) or not os.path.isfile(path):
+            raise FileNotFoundError(f"No completed upload named {name}")
+        paths.append(path)
+    return paths
+
+def move_uploads(paths, folder):
+    """Move completed uploads into a job's input folder; returns their new paths."""
+    moved = []
+    for upload_path in paths:
+        moved.append(shutil.move(upload_path, os.path.join(folder, os.path.basename(upload_path))))
+        print(f"Moved upload to: {moved[-1]}")
+    return moved
+
+def list_archivable(folder):
+    """Regular files in folder that go into a download-all archive (not earlier archives)."""
+    try:
+        names = sorted(os.listdir(folder))
+    except FileNotFoundError:
+        return []
+    return [f for f in names if os.path.isfile(os.path.join(folder, f)) and not f.lower().endswith('.zip')]
+
+def zip_response(folder, files, download_name):
+    """Stream a ZIP archive of files in folder to the client as it is written."""
+    paths = [os.path.join(folder, f) for f in files]
+    return Response(
+        stream_with_context(iter_zip(paths)),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment; filename="{download_name}"'},
+    )
+
+def wants_async():
+    """Whether the client asked for the work to run as a background job."""
+    return request.values.get('async', '').lower() in ('1', 'true', 'yes')
+
+def dispatch_job(kind, func, *args, exclusive=False):
+    """
+    Run func(job, *args) now, or submit it as a background job if the client asked for one.
+
+    An exclusive job is refused with 409 while another job runs in the workspace.
+    """
+    workspaces = current_app.extensions['pywrb_workspaces']
+    owner = workspace_id()
+
+    def run_in_workspace(job, *args):
+        try:
+            return func(job, *args)
+        finally:
+            workspaces.release(owner)
+
+    # Keep the workspace from expiring until the job is done
+    if exclusive:
+        if not workspaces.acquire_exclusive(owner):
+            return "<p style='color: red;'>Another job is still running; try again once it has finished.</p>", 409
+    else:
+        workspaces.acquire(owner)
+    if wants_async():
+        job = current_app.extensions['pywrb_jobs'].submit(kind, run_in_workspace, *args, owner=owner)
+        return jsonify({
+            "job_id": job.id,
+            "status_url": url_for('job_status', job_id=job.id),
+            "result_url": url_for('job_result', job_id=job.id),
+        }), 202
+
+    job = Job(kind, owner=owner)
+    job.run(run_in_workspace, *args)
+    return render_job_result(job)
+
+def get_own_job(job_id):
+    """The job with the given id if it belongs to the current session, else None."""
+    job = current_app.extensions['pywrb_jobs'].get(job_id)
+    if job is None or job.owner != session.get('workspace'):
+        return None
+    return job
+
+def render_job_result(job):
+    """Turn the result of a finished job into a response."""
+    if job.status == 'failed':
+        return f"<p style='color: red;'>Error: {job.error}</p>", 500
+    result = job.result
+    if 'template' in result:
+        return render_template(result['template'], **result.get('context', {}))
+    return result['html'], result.get('status', 200)
+
+def run_process_job(job, filepaths, processed_folder, converted_folder, output_format, workers, cache=None,
+                    nc_profile=DEFAULT_PROFILE):
+    """
+    Process uploaded SDT files (work behind /process).
+
+    Clears processed_folder first, so it must run as an exclusive job.
+    """
+    # Clear old processed files
+    print(f"Clearing old files in: {processed_folder}")
+    try:
+        for old_file in os.listdir(processed_folder):
+            file_path = os.path.join(processed_folder, old_file)
+            print(f"Removing old file: {file_path}")
+            os.remove(file_path)
+    except Exception as e:
+        print(f"Error clearing old files: {e}")
+
+    job.update(files_total=len(filepaths), files_done=0, records=0)
+
+    def progress(result):
+        job.advance(files_done=1, records=result['records'])
+
+    print(f"Processing files: {filepaths}")
+    results = process_SDT_files(
+        filepaths,
+        processed_folder,
+        max_workers=workers,
+        output_format=output_format,
+        converted_folder=converted_folder,
+        progress=progress,
+        cache=cache,
+        nc_profile=nc_profile,
+    )
+
+    errors = []
+    for result in results:
+        filename = os.path.basename(result['file'])
+        if result['success']:
+            print(f"Processed files for {filename} saved in: {processed_folder}")
+            os.remove(result['file'])
+            for output in result['outputs']:
+                job.add_artifact(os.path.basename(output))
+        else:
+            print(f"Error processing {filename}: {result['error']}")
+            errors.append(f"<p style='color: red;'>Error processing {filename}: {result['error']}</p>")
+
+    if errors:
+        return {'html': "".join(errors), 'status': 500 if len(errors) == len(results) else 200}
+    return {'html': "<p>Files processed successfully!</p>"}
+
+def run_convert_spt_job(job, temp_spt_folder, converted_folder, cache=None, nc_profile=DEFAULT_PROFILE):
+    """Convert the uploaded *_SPT.txt files to NetCDF (work behind /convert_spt)."""
+    job.update(files_total=len(glob.glob(os.path.join(temp_spt_folder, "*_SPT.txt"))), files_done=0)
+
+    def progress(spt_file, nc_file):
+        job.advance(files_done=1)
+        if nc_file:
+            job.add_artifact(os.path.basename(nc_file))
+
+    try:
+        convert_spt_to_nc(temp_spt_folder, converted_folder, progress=progress, cache=cache, nc_profile=nc_profile)
+        converted_files = os.listdir(converted_folder)
+        if converted_files:
+            message = "Conversion completed! You can now download the files."
+        else:
+            message = "No NetCDF files were created. Please check input data."
+    except Exception as e:
+        message = f"Error during conversion: {e}"
+    return {'template': 'convert_spt.html', 'context': {'message': message}}
+
+def run_separation_job(job, temp_folder, saved_files, processed_folder, cache=None, chunk_size=CHUNK_SIZE,
+                       workers=1):
+    """Separate wind sea and swell for uploaded NetCDF files (work behind /separate_wind_sea_swell)."""
+    job.update(files_total=len(saved_files), files_done=0)
+
+    def progress(nc_file, csv_file):
+        job.advance(files_done=1)
+        job.add_artifact(os.path.basename(csv_file))
+
+    try:
+        saved_csv_files = windsea_swell_seperation(temp_folder, progress=progress, cache=cache,
+                                                   chunk_size=chunk_size, max_workers=workers)
+        for csv_file in saved_csv_files:
+            filename = os.path.basename(csv_file)
+            new_path = os.path.join(processed_folder, filename)
+            os.rename(csv_file, new_path)
+        
+        context = {
+            'message': "Wind-sea-swell separation completed!",
+            'output_files': saved_csv_files,
+            'basename': path.basename,
+        }
+    except Exception as e:
+        context = {'message': f"Error during processing: {e}"}
+    finally:
+        shutil.rmtree(temp_folder, ignore_errors=True)
+    return {'template': 'separate_wind_sea_swell.html', 'context': context}
+
+def run_stokes_job(job, temp_folder, saved_files, processed_folder, max_depth, cache=None, chunk_size=CHUNK_SIZE,
+                   workers=1):
+    """Calculate Stokes drift for uploaded NetCDF files (work behind /stokes_drift)."""
+    job.update(files_total=len(saved_files), files_done=0)
+    processed_files = []
+
+    def progress(result):
+        job.advance(files_done=1)
+        if result['success']:
+            processed_files.append(os.path.basename(result['output']))
+            job.add_artifact(processed_files[-1])
+        else:
+            print(f"Error processing {os.path.basename(result['file'])}: {result['error']}")
+
+    try:
+        analyse_files('stokes_drift', saved_files, processed_folder, max_workers=workers,
+                      chunk_size=chunk_size, progress=progress, cache=cache, maximum_depth=max_depth)
+        if processed_files:
+            context = {'message': "Stokes drift calculation completed!", 'processed_files': processed_files}
+        else:
+            context = {'message': "No valid NetCDF files were processed."}
+    except Exception as e:
+        context = {'message': f"Error during processing: {str(e)}"}
+    finally:
+        shutil.rmtree(temp_folder, ignore_errors=True)
+    return {'template': 'stokes_drift.html', 'context': context}
+
+def main(host='127.0.0.1', port=5000, browser=True, debug=True):
     """Entry point for running the application"""
     app = create_app()
     
     # Open browser after slight delay, only in main process
-    if os.environ.get('WERKZEUG_RUN_MAIN') != 'true':
-        Timer(1.5, open_browser).start()
+    if browser and os.environ.get('WERKZEUG_RUN_MAIN') != 'true':
+        Timer(1.5, open_browser, args=(f'http://{host}:{port}/',)).start()
     
-    app.run(debug=True)
+    app.run(host=host, port=port, debug=debug)
 
 if __name__ == '__main__':
     Timer(2, open_browser).start()
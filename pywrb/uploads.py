@@ -0,0 +1,243 @@
+"""
+Resumable, chunked uploads.
+
+A large file is sent as a sequence of request bodies that are each streamed
+straight to a .partial file, so no request has to hold more than one chunk
+and an interrupted upload can continue from the last byte received. The
+state of an upload is kept on disk next to its .partial file, so uploads
+also survive a restart of the server. An upload belongs to the workspace
+that started it and is invisible to every other one. Uploads that receive no bytes for
+longer than their time-to-live are discarded.
+"""
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: uploads are locked within the process only
+    fcntl = None
+
+from werkzeug.utils import secure_filename
+
+from pywrb.cache import file_digest
+
+COPY_BUFFER = 1024 * 1024
+_UPLOAD_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+class UploadError(ValueError):
+    """Raised when a chunk or a completed upload does not match what was announced."""
+
+
+class ChunkedUploads:
+    """On-disk store of uploads in progress."""
+
+    def __init__(self, folder, ttl=24 * 3600, cleanup_interval=600):
+        """
+        Parameters:
+            folder (str): Directory for the .partial files and their state.
+            ttl (float): Seconds without new bytes before an upload is discarded.
+            cleanup_interval (float): Minimum number of seconds between cleanups.
+        """
+        self.folder = folder
+        self.ttl = ttl
+        self.cleanup_interval = cleanup_interval
+        self._lock = threading.Lock()
+        self._upload_lock = threading.Lock()
+        self._last_cleanup = 0.0
+        os.makedirs(folder, exist_ok=True)
+
+    @contextmanager
+    def _locked(self, upload_id):
+        """
+        Hold an upload's lock while its .partial file is checked and changed.
+
+        A client retry racing the original request waits here, then finds
+        the offset moved on, instead of appending the same bytes twice.
+
+        Raises:
+            KeyError: If the upload does not exist, or was completed or
+                discarded while waiting for the lock.
+        """
+        _, partial_path = self._paths(upload_id)
+        if fcntl is None:
+            with self._upload_lock:
+                if not os.path.exists(partial_path):
+                    raise KeyError(upload_id)
+                yield
+            return
+
+        try:
+            fd = os.open(partial_path, os.O_RDONLY)
+        except FileNotFoundError:
+            raise KeyError(upload_id) from None
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                current = os.stat(partial_path)
+            except FileNotFoundError:
+                raise KeyError(upload_id) from None
+            if not os.path.samestat(os.fstat(fd), current):
+                raise KeyError(upload_id)
+            yield
+        finally:
+            os.close(fd)
+
+    def _paths(self, upload_id):
+        if not _UPLOAD_ID.match(upload_id or ''):
+            raise KeyError(upload_id)
+        base = os.path.join(self.folder, upload_id)
+        return base + '.json', base + '.partial'
+
+    def start(self, filename, size=None, sha256=None, owner=None):
+        """
+        Begin a new upload.
+
+        Parameters:
+            filename (str): Name of the file being uploaded.
+            size (int, optional): Total size in bytes, checked on completion.
+            sha256 (str, optional): Hex SHA-256 of the file, checked on completion.
+            owner (str, optional): Id of the workspace the upload belongs to.
+
+        Returns:
+            dict: Status of the upload (see status()).
+        """
+        filename = secure_filename(filename or '')
+        if not filename:
+            raise UploadError("A file name is required")
+        state = {
+            'id': uuid.uuid4().hex,
+            'filename': filename,
+            'size': int(size) if size is not None else None,
+            'sha256': sha256.lower() if sha256 else None,
+            'owner': owner,
+        }
+        meta_path, partial_path = self._paths(state['id'])
+        open(partial_path, 'wb').close()
+        with open(meta_path, 'w') as fh:
+            json.dump(state, fh)
+        return self.status(state['id'], owner)
+
+    def status(self, upload_id, owner=None):
+        """
+        State of an upload, with 'offset' the number of bytes received so far.
+
+        With an owner, the uploads of other workspaces are reported as missing;
+        append, complete and discard check their owner argument the same way.
+
+        Raises:
+            KeyError: If there is no such upload, or it belongs to another owner.
+        """
+        meta_path, partial_path = self._paths(upload_id)
+        try:
+            with open(meta_path) as fh:
+                state = json.load(fh)
+            state['offset'] = os.path.getsize(partial_path)
+        except FileNotFoundError:
+            raise KeyError(upload_id) from None
+        if owner is not None and state.get('owner') != owner:
+            raise KeyError(upload_id)
+        return state
+
+    def append(self, upload_id, offset, stream, chunk_size=COPY_BUFFER, owner=None):
+        """
+        Write the bytes of a stream to an upload, starting at offset.
+
+        The offset must equal the number of bytes already received, so that
+        a client resuming after a failure re-sends from the right place.
+
+        Returns:
+            int: New offset of the upload.
+        """
+        _, partial_path = self._paths(upload_id)
+        with self._locked(upload_id), open(partial_path, 'ab') as fh:
+            state = self.status(upload_id, owner)
+            if offset != state['offset']:
+                raise UploadError(f"Expected offset {state['offset']}, got {offset}")
+            for block in iter(lambda: stream.read(chunk_size), b''):
+                fh.write(block)
+                if state['size'] is not None and fh.tell() > state['size']:
+                    fh.truncate(state['size'])
+                    raise UploadError(f"Upload is larger than the announced {state['size']} bytes")
+            return fh.tell()
+
+    def complete(self, upload_id, dest_folder, owner=None):
+        """
+        Check the size and checksum of an upload and move it into dest_folder.
+
+        Returns:
+            str: Path of the completed file.
+        """
+        meta_path, partial_path = self._paths(upload_id)
+        with self._locked(upload_id):
+            state = self.status(upload_id, owner)
+            if state['size'] is not None and state['offset'] != state['size']:
+                raise UploadError(f"Received {state['offset']} of {state['size']} bytes")
+
+            if state['sha256'] is not None:
+                digest = file_digest(partial_path)
+                if digest != state['sha256']:
+                    self._remove(upload_id)
+                    raise UploadError(f"Checksum mismatch for {state['filename']}: got {digest}")
+
+            os.makedirs(dest_folder, exist_ok=True)
+            dest = os.path.join(dest_folder, state['filename'])
+            shutil.move(partial_path, dest)
+            os.remove(meta_path)
+        return dest
+
+    def discard(self, upload_id, owner=None):
+        """Forget an upload and delete the bytes received so far."""
+        if owner is not None:
+            self.status(upload_id, owner)
+        try:
+            with self._locked(upload_id):
+                self._remove(upload_id)
+        except KeyError:
+            # No .partial file left; remove a stray state file
+            self._remove(upload_id)
+
+    def _remove(self, upload_id):
+        for path in self._paths(upload_id):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def cleanup(self, force=False):
+        """
+        Discard uploads that have received no bytes for longer than the TTL.
+
+        Without force, this does nothing if the last cleanup was less than
+        cleanup_interval seconds ago, so it can be called on every request.
+
+        Returns:
+            list: Ids of the discarded uploads.
+        """
+        now = time.time()
+        with self._lock:
+            if not force and now - self._last_cleanup < self.cleanup_interval:
+                return []
+            self._last_cleanup = now
+
+        removed = []
+        for name in os.listdir(self.folder):
+            upload_id, ext = os.path.splitext(name)
+            if ext not in ('.json', '.partial') or not _UPLOAD_ID.match(upload_id) or upload_id in removed:
+                continue
+            try:
+                last_used = max(os.path.getmtime(path) for path in self._paths(upload_id) if os.path.exists(path))
+            except ValueError:
+                continue
+            if now - last_used > self.ttl:
+                self.discard(upload_id)
+                removed.append(upload_id)
+        if removed:
+            print(f"Removed {len(removed)} expired upload(s)")
+        return removed
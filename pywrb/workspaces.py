@@ -0,0 +1,131 @@
+"""
+Per-session working directories.
+
+Every browser session (or API client keeping its session cookie) works in
+its own directory tree, so concurrent users no longer clear or overwrite
+each other's uploads and outputs. Workspaces that have not been used for
+longer than their time-to-live are removed, unless a job is still running
+in them.
+"""
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+
+_WORKSPACE_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+class WorkspaceManager:
+    """Create, look up and expire workspaces below a root directory."""
+
+    def __init__(self, root, subfolders, ttl=24 * 3600, cleanup_interval=600):
+        """
+        Parameters:
+            root (str): Directory holding one subdirectory per workspace.
+            subfolders (dict): Folder names inside a workspace, keyed by the
+                config names the routes use (e.g. 'UPLOAD_FOLDER': 'Uploads').
+            ttl (float): Seconds after its last use before a workspace is removed.
+            cleanup_interval (float): Minimum number of seconds between cleanups.
+        """
+        self.root = root
+        self.subfolders = dict(subfolders)
+        self.ttl = ttl
+        self.cleanup_interval = cleanup_interval
+        self._in_use = {}
+        self._lock = threading.Lock()
+        self._last_cleanup = 0.0
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def new_id():
+        return uuid.uuid4().hex
+
+    @staticmethod
+    def is_valid_id(workspace_id):
+        return bool(_WORKSPACE_ID.match(workspace_id or ''))
+
+    def path(self, workspace_id):
+        if not self.is_valid_id(workspace_id):
+            raise ValueError(f"Invalid workspace id: {workspace_id!r}")
+        return os.path.join(self.root, workspace_id)
+
+    def folder(self, workspace_id, name):
+        """Path of one of a workspace's folders, e.g. folder(id, 'PROCESSED_FOLDER')."""
+        return os.path.join(self.path(workspace_id), self.subfolders[name])
+
+    def touch(self, workspace_id):
+        """Mark a workspace as used now, creating its folders if needed."""
+        path = self.path(workspace_id)
+        for name in self.subfolders.values():
+            os.makedirs(os.path.join(path, name), exist_ok=True)
+        os.utime(path)
+
+    def acquire(self, workspace_id):
+        """Protect a workspace from cleanup while a job runs in it."""
+        with self._lock:
+            self._in_use[workspace_id] = self._in_use.get(workspace_id, 0) + 1
+
+    def acquire_exclusive(self, workspace_id):
+        """Acquire a workspace only if no other job is running in it; returns whether it was acquired."""
+        with self._lock:
+            if workspace_id in self._in_use:
+                return False
+            self._in_use[workspace_id] = 1
+            return True
+
+    def in_use(self, workspace_id):
+        """Whether a job is running in the workspace."""
+        with self._lock:
+            return workspace_id in self._in_use
+
+    def release(self, workspace_id):
+        with self._lock:
+            count = self._in_use.get(workspace_id, 0) - 1
+            if count > 0:
+                self._in_use[workspace_id] = count
+            else:
+                self._in_use.pop(workspace_id, None)
+        try:
+            os.utime(self.path(workspace_id))
+        except FileNotFoundError:
+            pass
+
+    def clear(self, workspace_id):
+        """Delete the contents of a workspace, keeping its (empty) folders."""
+        shutil.rmtree(self.path(workspace_id), ignore_errors=True)
+        self.touch(workspace_id)
+
+    def cleanup(self, force=False):
+        """
+        Remove workspaces unused for longer than the TTL.
+
+        Without force, this does nothing if the last cleanup was less than
+        cleanup_interval seconds ago, so it can be called on every request.
+
+        Returns:
+            list: Ids of the removed workspaces.
+        """
+        now = time.time()
+        with self._lock:
+            if not force and now - self._last_cleanup < self.cleanup_interval:
+                return []
+            self._last_cleanup = now
+            in_use = set(self._in_use)
+
+        removed = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name in in_use or not self.is_valid_id(name):
+                continue
+            try:
+                expired = now - os.path.getmtime(path) > self.ttl
+            except FileNotFoundError:
+                continue
+            if expired:
+                shutil.rmtree(path, ignore_errors=True)
+                removed.append(name)
+        if removed:
+            print(f"Removed {len(removed)} expired workspace(s)")
+        return removed
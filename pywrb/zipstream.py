@@ -0,0 +1,72 @@
+"""
+ZIP archives streamed while they are written.
+
+zipfile can write to an unseekable file object, in which case every entry
+is followed by a data descriptor instead of having its header patched
+afterwards. The writer below collects what zipfile writes so that a
+generator can hand it to the client chunk by chunk, without the archive
+ever being staged on disk or held in memory as a whole.
+"""
+import os
+import zipfile
+
+CHUNK_SIZE = 1024 * 1024
+# Suffixes of files that are stored as they are: compressing them again costs
+# CPU time for little or no gain
+STORED_SUFFIXES = ('.nc', '.zip', '.gz', '.png')
+
+
+class _StreamWriter:
+    """Unseekable file object that buffers written bytes until they are drained."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def iter_zip(files, stored_suffixes=STORED_SUFFIXES, compression=zipfile.ZIP_DEFLATED,
+             chunk_size=CHUNK_SIZE):
+    """
+    Generate a ZIP archive of files as a stream of bytes.
+
+    Parameters:
+        files (list): Paths of the files, or (path, arcname) tuples.
+        stored_suffixes (tuple): Files with these suffixes are stored without compression.
+        compression (int): zipfile compression method of the other files.
+        chunk_size (int): Number of bytes read from each file at a time.
+
+    Yields:
+        bytes: Consecutive pieces of the archive.
+    """
+    writer = _StreamWriter()
+    with zipfile.ZipFile(writer, 'w', compression=compression) as zipf:
+        for item in files:
+            path, arcname = item if isinstance(item, tuple) else (item, os.path.basename(item))
+            info = zipfile.ZipInfo.from_file(path, arcname)
+            if path.lower().endswith(stored_suffixes):
+                info.compress_type = zipfile.ZIP_STORED
+            else:
+                info.compress_type = compression
+
+            with open(path, 'rb') as src, zipf.open(info, 'w') as dst:
+                for block in iter(lambda: src.read(chunk_size), b''):
+                    dst.write(block)
+                    data = writer.drain()
+                    if data:
+                        yield data
+            data = writer.drain()
+            if data:
+                yield data
+    # Central directory
+    yield writer.drain()
@@ -37,7 +37,7 @@ setup(
     python_requires=">=3.6",
     entry_points={
         'console_scripts': [
-            'pywrb=pywrb.pywrb:main',
+            'pywrb=pywrb.cli:main',
         ],
     },
 )
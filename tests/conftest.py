@@ -0,0 +1,20 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+import pytest  # noqa: E402
+
+from synthetic import make_sdt  # noqa: E402
+
+
+@pytest.fixture
+def sdt_files(tmp_path):
+    """Write n synthetic SDT files of a few records each and return their paths."""
+    def write(n, n_records=5):
+        folder = tmp_path / 'sdt'
+        folder.mkdir(exist_ok=True)
+        return [make_sdt(str(folder / f'buoy{i}.SDT'), n_records, seed=i) for i in range(n)]
+    return write
@@ -0,0 +1,111 @@
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+from pywrb.cache import ResultCache, cached_outputs
+from pywrb.processing.process_SDT_files import process_SDT_files
+
+
+def _key_in_worker(cache, path):
+    return cache.key(path, 'kind', level=1)
+
+
+def _product(folder, base, text, calls):
+    """compute callable for cached_outputs that writes base.out in folder."""
+    def compute():
+        calls.append(base)
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, base + '.out')
+        with open(path, 'w') as fh:
+            fh.write(text)
+        return [path], {'length': len(text)}
+    return compute
+
+
+def _entry_size(cache, key):
+    entry = os.path.join(cache.cache_dir, key)
+    return sum(os.path.getsize(os.path.join(entry, name)) for name in os.listdir(entry))
+
+
+def test_hit_restores_outputs_under_new_base(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'))
+    first, second = tmp_path / 'a.SDT', tmp_path / 'b.SDT'
+    first.write_bytes(b'chip')
+    second.write_bytes(b'chip')
+    calls = []
+
+    metadata = cached_outputs(cache, str(first), 'kind', {}, str(tmp_path / 'one'), 'a',
+                              _product(str(tmp_path / 'one'), 'a', 'result', calls))
+    assert metadata == {'length': 6}
+
+    # Same contents under another name: served from the cache
+    metadata = cached_outputs(cache, str(second), 'kind', {}, str(tmp_path / 'two'), 'b',
+                              _product(str(tmp_path / 'two'), 'b', 'other', calls))
+    assert metadata == {'length': 6}
+    assert calls == ['a']
+    assert (tmp_path / 'two' / 'b.out').read_text() == 'result'
+
+
+def test_miss_on_other_params_or_contents(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'))
+    source = tmp_path / 'a.SDT'
+    source.write_bytes(b'chip')
+    key = cache.key(str(source), 'kind', level=1)
+    assert cache.key(str(source), 'kind', level=2) != key
+    assert cache.key(str(source), 'other', level=1) != key
+    assert cache.fetch(key, str(tmp_path / 'out'), 'a') is None
+
+    source.write_bytes(b'changed')
+    assert cache.key(str(source), 'kind', level=1) != key
+
+
+def test_eviction_removes_least_recently_used(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'))
+    payload = tmp_path / 'payload.out'
+    payload.write_bytes(b'x' * 100)
+    cache.store('old', [str(payload)], 'payload')
+    cache.store('used', [str(payload)], 'payload')
+    os.utime(os.path.join(cache.cache_dir, 'old'), (1, 1))
+    os.utime(os.path.join(cache.cache_dir, 'used'), (2, 2))
+    assert cache.fetch('used', str(tmp_path / 'out'), 'payload') is not None
+
+    # Room for two entries: storing a third evicts the least recently used
+    cache.max_bytes = 2 * _entry_size(cache, 'old')
+    cache.store('new', [str(payload)], 'payload')
+    assert sorted(name for name in os.listdir(cache.cache_dir)) == ['new', 'used']
+
+
+def test_cache_pickles_without_memo(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'))
+    source = tmp_path / 'input.bin'
+    source.write_bytes(b'data')
+    key = cache.key(str(source), 'kind')
+
+    copy = pickle.loads(pickle.dumps(cache))
+    assert copy.cache_dir == cache.cache_dir
+    assert copy.max_bytes == cache.max_bytes
+    assert len(copy._digests) == 0
+    assert copy.key(str(source), 'kind') == key
+
+
+def test_keys_match_across_processes(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'))
+    paths = []
+    for i in range(3):
+        path = tmp_path / f'input{i}.bin'
+        path.write_bytes(bytes([i]) * 10)
+        paths.append(str(path))
+
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        keys = list(executor.map(_key_in_worker, [cache] * len(paths), paths))
+    assert keys == [_key_in_worker(cache, path) for path in paths]
+
+
+def test_process_files_with_cache_in_workers(tmp_path, sdt_files):
+    files = sdt_files(3)
+    cache = ResultCache(str(tmp_path / 'cache'))
+    for out in ('first', 'second'):
+        results = process_SDT_files(files, str(tmp_path / out), max_workers=2, cache=cache)
+        assert [r['error'] for r in results] == [None] * len(files)
+        assert all(r['records'] == 5 for r in results)
+    assert sorted(os.listdir(tmp_path / 'first')) == sorted(os.listdir(tmp_path / 'second'))
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from pywrb.processing.nc_archive import append_to_netcdf
+from pywrb.processing.SPT_to_NC import build_spectral_dataset
+
+START = pd.Timestamp('2012-01-01 00:00')
+FREQUENCY = np.array([0.025, 0.03, 0.035])
+
+
+def records(hours):
+    """Spectral Dataset with one record per hour; SmaxXpsd holds the hour."""
+    hours = np.asarray(hours, dtype=float)
+    times = START + pd.to_timedelta(hours, unit='h')
+    values = np.repeat(hours[:, None], len(FREQUENCY), axis=1)
+    return build_spectral_dataset(times, FREQUENCY, {'SmaxXpsd': values, 'Lat': values * 0 + 17.68})
+
+
+def stored(path):
+    with xr.open_dataset(path) as ds:
+        return ds.load()
+
+
+def test_gap_merge_and_duplicate_skip(tmp_path):
+    archive = str(tmp_path / 'station.nc')
+    assert append_to_netcdf(records([0, 1, 3]), archive) == slice(0, 3)
+
+    # 1 is already stored, 2 fills the gap and 4 is appended
+    assert append_to_netcdf(records([1, 2, 4]), archive) == slice(2, 5)
+    ds = stored(archive)
+    expected = START + pd.to_timedelta([0, 1, 2, 3, 4], unit='h')
+    np.testing.assert_array_equal(ds.time.values, expected.values)
+    np.testing.assert_array_equal(ds.SmaxXpsd.values[:, 0], [0, 1, 2, 3, 4])
+    np.testing.assert_array_equal(ds.Lat.values, 17.68)
+
+
+def test_only_duplicates_leave_archive_unchanged(tmp_path):
+    archive = str(tmp_path / 'station.nc')
+    append_to_netcdf(records([0, 1]), archive)
+    assert append_to_netcdf(records([1, 0, 1]), archive) is None
+    assert stored(archive).sizes['time'] == 2
+
+
+def test_sub_hour_records_are_stored_exactly(tmp_path):
+    archive = str(tmp_path / 'station.nc')
+    append_to_netcdf(records([0, 1]), archive)
+    append_to_netcdf(records([0.5]), archive)
+    ds = stored(archive)
+    np.testing.assert_array_equal(ds.SmaxXpsd.values[:, 0], [0, 0.5, 1])
@@ -0,0 +1,35 @@
+import numpy as np
+
+from pywrb.processing.sdt_decoder import RECORD_SIZE, decode_sdt_file
+
+from synthetic import make_sdt
+
+TIMES = np.datetime64('2012-01-01T00:00', 'm') + np.arange(6) * np.timedelta64(30, 'm')
+
+
+def test_clean_file(tmp_path):
+    path = make_sdt(str(tmp_path / 'clean.SDT'), 6)
+    data = decode_sdt_file(path)
+    np.testing.assert_array_equal(data['time'], TIMES)
+
+
+def test_resync_after_inserted_bytes_and_damaged_record(tmp_path):
+    clean = make_sdt(str(tmp_path / 'clean.SDT'), 6)
+    raw = bytearray(open(clean, 'rb').read())
+    # Damage the fifth record, then insert junk after the second one
+    raw[4 * RECORD_SIZE + 100] ^= 0xFF
+    raw[2 * RECORD_SIZE:2 * RECORD_SIZE] = bytes(range(100))
+    damaged = tmp_path / 'damaged.SDT'
+    damaged.write_bytes(bytes(raw))
+
+    data = decode_sdt_file(str(damaged))
+    np.testing.assert_array_equal(data['time'], np.delete(TIMES, 4))
+    expected = decode_sdt_file(clean)
+    np.testing.assert_array_equal(data['SmaxXpsd'], np.delete(expected['SmaxXpsd'], 4, axis=0))
+
+
+def test_truncated_last_record_is_dropped(tmp_path):
+    clean = make_sdt(str(tmp_path / 'clean.SDT'), 6)
+    truncated = tmp_path / 'truncated.SDT'
+    truncated.write_bytes(open(clean, 'rb').read()[:-10])
+    np.testing.assert_array_equal(decode_sdt_file(str(truncated))['time'], TIMES[:5])
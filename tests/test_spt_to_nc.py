@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+
+from pywrb.processing.SPT_to_NC import spt_to_dataset
+
+
+def write_spt(path, grids):
+    """Write a *_SPT.txt file with one block per frequency grid."""
+    lines = []
+    for i, grid in enumerate(grids):
+        lines.append(f"Time Stamp= 2012-01-01 0{i}:00:00")
+        for f in grid:
+            lines.append("\t".join([f"{f:.3f}"] + ["1.000"] * 8 + ["17.680", "83.280"]))
+    path.write_text("\n".join(lines) + "\n")
+    return str(path)
+
+
+def test_blocks_share_frequency_grid(tmp_path):
+    spt = write_spt(tmp_path / 'buoy_SPT.txt', [(0.025, 0.03, 0.035)] * 2)
+    ds = spt_to_dataset(spt)
+    assert ds.sizes == {'time': 2, 'Frequency': 3}
+    np.testing.assert_allclose(ds.Frequency.values, [0.025, 0.03, 0.035])
+
+
+def test_mixed_frequency_grids_rejected(tmp_path):
+    spt = write_spt(tmp_path / 'buoy_SPT.txt', [(0.025, 0.03, 0.035), (0.025, 0.04, 0.05)])
+    with pytest.raises(ValueError, match="different frequency grids"):
+        spt_to_dataset(spt)
@@ -0,0 +1,88 @@
+import hashlib
+import io
+import os
+
+import pytest
+
+from pywrb.uploads import ChunkedUploads, UploadError
+
+DATA = b'0123456789' * 10
+
+
+@pytest.fixture
+def uploads(tmp_path):
+    return ChunkedUploads(str(tmp_path / 'partial'))
+
+
+def test_chunks_are_completed_into_folder(uploads, tmp_path):
+    upload = uploads.start('buoy.SDT', size=len(DATA), sha256=hashlib.sha256(DATA).hexdigest())
+    assert uploads.append(upload['id'], 0, io.BytesIO(DATA[:40])) == 40
+    assert uploads.append(upload['id'], 40, io.BytesIO(DATA[40:])) == len(DATA)
+
+    path = uploads.complete(upload['id'], str(tmp_path / 'done'))
+    assert open(path, 'rb').read() == DATA
+    with pytest.raises(KeyError):
+        uploads.status(upload['id'])
+
+
+def test_wrong_offset_is_rejected(uploads):
+    upload = uploads.start('buoy.SDT')
+    uploads.append(upload['id'], 0, io.BytesIO(DATA[:40]))
+    # A retry of the first chunk must not append its bytes twice
+    with pytest.raises(UploadError, match="Expected offset 40"):
+        uploads.append(upload['id'], 0, io.BytesIO(DATA[:40]))
+    assert uploads.status(upload['id'])['offset'] == 40
+
+
+def test_bytes_beyond_announced_size_are_rejected(uploads):
+    upload = uploads.start('buoy.SDT', size=50)
+    with pytest.raises(UploadError, match="larger than the announced"):
+        uploads.append(upload['id'], 0, io.BytesIO(DATA))
+    assert uploads.status(upload['id'])['offset'] == 50
+
+
+def test_incomplete_upload_cannot_be_completed(uploads, tmp_path):
+    upload = uploads.start('buoy.SDT', size=len(DATA))
+    uploads.append(upload['id'], 0, io.BytesIO(DATA[:40]))
+    with pytest.raises(UploadError, match="Received 40 of 100 bytes"):
+        uploads.complete(upload['id'], str(tmp_path / 'done'))
+    assert uploads.status(upload['id'])['offset'] == 40
+
+
+def test_checksum_mismatch_discards_upload(uploads, tmp_path):
+    upload = uploads.start('buoy.SDT', size=len(DATA), sha256=hashlib.sha256(b'other').hexdigest())
+    uploads.append(upload['id'], 0, io.BytesIO(DATA))
+    with pytest.raises(UploadError, match="Checksum mismatch"):
+        uploads.complete(upload['id'], str(tmp_path / 'done'))
+    assert not os.path.exists(tmp_path / 'done' / 'buoy.SDT')
+    with pytest.raises(KeyError):
+        uploads.status(upload['id'])
+
+
+def test_other_workspaces_cannot_use_upload(uploads, tmp_path):
+    upload = uploads.start('buoy.SDT', owner='a' * 32)
+    with pytest.raises(KeyError):
+        uploads.append(upload['id'], 0, io.BytesIO(DATA), owner='b' * 32)
+    with pytest.raises(KeyError):
+        uploads.complete(upload['id'], str(tmp_path / 'done'), owner='b' * 32)
+    with pytest.raises(KeyError):
+        uploads.discard(upload['id'], owner='b' * 32)
+    assert uploads.append(upload['id'], 0, io.BytesIO(DATA), owner='a' * 32) == len(DATA)
+
+
+def test_expired_uploads_are_discarded(uploads):
+    stale = uploads.start('stale.SDT')
+    fresh = uploads.start('fresh.SDT')
+    for path in uploads._paths(stale['id']):
+        os.utime(path, (0, 0))
+    assert uploads.cleanup(force=True) == [stale['id']]
+    with pytest.raises(KeyError):
+        uploads.status(stale['id'])
+    assert uploads.status(fresh['id'])['offset'] == 0
+
+
+def test_unknown_or_malformed_ids(uploads):
+    with pytest.raises(KeyError):
+        uploads.status('0' * 32)
+    with pytest.raises(KeyError):
+        uploads.append('../etc/passwd', 0, io.BytesIO(DATA))